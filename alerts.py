@@ -0,0 +1,273 @@
+import asyncio
+import bisect
+import logging
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes
+
+from config import ALERTS_DB_PATH, ALERT_CHECK_INTERVAL, ALERT_MAX_PER_USER
+from metrics import observe_handler
+from outbound import reply_text, send_message
+from market_data import market_data
+from rate_limiter import Priority
+from symbol_index import resolve_symbol, not_found_message
+
+# تنظیم لاگینگ
+logger = logging.getLogger(__name__)
+
+# قالب دستور: /alert btc > 70000
+ALERT_PATTERN = re.compile(r"^(\S+?)\s*([<>])\s*\$?([\d,]+(?:\.\d+)?)$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    coin_id TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    direction TEXT NOT NULL CHECK (direction IN ('above', 'below')),
+    level REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS alerts_user ON alerts (user_id);
+"""
+
+
+class AlertIndex:
+    """
+    ایندکس درون‌حافظه‌ای هشدارها به تفکیک ارز.
+    برای هر ارز دو لیست مرتب نگه داشته می‌شود که هشدارهای فعال‌شده همیشه انتهای لیست باشند:
+        above: کلید -level (قیمت >= level یعنی -level >= -price)
+        below: کلید level (قیمت <= level یعنی level >= price)
+    پس بررسی هر تیک O(log n + تعداد فعال‌شده) است.
+    """
+
+    def __init__(self):
+        self._above: dict[str, list[tuple[float, int]]] = {}
+        self._below: dict[str, list[tuple[float, int]]] = {}
+        self.alerts: dict[int, dict] = {}
+
+    def __len__(self) -> int:
+        return len(self.alerts)
+
+    def coins(self) -> list[str]:
+        """شناسه ارزهایی که حداقل یک هشدار فعال دارند"""
+        return [coin_id for coin_id in set(self._above) | set(self._below)
+                if self._above.get(coin_id) or self._below.get(coin_id)]
+
+    def add(self, alert: dict) -> None:
+        self.alerts[alert["id"]] = alert
+        if alert["direction"] == "above":
+            bisect.insort(self._above.setdefault(alert["coin_id"], []), (-alert["level"], alert["id"]))
+        else:
+            bisect.insort(self._below.setdefault(alert["coin_id"], []), (alert["level"], alert["id"]))
+
+    def remove(self, alert_id: int) -> Optional[dict]:
+        alert = self.alerts.pop(alert_id, None)
+        if alert is None:
+            return None
+        if alert["direction"] == "above":
+            levels, key = self._above[alert["coin_id"]], (-alert["level"], alert_id)
+        else:
+            levels, key = self._below[alert["coin_id"]], (alert["level"], alert_id)
+        i = bisect.bisect_left(levels, key)
+        if i < len(levels) and levels[i] == key:
+            del levels[i]
+        return alert
+
+    def pop_fired(self, coin_id: str, price: float) -> list[dict]:
+        """حذف و برگرداندن هشدارهایی که با این قیمت فعال می‌شوند"""
+        fired = []
+        above = self._above.get(coin_id)
+        if above:
+            i = bisect.bisect_left(above, (-price, float("-inf")))
+            fired += [self.alerts.pop(alert_id) for _, alert_id in above[i:]]
+            del above[i:]
+        below = self._below.get(coin_id)
+        if below:
+            i = bisect.bisect_left(below, (price, float("-inf")))
+            fired += [self.alerts.pop(alert_id) for _, alert_id in below[i:]]
+            del below[i:]
+        return fired
+
+    def for_user(self, user_id: int) -> list[dict]:
+        return sorted((a for a in self.alerts.values() if a["user_id"] == user_id), key=lambda a: a["id"])
+
+
+# ایندکس مشترک و اتصال پایگاه داده (همه عملیات SQLite در یک thread اختصاصی)
+index = AlertIndex()
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="alerts")
+_connection: Optional[sqlite3.Connection] = None
+
+
+def _connect() -> sqlite3.Connection:
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(ALERTS_DB_PATH) or ".", exist_ok=True)
+        _connection = sqlite3.connect(ALERTS_DB_PATH, check_same_thread=False)
+        _connection.row_factory = sqlite3.Row
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.executescript(_SCHEMA)
+    return _connection
+
+
+def _load_all() -> list[dict]:
+    return [dict(row) for row in _connect().execute("SELECT * FROM alerts")]
+
+
+def _insert(alert: dict) -> int:
+    db = _connect()
+    with db:
+        cursor = db.execute(
+            """
+            INSERT INTO alerts (chat_id, user_id, coin_id, symbol, direction, level, created_at)
+            VALUES (:chat_id, :user_id, :coin_id, :symbol, :direction, :level, :created_at)
+            """,
+            alert,
+        )
+    return cursor.lastrowid
+
+
+def _delete(alert_ids: list[int]) -> None:
+    db = _connect()
+    with db:
+        db.executemany("DELETE FROM alerts WHERE id=?", [(alert_id,) for alert_id in alert_ids])
+
+
+async def _run(func, *args):
+    """اجرای تابع پایگاه داده در thread اختصاصی"""
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+
+async def check_alerts(context: Optional[ContextTypes.DEFAULT_TYPE] = None) -> None:
+    """
+    بررسی دوره‌ای هشدارها: قیمت همه ارزهای تحت نظر با یک درخواست دسته‌ای
+    دریافت و هشدارهای فعال‌شده از صف ارسال فرستاده می‌شوند.
+    """
+    coins = index.coins()
+    if not coins:
+        return
+    try:
+        prices = await market_data.latest_prices(coins, "usd", priority=Priority.BACKGROUND)
+    except Exception as e:
+        logger.warning("خطا در دریافت قیمت برای بررسی هشدارها: %s", e)
+        return
+
+    fired = []
+    for coin_id, price in prices.items():
+        if price is not None:
+            fired += [(alert, price) for alert in index.pop_fired(coin_id, price)]
+    if not fired:
+        return
+
+    await _run(_delete, [alert["id"] for alert, _ in fired])
+    logger.debug("%s هشدار قیمت فعال شد", len(fired))
+    for alert, price in fired:
+        sign = ">" if alert["direction"] == "above" else "<"
+        send_message(
+            alert["chat_id"],
+            f"🔔 هشدار قیمت: {alert['symbol'].upper()} {sign} ${alert['level']:,.2f}\n"
+            f"💵 قیمت فعلی: ${price:,.2f}",
+        )
+
+
+@observe_handler("alert")
+async def alert(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """ثبت هشدار قیمت (دستور /alert btc > 70000)"""
+    logger.debug("اجرای دستور /alert توسط کاربر %s", update.effective_user.id)
+    match = ALERT_PATTERN.match(" ".join(context.args).strip().lower())
+    if not match:
+        reply_text(
+            update.message,
+            "قالب دستور: /alert نماد > قیمت یا /alert نماد < قیمت\nمثال: /alert btc > 70000"
+        )
+        return
+
+    symbol, sign, level = match.group(1), match.group(2), float(match.group(3).replace(",", ""))
+    coin_id = resolve_symbol(symbol)
+    if coin_id is None:
+        reply_text(update.message, not_found_message(symbol))
+        return
+
+    user_id = update.effective_user.id
+    if len(index.for_user(user_id)) >= ALERT_MAX_PER_USER:
+        reply_text(
+            update.message,
+            f"حداکثر {ALERT_MAX_PER_USER} هشدار فعال مجاز است. با /alerts و /delalert مدیریت کنید."
+        )
+        return
+
+    new_alert = {
+        "chat_id": update.effective_chat.id,
+        "user_id": user_id,
+        "coin_id": coin_id,
+        "symbol": symbol,
+        "direction": "above" if sign == ">" else "below",
+        "level": level,
+        "created_at": time.time(),
+    }
+    new_alert["id"] = await _run(_insert, new_alert)
+    index.add(new_alert)
+    reply_text(
+        update.message,
+        f"✅ هشدار #{new_alert['id']} ثبت شد: {symbol.upper()} {sign} ${level:,.2f}"
+    )
+
+
+@observe_handler("alerts")
+async def list_alerts(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """نمایش هشدارهای فعال کاربر (دستور /alerts)"""
+    logger.debug("اجرای دستور /alerts توسط کاربر %s", update.effective_user.id)
+    user_alerts = index.for_user(update.effective_user.id)
+    if not user_alerts:
+        reply_text(update.message, "هیچ هشدار فعالی ندارید. مثال ثبت هشدار: /alert btc > 70000")
+        return
+    lines = [
+        f"#{a['id']}: {a['symbol'].upper()} {'>' if a['direction'] == 'above' else '<'} ${a['level']:,.2f}"
+        for a in user_alerts
+    ]
+    reply_text(update.message, "🔔 هشدارهای فعال:\n" + "\n".join(lines) + "\n\nحذف: /delalert شماره")
+
+
+@observe_handler("delalert")
+async def delete_alert(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """حذف یک هشدار (دستور /delalert 12)"""
+    logger.debug("اجرای دستور /delalert توسط کاربر %s", update.effective_user.id)
+    if not context.args or not context.args[0].lstrip("#").isdigit():
+        reply_text(update.message, "لطفاً شماره هشدار را وارد کنید. مثال: /delalert 12")
+        return
+    alert_id = int(context.args[0].lstrip("#"))
+    existing = index.alerts.get(alert_id)
+    if existing is None or existing["user_id"] != update.effective_user.id:
+        reply_text(update.message, "هشداری با این شماره پیدا نشد.")
+        return
+    index.remove(alert_id)
+    await _run(_delete, [alert_id])
+    reply_text(update.message, f"🗑 هشدار #{alert_id} حذف شد.")
+
+
+async def start_alerts(application: Application) -> None:
+    """بارگذاری هشدارها از پایگاه داده و زمان‌بندی بررسی دوره‌ای"""
+    for saved in await _run(_load_all):
+        index.add(saved)
+    logger.info("%s هشدار قیمت بارگذاری شد", len(index))
+    if application.job_queue is not None:
+        application.job_queue.run_repeating(
+            check_alerts, interval=ALERT_CHECK_INTERVAL, first=ALERT_CHECK_INTERVAL, name="alerts"
+        )
+
+
+async def close_alerts(application: Optional[Application] = None) -> None:
+    """بستن اتصال پایگاه داده هشدارها"""
+    def close() -> None:
+        global _connection
+        if _connection is not None:
+            _connection.close()
+            _connection = None
+    await _run(close)
@@ -0,0 +1,4 @@
+"""
+ابزار سنجش کارایی ربات: سرورهای جعلی کوین‌گکو و Bot API تلگرام و اجرای بار
+روی هندلرهای واقعی برنامه. اجرا: python -m bench.run --help
+"""
@@ -0,0 +1,116 @@
+"""
+سرور حداقلی پروتکل RESP (جایگزین محلی Redis) برای آزمودن CACHE_BACKEND=redis بدون Redis واقعی.
+فقط دستورهای کلاینت cache_backend: PING، AUTH، SELECT، GET، MGET، SET (با NX/PX/EX) و DEL.
+EVAL پشتیبانی نمی‌شود (مثل سرورهای بدون اسکریپت) تا مسیر جایگزین GET+DEL آزادسازی قفل هم اجرا شود.
+
+    python -m bench.fake_redis --port 6390
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+from typing import Optional
+
+
+class FakeRedis:
+    """داده‌ها در حافظه: کلید -> (مقدار، زمان انقضا به monotonic یا None)"""
+
+    def __init__(self):
+        self.data: dict[bytes, tuple[bytes, Optional[float]]] = {}
+        self.counts: Counter = Counter()
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            del self.data[key]
+            return None
+        return entry[0]
+
+    @staticmethod
+    def _encode(reply) -> bytes:
+        if reply is None:
+            return b"$-1\r\n"
+        if isinstance(reply, Exception):
+            return b"-ERR %s\r\n" % str(reply).encode()
+        if isinstance(reply, str):
+            return b"+%s\r\n" % reply.encode()
+        if isinstance(reply, int):
+            return b":%d\r\n" % reply
+        if isinstance(reply, bytes):
+            return b"$%d\r\n%s\r\n" % (len(reply), reply)
+        return b"*%d\r\n" % len(reply) + b"".join(FakeRedis._encode(item) for item in reply)
+
+    def execute(self, args: list[bytes]):
+        command = args[0].upper().decode()
+        self.counts[command] += 1
+        if command == "PING":
+            return "PONG"
+        if command in ("AUTH", "SELECT"):
+            return "OK"
+        if command == "GET":
+            return self._get(args[1])
+        if command == "MGET":
+            return [self._get(key) for key in args[1:]]
+        if command == "DEL":
+            return sum(self.data.pop(key, None) is not None for key in args[1:])
+        if command == "SET":
+            key, value, options = args[1], args[2], [arg.upper() for arg in args[3:]]
+            expires_at = None
+            for name, scale in ((b"PX", 0.001), (b"EX", 1.0)):
+                if name in options:
+                    expires_at = time.monotonic() + int(args[3 + options.index(name) + 1]) * scale
+            if b"NX" in options and self._get(key) is not None:
+                return None
+            self.data[key] = (value, expires_at)
+            return "OK"
+        return ValueError(f"unknown command '{command}'")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.startswith(b"*"):
+                    raise ValueError("فقط فرمان‌های آرایه‌ای RESP پشتیبانی می‌شوند")
+                args = []
+                for _ in range(int(line[1:])):
+                    length = int((await reader.readline())[1:])
+                    args.append((await reader.readexactly(length + 2))[:-2])
+                writer.write(self._encode(self.execute(args)))
+                await writer.drain()
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def serve(ready, port: int = 0) -> None:
+    """اجرای سرور در پردازه جدا؛ پورت انتخاب‌شده از ready فرستاده می‌شود"""
+    async def main() -> None:
+        server = await asyncio.start_server(FakeRedis().handle, "127.0.0.1", port)
+        ready.send(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="جایگزین محلی Redis برای کش مشترک")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+
+    async def run() -> None:
+        server = await asyncio.start_server(FakeRedis().handle, "127.0.0.1", args.port)
+        print(f"RESP روی 127.0.0.1:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import random
+import re
+import struct
+import time
+from collections import Counter
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+# ارزهای واقعی ابتدای لیست (نمادهای ثابت ربات به این شناسه‌ها نگاشت می‌شوند)
+KNOWN_COINS = [
+    ("bitcoin", "btc", "Bitcoin", 65000.0),
+    ("ethereum", "eth", "Ethereum", 3200.0),
+    ("tether", "usdt", "Tether", 1.0),
+    ("binancecoin", "bnb", "BNB", 580.0),
+    ("solana", "sol", "Solana", 150.0),
+    ("ripple", "xrp", "XRP", 0.55),
+    ("usd-coin", "usdc", "USDC", 1.0),
+    ("cardano", "ada", "Cardano", 0.45),
+    ("avalanche-2", "avax", "Avalanche", 35.0),
+    ("dogecoin", "doge", "Dogecoin", 0.15),
+]
+
+DAY_MS = 86_400_000
+# ثابت handshake در RFC 6455
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class Fixtures:
+    """
+    پاسخ‌های کوین‌گکو: از فایل‌های ضبط‌شده (bench/record_fixtures.py) اگه موجود باشند،
+    وگرنه داده مصنوعی قطعی با seed ثابت.
+    """
+
+    def __init__(self, directory: Optional[str] = None, extra_coins: int = 2000, seed: int = 1):
+        self.seed = seed
+        self.directory = directory
+        self.markets: list[dict] = self._load("markets.json") or self._synthetic_markets(seed)
+        self.coins: list[dict] = self._load("coins_list.json") or [
+            {"id": row["id"], "symbol": row["symbol"], "name": row["name"]} for row in self.markets
+        ] + [
+            {"id": f"coin-{i:05d}", "symbol": f"c{i:05d}", "name": f"Coin {i}"} for i in range(extra_coins)
+        ]
+        self.by_id = {row["id"]: row for row in self.markets}
+        self.exchange_rates: dict = self._load("exchange_rates.json") or self._synthetic_exchange_rates()
+        # تیک‌های جریان قیمت: [ثانیه از شروع، جفت ارز، قیمت]
+        self.ticks: list[list] = self._load("ticks.json") or self._synthetic_ticks(seed)
+        self._charts: dict[tuple[str, str], dict] = {}
+
+    def _load(self, name: str):
+        if not self.directory:
+            return None
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def _synthetic_markets(seed: int) -> list[dict]:
+        rng = random.Random(seed)
+        rows = []
+        coins = KNOWN_COINS + [(f"coin-{i:05d}", f"c{i:05d}", f"Coin {i}", 10 ** rng.uniform(-3, 3)) for i in range(240)]
+        for rank, (coin_id, symbol, name, price) in enumerate(coins, start=1):
+            supply = 10 ** rng.uniform(7, 11)
+            rows.append({
+                "id": coin_id, "symbol": symbol, "name": name, "current_price": price,
+                "market_cap": price * supply, "market_cap_rank": rank,
+                "total_volume": price * supply * rng.uniform(0.01, 0.2),
+                "high_24h": price * 1.03, "low_24h": price * 0.97,
+                "price_change_24h": price * rng.uniform(-0.05, 0.05),
+                "price_change_percentage_24h": rng.uniform(-5, 5),
+                "circulating_supply": supply, "total_supply": supply, "max_supply": None,
+                "ath": price * 1.5, "atl": price * 0.1,
+                "last_updated": "2024-01-01T00:00:00.000Z",
+            })
+        return rows
+
+    def _synthetic_exchange_rates(self) -> dict:
+        """جدول /exchange_rates بر پایه قیمت بیت‌کوین (value = مقدار هر ارز به ازای 1 BTC)"""
+        btc_usd = self.by_id["bitcoin"]["current_price"] if "bitcoin" in self.by_id else 60000.0
+        fiat = {"usd": ("US Dollar", "$", 1.0), "eur": ("Euro", "€", 0.92), "gbp": ("British Pound Sterling", "£", 0.79),
+                "jpy": ("Japanese Yen", "¥", 151.0), "try": ("Turkish Lira", "₺", 32.0)}
+        rates = {
+            "btc": {"name": "Bitcoin", "unit": "BTC", "value": 1.0, "type": "crypto"},
+            "sats": {"name": "Satoshi", "unit": "sats", "value": 100_000_000.0, "type": "crypto"},
+        }
+        if "ethereum" in self.by_id:
+            rates["eth"] = {"name": "Ether", "unit": "ETH", "value": btc_usd / self.by_id["ethereum"]["current_price"], "type": "crypto"}
+        for code, (name, unit, per_usd) in fiat.items():
+            rates[code] = {"name": name, "unit": unit, "value": btc_usd * per_usd, "type": "fiat"}
+        return {"rates": rates}
+
+    def _synthetic_ticks(self, seed: int, seconds: int = 60, step: float = 0.5) -> list[list]:
+        """گام تصادفی قیمت ارزهای شناخته‌شده، هر step ثانیه یک تیک برای هر جفت"""
+        rng = random.Random(f"{seed}:ticks")
+        prices = {
+            f"{symbol.upper()}USDT": self.by_id[coin_id]["current_price"] if coin_id in self.by_id else price
+            for coin_id, symbol, _, price in KNOWN_COINS if symbol != "usdt"
+        }
+        ticks = []
+        for i in range(int(seconds / step)):
+            for pair in prices:
+                prices[pair] *= 1 + rng.gauss(0, 0.0005)
+                ticks.append([round(i * step, 3), pair, prices[pair]])
+        return ticks
+
+    def row(self, coin_id: str) -> Optional[dict]:
+        row = self.by_id.get(coin_id)
+        if row is None and coin_id.startswith("coin-"):
+            # ارزهای خارج از 250 ارز اول هم پاسخ دارند (برای سنجش cache miss)
+            price = 1 + int(coin_id[5:] or 0) % 97
+            row = {**self.markets[-1], "id": coin_id, "symbol": coin_id[5:], "name": coin_id,
+                   "current_price": price, "market_cap_rank": None}
+        return row
+
+    @staticmethod
+    def _shift_to_now(chart: dict) -> dict:
+        """
+        جابه‌جایی زمان‌های نمودار ضبط‌شده (با مضربی از گام آن) تا آخرین نقطه به زمان فعلی برسد؛
+        وگرنه با کهنه شدن فایل، ذخیره‌ساز سری ربات در هر سنجش بازه بزرگ‌تری درخواست می‌کند.
+        """
+        prices = chart.get("prices") or []
+        if len(prices) < 2:
+            return chart
+        step = max(1, int(prices[-1][0] - prices[-2][0]))
+        offset = (int(time.time() * 1000) - int(prices[-1][0])) // step * step
+        return {
+            name: [[point[0] + offset, *point[1:]] for point in series] if isinstance(series, list) else series
+            for name, series in chart.items()
+        }
+
+    def market_chart(self, coin_id: str, days: str) -> Optional[dict]:
+        key = (coin_id, days)
+        if key in self._charts:
+            return self._charts[key]
+        recorded = self._load(f"market_chart_{coin_id}_{days}.json")
+        if recorded is not None:
+            chart = self._shift_to_now(recorded)
+            self._charts[key] = chart
+            return chart
+        row = self.row(coin_id)
+        if row is None:
+            return None
+        # گام زمانی مثل کوین‌گکو: 5 دقیقه‌ای برای 1 روز، ساعتی تا 90 روز، روزانه برای بیشتر
+        span_days = 3650 if days == "max" else int(days)
+        step = 300_000 if span_days <= 1 else 3_600_000 if span_days <= 90 else DAY_MS
+        end = int(time.time() * 1000) // step * step
+        count = span_days * DAY_MS // step
+        rng = random.Random(f"{self.seed}:{coin_id}:{days}")
+        price, prices, volumes = row["current_price"], [], []
+        for i in range(count):
+            price *= 1 + rng.gauss(0, 0.01)
+            prices.append([end - (count - i) * step, price])
+            volumes.append([end - (count - i) * step, row["total_volume"] * rng.uniform(0.5, 1.5)])
+        chart = {"prices": prices, "market_caps": prices, "total_volumes": volumes}
+        self._charts[key] = chart
+        return chart
+
+
+def _message(chat_id: int, message_id: int, **extra) -> dict:
+    return {
+        "message_id": message_id, "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"},
+        "from": {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"},
+        **extra,
+    }
+
+
+class FakeUpstream:
+    """
+    سرور HTTP/1.1 حداقلی (با keep-alive) که هم API کوین‌گکو (/api/v3/...) و هم
+    Bot API تلگرام (/bot<token>/<method>) را شبیه‌سازی می‌کند.
+    تأخیر و خطای 429 فقط روی مسیرهای کوین‌گکو اعمال می‌شوند.
+    """
+
+    def __init__(
+        self, fixtures: Fixtures, latency_ms: float = 0, jitter_ms: float = 0,
+        error_rate: float = 0, retry_after: int = 1, telegram_latency_ms: float = 0, seed: int = 1,
+    ):
+        self.fixtures = fixtures
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.telegram_latency = telegram_latency_ms / 1000
+        self.rng = random.Random(seed)
+        self.counts: Counter = Counter()
+        # تعداد دفعات درخواست هر ارز به تفکیک endpoint (برای بررسی single-flight بین پردازه‌ها)
+        self.id_counts: Counter = Counter()
+        self._message_id = 0
+
+    # ---------------- HTTP ----------------
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if headers.get("upgrade", "").lower() == "websocket":
+                    await self.websocket(target, headers, reader, writer)
+                    break
+                body = await self._read_body(reader, headers)
+                status, payload, extra_headers = await self.route(method, target, headers, body)
+                data = json.dumps(payload).encode()
+                head = f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                head += "".join(f"{name}: {value}\r\n" for name, value in extra_headers.items())
+                writer.write(head.encode() + b"\r\n" + data)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_body(reader: asyncio.StreamReader, headers: dict) -> bytes:
+        if "content-length" in headers:
+            return await reader.readexactly(int(headers["content-length"]))
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = b""
+            while (size := int((await reader.readline()).strip() or b"0", 16)) > 0:
+                body += await reader.readexactly(size)
+                await reader.readline()
+            await reader.readline()
+            return body
+        return b""
+
+    async def route(self, method: str, target: str, headers: dict, body: bytes) -> tuple[str, object, dict]:
+        url = urlsplit(target)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path == "/__stats":
+            return "200 OK", dict(self.counts), {}
+        if url.path == "/__ids":
+            return "200 OK", dict(self.id_counts), {}
+        if url.path == "/__reset":
+            self.counts.clear()
+            self.id_counts.clear()
+            return "200 OK", {}, {}
+        if url.path.startswith("/api/v3/"):
+            return await self.coingecko(url.path[len("/api/v3"):], query)
+        match = re.match(r"^/bot[^/]+/(\w+)$", url.path)
+        if match:
+            return await self.telegram(match.group(1), headers, body)
+        return "404 Not Found", {"error": "not found"}, {}
+
+    # ---------------- CoinGecko ----------------
+
+    async def coingecko(self, path: str, query: dict) -> tuple[str, object, dict]:
+        endpoint = re.sub(r"^/coins/(?!list$|markets$)[^/]+", "/coins/{id}", path)
+        self.counts[f"coingecko {endpoint}"] += 1
+        for coin_id in filter(None, query.get("ids", "").split(",")):
+            self.id_counts[f"{endpoint} {coin_id}"] += 1
+        delay = self.latency + self.rng.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.counts["coingecko 429"] += 1
+            return "429 Too Many Requests", {"status": {"error_code": 429}}, {"Retry-After": str(self.retry_after)}
+
+        fixtures = self.fixtures
+        if path == "/coins/list":
+            return "200 OK", fixtures.coins, {}
+        if path == "/coins/markets":
+            if "ids" in query:
+                rows = [row for coin_id in query["ids"].split(",") if (row := fixtures.row(coin_id))]
+            else:
+                rows = fixtures.markets
+            per_page, page = int(query.get("per_page", 100)), int(query.get("page", 1))
+            return "200 OK", rows[(page - 1) * per_page: page * per_page], {}
+        if path == "/exchange_rates":
+            return "200 OK", fixtures.exchange_rates, {}
+        if path == "/simple/price":
+            vs = query.get("vs_currencies", "usd").split(",")
+            prices = {}
+            for coin_id in query.get("ids", "").split(","):
+                row = fixtures.row(coin_id)
+                if row is not None:
+                    prices[coin_id] = {currency: row["current_price"] for currency in vs}
+            return "200 OK", prices, {}
+        match = re.match(r"^/coins/([^/]+)/market_chart$", path)
+        if match:
+            chart = fixtures.market_chart(match.group(1), query.get("days", "7"))
+            if chart is None:
+                return "404 Not Found", {"error": "coin not found"}, {}
+            return "200 OK", chart, {}
+        return "404 Not Found", {"error": "not found"}, {}
+
+    # ---------------- WebSocket ----------------
+
+    async def websocket(self, target: str, headers: dict, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        جایگزین جریان combined بایننس (/stream?streams=btcusdt@miniTicker/...): تیک‌های
+        ضبط‌شده یا مصنوعی با همان فاصله‌های زمانی و به‌صورت چرخشی پخش می‌شوند.
+        """
+        accept = base64.b64encode(hashlib.sha1((headers.get("sec-websocket-key", "") + WS_GUID).encode()).digest())
+        writer.write(
+            b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n"
+        )
+        await writer.drain()
+        self.counts["stream connect"] += 1
+        streams = parse_qs(urlsplit(target).query).get("streams", [""])[0]
+        pairs = {stream.split("@")[0].upper() for stream in streams.split("/") if stream}
+
+        async def drain_client() -> None:
+            # فریم‌های کلاینت (pong، close) خوانده و دور ریخته می‌شوند؛ پایان یعنی قطع اتصال
+            while True:
+                _, second = await reader.readexactly(2)
+                length = second & 0x7F
+                if length == 126:
+                    length = struct.unpack("!H", await reader.readexactly(2))[0]
+                elif length == 127:
+                    length = struct.unpack("!Q", await reader.readexactly(8))[0]
+                await reader.readexactly(length + (4 if second & 0x80 else 0))
+
+        client = asyncio.create_task(drain_client())
+        try:
+            while not client.done():
+                started = time.monotonic()
+                for offset, pair, price in self.fixtures.ticks:
+                    if pair not in pairs:
+                        continue
+                    delay = started + offset - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    if client.done():
+                        break
+                    data = json.dumps({
+                        "stream": f"{pair.lower()}@miniTicker",
+                        "data": {"e": "24hrMiniTicker", "E": int(time.time() * 1000), "s": pair, "c": f"{price:.8f}"},
+                    }).encode()
+                    header = struct.pack("!BB", 0x81, len(data)) if len(data) < 126 else struct.pack("!BBH", 0x81, 126, len(data))
+                    writer.write(header + data)
+                    await writer.drain()
+                    self.counts["stream message"] += 1
+                await asyncio.sleep(0.5)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            client.cancel()
+
+    # ---------------- Telegram ----------------
+
+    @staticmethod
+    def _chat_id(headers: dict, body: bytes) -> int:
+        content_type = headers.get("content-type", "")
+        try:
+            if "json" in content_type:
+                return int(json.loads(body).get("chat_id", 0))
+            if "urlencoded" in content_type:
+                return int(parse_qs(body.decode())["chat_id"][0])
+            match = re.search(rb'name="chat_id"\r\n(?:[^\r\n]*\r\n)*\r\n(-?\d+)', body)
+            return int(match.group(1)) if match else 0
+        except (ValueError, KeyError):
+            return 0
+
+    async def telegram(self, method: str, headers: dict, body: bytes) -> tuple[str, object, dict]:
+        self.counts[f"telegram {method}"] += 1
+        if self.telegram_latency:
+            await asyncio.sleep(self.telegram_latency)
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot",
+                      "can_join_groups": True, "can_read_all_group_messages": False, "supports_inline_queries": True}
+        elif method in ("sendMessage", "editMessageText", "sendPhoto", "editMessageMedia"):
+            self._message_id += 1
+            extra = {"text": "ok"}
+            if method in ("sendPhoto", "editMessageMedia"):
+                file_id = f"photo-{self._message_id}"
+                extra = {"photo": [{"file_id": file_id, "file_unique_id": file_id, "width": 800, "height": 600}]}
+            result = _message(self._chat_id(headers, body), self._message_id, **extra)
+        else:
+            result = True
+        return "200 OK", {"ok": True, "result": result}, {}
+
+
+def serve(ready, options: dict) -> None:
+    """
+    اجرای سرور جعلی در پردازه جدا (تا event loop ربات در سنجش سهمی از آن نداشته باشد).
+    ready: سر یک Pipe که پورت انتخاب‌شده از آن فرستاده می‌شود
+    """
+    async def main() -> None:
+        fixtures = Fixtures(options.pop("fixtures", None), seed=options.get("seed", 1))
+        upstream = FakeUpstream(fixtures, **options)
+        server = await asyncio.start_server(upstream.handle, "127.0.0.1", 0, backlog=1024)
+        ready.send(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
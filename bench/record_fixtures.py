@@ -0,0 +1,87 @@
+"""
+ضبط پاسخ‌های واقعی کوین‌گکو و تیک‌های جریان قیمت در bench/fixtures برای استفاده سرور جعلی.
+اجرا: python -m bench.record_fixtures [--coins bitcoin,ethereum] [--days 1,7,30] [--ticks 60]
+بدون دسترسی به اینترنت، --synthetic همان فایل‌ها را از داده مصنوعی قطعی سرور جعلی می‌سازد.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import httpx
+
+from bench.fake_upstream import Fixtures
+from price_stream import BinanceSource, WebSocketClient
+from config import PRICE_STREAM_URL, PRICE_STREAM_PAIRS
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def _save(name: str, data) -> None:
+    with open(os.path.join(FIXTURES_DIR, name), "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    print(f"ذخیره شد: {name}")
+
+
+async def _record_ticks(seconds: float) -> list[list]:
+    """ضبط تیک‌های جریان miniTicker بایننس: [ثانیه از شروع، جفت ارز، قیمت]"""
+    client = WebSocketClient(BinanceSource(PRICE_STREAM_URL, PRICE_STREAM_PAIRS).connect_url())
+    await client.connect()
+    ticks, started = [], time.monotonic()
+    try:
+        while (elapsed := time.monotonic() - started) < seconds:
+            ticker = json.loads(await client.recv()).get("data", {})
+            if ticker.get("s") and ticker.get("c") is not None:
+                ticks.append([round(elapsed, 3), ticker["s"], float(ticker["c"])])
+    finally:
+        await client.close()
+    return ticks
+
+
+def _write_synthetic(coins: list[str], days: list[str], seed: int) -> None:
+    """نوشتن داده مصنوعی سرور جعلی (seed ثابت) با همان نام فایل‌های ضبط واقعی"""
+    fixtures = Fixtures(seed=seed)
+    _save("coins_list.json", fixtures.coins)
+    _save("markets.json", fixtures.markets)
+    _save("exchange_rates.json", fixtures.exchange_rates)
+    for coin_id in coins:
+        for span in days:
+            _save(f"market_chart_{coin_id}_{span}.json", fixtures.market_chart(coin_id, span))
+    _save("ticks.json", fixtures.ticks)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ضبط پاسخ‌های کوین‌گکو برای سنجش")
+    parser.add_argument("--api", default=os.getenv("COINGECKO_API_URL", "https://api.coingecko.com/api/v3"))
+    parser.add_argument("--coins", default="bitcoin,ethereum,solana")
+    parser.add_argument("--days", default="1,7,30")
+    parser.add_argument("--ticks", type=float, default=60, help="مدت ضبط جریان قیمت (ثانیه)؛ 0 یعنی بدون ضبط")
+    parser.add_argument("--pause", type=float, default=2.5, help="فاصله بین درخواست‌ها (محدودیت نرخ نسخه رایگان)")
+    parser.add_argument("--synthetic", action="store_true", help="ساخت فایل‌ها از داده مصنوعی به‌جای کوین‌گکو و بایننس")
+    parser.add_argument("--seed", type=int, default=1, help="seed داده مصنوعی")
+    args = parser.parse_args()
+
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    if args.synthetic:
+        _write_synthetic(args.coins.split(","), args.days.split(","), args.seed)
+        return
+    with httpx.Client(base_url=args.api, timeout=30) as client:
+        def get(path: str, **params):
+            response = client.get(path, params=params)
+            response.raise_for_status()
+            time.sleep(args.pause)
+            return response.json()
+
+        _save("coins_list.json", get("/coins/list"))
+        _save("markets.json", get("/coins/markets", vs_currency="usd", order="market_cap_desc", per_page=250, page=1))
+        _save("exchange_rates.json", get("/exchange_rates"))
+        for coin_id in args.coins.split(","):
+            for days in args.days.split(","):
+                _save(f"market_chart_{coin_id}_{days}.json", get(f"/coins/{coin_id}/market_chart", vs_currency="usd", days=days))
+    if args.ticks:
+        _save("ticks.json", asyncio.run(_record_ticks(args.ticks)))
+
+
+if __name__ == "__main__":
+    main()
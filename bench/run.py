@@ -0,0 +1,351 @@
+"""
+سنجش بار روی هندلرهای واقعی ربات در برابر سرورهای جعلی کوین‌گکو و تلگرام.
+
+    python -m bench.run --updates 2000 --concurrency 32 --scenario mix
+    python -m bench.run --latency-ms 80 --error-rate 0.05 --baseline bench/baseline.json
+    python -m bench.run --save-baseline bench/baseline.json
+
+گزارش: p50/p95/p99 زمان پردازش هر آپدیت، آپدیت در ثانیه، درخواست کوین‌گکو به ازای
+هر آپدیت، زمان رسم نمودار و بیشینه RSS؛ با --baseline نتیجه با اجرای ذخیره‌شده مقایسه
+و در صورت پسرفت بیش از --tolerance با کد خروج 1 پایان می‌یابد.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Optional
+
+import httpx
+
+try:
+    import resource
+except ImportError:  # ویندوز
+    resource = None
+
+from bench.fake_upstream import serve
+
+# سناریوها: نوع آپدیت -> وزن
+SCENARIOS = {
+    "mix": {"price": 35, "price_multi": 10, "info": 20, "chart": 10, "top": 10, "button": 15},
+    "price": {"price": 80, "price_multi": 20},
+    "info": {"info": 100},
+    "chart": {"chart": 100},
+    "top": {"top": 100},
+    "button": {"button": 100},
+    "inline": {"inline": 100},
+}
+SYMBOLS = ["btc", "eth", "sol", "bnb", "xrp", "ada", "doge", "avax"]
+CHART_RANGES = ["1d", "7d", "30d"]
+INLINE_QUERIES = ["", "b", "bt", "btc", "eth", "e", "so", "sol", "doge", "cardano", "x", "av", "usd", "zzz"]
+BUTTONS = ["top", "t:m:1", "t:g:0", "t:v:3", "coin_bitcoin", "coin_ethereum", "price_btc", "info_eth", "chart_sol"]
+
+# معیارهایی که کمتر بودنشان بهتر است (بقیه: بیشتر بهتر)
+LOWER_IS_BETTER = {"p50_ms", "p95_ms", "p99_ms", "upstream_per_update", "render_mean_ms", "rss_mb", "errors"}
+# تغییرهای کوچک‌تر از این مقدار در زمان‌ها (میلی‌ثانیه) نویز حساب می‌شوند
+MIN_DELTA_MS = 1.0
+COMPARED = ["p50_ms", "p95_ms", "p99_ms", "updates_per_sec", "upstream_per_update", "render_mean_ms", "rss_mb"]
+
+
+def _percentile(values: list[float], q: float) -> float:
+    """صدک به روش nearest-rank"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))]
+
+
+def _start_upstream(args: argparse.Namespace) -> tuple[multiprocessing.Process, int]:
+    """اجرای سرور جعلی در پردازه جدا و برگرداندن پورت آن"""
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    options = {
+        "fixtures": args.fixtures, "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+        "error_rate": args.error_rate, "retry_after": args.retry_after,
+        "telegram_latency_ms": args.tg_latency_ms, "seed": args.seed,
+    }
+    process = context.Process(target=serve, args=(sender, options), daemon=True)
+    process.start()
+    if not receiver.poll(30):
+        process.terminate()
+        raise RuntimeError("سرور جعلی شروع نشد")
+    return process, receiver.recv()
+
+
+def _configure_env(port: int, data_dir: str, args: argparse.Namespace) -> None:
+    """تنظیم متغیرهای محیطی پیش از import ماژول‌های ربات (config هنگام import خوانده می‌شود)"""
+    base = f"http://127.0.0.1:{port}"
+    env = {
+        "COINGECKO_API_URL": f"{base}/api/v3",
+        "TELEGRAM_API_BASE_URL": base,
+        "SYMBOL_INDEX_PATH": os.path.join(data_dir, "coins_list.json"),
+        "CHART_CACHE_DIR": os.path.join(data_dir, "charts"),
+        "TIMESERIES_DB_PATH": os.path.join(data_dir, "timeseries.db"),
+        "ALERTS_DB_PATH": os.path.join(data_dir, "alerts.db"),
+        "USER_SETTINGS_DB_PATH": os.path.join(data_dir, "user_settings.db"),
+        "CACHE_SQLITE_PATH": os.path.join(data_dir, "cache.db"),
+        "METRICS_PORT": "0",
+        # جریان قیمت از جایگزین محلی (پخش تیک‌های ضبط‌شده)
+        "PRICE_STREAM": args.price_stream,
+        "PRICE_STREAM_URL": f"ws://127.0.0.1:{port}/stream",
+        "LOG_LEVEL": args.log_level,
+    }
+    if not args.real_limits:
+        # سقف‌های نرخ تولید در سنجش گلوگاه اصلی می‌شدند؛ با --real-limits همان مقادیر config
+        env.update({
+            "COINGECKO_RATE_PER_MINUTE": "600000", "COINGECKO_BURST": "1000",
+            "OUTBOUND_RATE": "100000", "OUTBOUND_BURST": "10000",
+            "OUTBOUND_CHAT_RATE": "10000", "OUTBOUND_CHAT_BURST": "1000",
+        })
+    for key, value in env.items():
+        os.environ.setdefault(key, value)
+
+
+def _make_update(kind: str, update_id: int, user_id: int, rng: random.Random, text: Optional[str] = None) -> dict:
+    """دیکشنری آپدیت تلگرام برای یک نوع درخواست (یا دستور text)"""
+    user = {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+    chat = {"id": user_id, "type": "private"}
+    now = int(time.time())
+    if kind == "button":
+        return {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id), "from": user, "chat_instance": str(user_id), "data": rng.choice(BUTTONS),
+                "message": {"message_id": update_id, "date": now, "chat": chat, "text": "panel",
+                            "from": {"id": 1, "is_bot": True, "first_name": "bench"}},
+            },
+        }
+    if kind == "inline":
+        return {
+            "update_id": update_id,
+            "inline_query": {"id": str(update_id), "from": user, "query": rng.choice(INLINE_QUERIES), "offset": ""},
+        }
+    text = text or {
+        "price": lambda: f"/price {rng.choice(SYMBOLS)}",
+        "price_multi": lambda: "/price " + " ".join(rng.sample(SYMBOLS, 4)),
+        "info": lambda: f"/info {rng.choice(SYMBOLS)}",
+        "chart": lambda: f"/chart {rng.choice(SYMBOLS[:4])} {rng.choice(CHART_RANGES)}",
+        "top": lambda: "/top",
+    }[kind]()
+    command = text.split()[0]
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": now, "chat": chat, "from": user, "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}],
+        },
+    }
+
+
+def _render_totals(metrics) -> tuple[int, float]:
+    """(تعداد، مجموع ثانیه) نمودارهای رسم‌شده تا این لحظه"""
+    entry = metrics.render_seconds._values.get(())
+    return (entry[2], entry[1]) if entry else (0, 0.0)
+
+
+async def _upstream_counts(base: str) -> dict:
+    async with httpx.AsyncClient() as client:
+        return (await client.get(f"{base}/__stats")).json()
+
+
+async def _wait_outbound_drained(outbound, timeout: float = 30) -> None:
+    """انتظار برای ارسال همه پاسخ‌های صف‌شده"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = outbound.get_stats()
+        if not stats["in_flight"] and not any(stats["queue_depth"].values()):
+            return
+        await asyncio.sleep(0.05)
+
+
+async def _run(args: argparse.Namespace, port: int) -> dict:
+    # import پس از تنظیم متغیرهای محیطی
+    from telegram import Update
+    import crypto_bot
+    import metrics
+    import outbound
+    import price_stream
+    import symbol_index
+
+    base = f"http://127.0.0.1:{port}"
+    application = crypto_bot.build_application("123456:BENCH")
+    await application.initialize()
+    await crypto_bot.post_init(application)
+    await application.start()
+    # انتظار برای ایندکس نمادها، snapshot بازار و اولین قیمت‌های جریان (کارهای پس‌زمینه post_init)
+    for _ in range(200):
+        if symbol_index.is_loaded() and (args.price_stream == "off" or price_stream.get_stream_price("bitcoin")):
+            break
+        await asyncio.sleep(0.05)
+
+    rng = random.Random(args.seed)
+    kinds, weights = zip(*SCENARIOS[args.scenario].items())
+    latencies: dict[str, list[float]] = defaultdict(list)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def process(update_id: int, kind: str, record: bool) -> None:
+        update = Update.de_json(_make_update(kind, update_id, rng.randrange(args.users) + 1000, rng), application.bot)
+        async with semaphore:
+            started = time.perf_counter()
+            await application.process_update(update)
+            if record:
+                latencies[kind].append(time.perf_counter() - started)
+
+    if args.currencies:
+        # ارز ترجیحی کاربران با همان دستور /currency (کاربران بدون ارز دلار می‌بینند)
+        codes = args.currencies.split(",") + ["usd"]
+        for offset, user_id in enumerate(range(1000, 1000 + args.users)):
+            update = _make_update("", args.warmup + args.updates + offset, user_id, rng, f"/currency {rng.choice(codes)}")
+            await application.process_update(Update.de_json(update, application.bot))
+
+    # گرم کردن (کش‌ها، pool رسم، اتصال‌ها) بدون ثبت زمان
+    await asyncio.gather(*(process(i, rng.choices(kinds, weights)[0], False) for i in range(args.warmup)))
+    await _wait_outbound_drained(outbound)
+    before = await _upstream_counts(base)
+    errors_before = sum(metrics.handler_errors._values.values())
+    render_before = _render_totals(metrics)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        process(args.warmup + i, rng.choices(kinds, weights)[0], True) for i in range(args.updates)
+    ))
+    elapsed = time.perf_counter() - started
+    await _wait_outbound_drained(outbound)
+    after = await _upstream_counts(base)
+
+    await application.stop()
+    await crypto_bot.post_shutdown(application)
+    await application.shutdown()
+
+    upstream_calls = sum(
+        count - before.get(name, 0) for name, count in after.items()
+        if name.startswith("coingecko /")
+    )
+    render_after = _render_totals(metrics)
+    render_count = render_after[0] - render_before[0]
+    render_sum = render_after[1] - render_before[1]
+    all_latencies = [value for values in latencies.values() for value in values]
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource else 0.0
+
+    return {
+        "scenario": args.scenario,
+        "updates": args.updates,
+        "concurrency": args.concurrency,
+        "p50_ms": _percentile(all_latencies, 50) * 1000,
+        "p95_ms": _percentile(all_latencies, 95) * 1000,
+        "p99_ms": _percentile(all_latencies, 99) * 1000,
+        "updates_per_sec": args.updates / elapsed if elapsed else 0.0,
+        "upstream_per_update": upstream_calls / args.updates,
+        "upstream_429": after.get("coingecko 429", 0) - before.get("coingecko 429", 0),
+        "telegram_calls": sum(
+            count - before.get(name, 0) for name, count in after.items() if name.startswith("telegram ")
+        ),
+        "stream_messages": after.get("stream message", 0) - before.get("stream message", 0),
+        "render_count": render_count,
+        "render_mean_ms": render_sum / render_count * 1000 if render_count else 0.0,
+        "errors": sum(metrics.handler_errors._values.values()) - errors_before,
+        "rss_mb": rss_mb,
+        "by_kind": {
+            kind: {
+                "count": len(values),
+                "p50_ms": _percentile(values, 50) * 1000,
+                "p95_ms": _percentile(values, 95) * 1000,
+                "p99_ms": _percentile(values, 99) * 1000,
+            }
+            for kind, values in sorted(latencies.items())
+        },
+    }
+
+
+def _print_report(result: dict) -> None:
+    print(f"\nسناریو {result['scenario']}: {result['updates']} آپدیت با هم‌زمانی {result['concurrency']}")
+    print(f"  latency      p50={result['p50_ms']:.1f}ms  p95={result['p95_ms']:.1f}ms  p99={result['p99_ms']:.1f}ms")
+    print(f"  throughput   {result['updates_per_sec']:.1f} آپدیت در ثانیه")
+    print(f"  upstream     {result['upstream_per_update']:.3f} درخواست کوین‌گکو در هر آپدیت (429: {result['upstream_429']})")
+    print(f"  telegram     {result['telegram_calls']} فراخوانی Bot API")
+    print(f"  stream       {result.get('stream_messages', 0)} پیام جریان قیمت")
+    print(f"  render       {result['render_count']} نمودار، میانگین {result['render_mean_ms']:.1f}ms")
+    print(f"  memory       بیشینه RSS ربات {result['rss_mb']:.1f}MB، pool رسم {result.get('children_rss_mb', 0):.1f}MB")
+    print(f"  errors       {result['errors']}")
+    for kind, stats in result["by_kind"].items():
+        print(f"    {kind:<12} n={stats['count']:<6} p50={stats['p50_ms']:.1f}ms  p95={stats['p95_ms']:.1f}ms  p99={stats['p99_ms']:.1f}ms")
+
+
+def _compare(result: dict, baseline: dict, tolerance: float) -> bool:
+    """مقایسه با baseline؛ خروجی: True اگه هیچ معیاری بیش از tolerance بدتر نشده باشد"""
+    ok = True
+    print(f"\nمقایسه با baseline (آستانه پسرفت {tolerance:.0%}):")
+    for key in COMPARED:
+        old, new = baseline.get(key), result.get(key)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else (float("inf") if new > old else 0.0)
+        worse = change > tolerance if key in LOWER_IS_BETTER else change < -tolerance
+        if key.endswith("_ms") and abs(new - old) < MIN_DELTA_MS:
+            worse = False
+        ok &= not worse
+        print(f"  {key:<20} {old:>10.2f} -> {new:>10.2f}  ({change:+.1%}){'  ← پسرفت' if worse else ''}")
+    return ok
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="سنجش کارایی ربات با سرورهای جعلی")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mix")
+    parser.add_argument("--updates", type=int, default=1000, help="تعداد آپدیت‌های اندازه‌گیری‌شده")
+    parser.add_argument("--warmup", type=int, default=100, help="آپدیت‌های گرم‌کردن (بدون ثبت)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=200, help="تعداد کاربران متمایز")
+    parser.add_argument("--latency-ms", type=float, default=50, help="تأخیر پایه پاسخ کوین‌گکو")
+    parser.add_argument("--jitter-ms", type=float, default=20, help="تأخیر تصادفی اضافه کوین‌گکو")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="احتمال پاسخ 429 از کوین‌گکو")
+    parser.add_argument("--retry-after", type=int, default=1, help="مقدار Retry-After پاسخ‌های 429")
+    parser.add_argument("--tg-latency-ms", type=float, default=5, help="تأخیر پاسخ Bot API")
+    parser.add_argument("--fixtures", default=os.path.join(os.path.dirname(__file__), "fixtures"),
+                        help="پوشه پاسخ‌های ضبط‌شده (در نبود آن داده مصنوعی)")
+    parser.add_argument("--currencies", default="", help="ارزهای ترجیحی کاربران، مثل eur,btc (تبدیل محلی قیمت‌ها)")
+    parser.add_argument("--price-stream", choices=["binance", "off"], default="binance",
+                        help="جریان قیمت WebSocket (جایگزین محلی با تیک‌های ضبط‌شده) یا off برای فقط کوین‌گکو")
+    parser.add_argument("--real-limits", action="store_true", help="استفاده از سقف‌های نرخ config به‌جای سقف باز")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--baseline", help="فایل JSON نتیجه قبلی برای مقایسه")
+    parser.add_argument("--save-baseline", help="ذخیره نتیجه این اجرا به‌عنوان baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="پسرفت مجاز نسبت به baseline")
+    parser.add_argument("--json", action="store_true", help="چاپ نتیجه به‌صورت JSON")
+    args = parser.parse_args(argv)
+
+    process, port = _start_upstream(args)
+    try:
+        with tempfile.TemporaryDirectory(prefix="crypto_bot_bench_") as data_dir:
+            _configure_env(port, data_dir, args)
+            result = asyncio.run(_run(args, port))
+            # پردازه‌های pool رسم در post_shutdown بسته شده‌اند؛ سرور جعلی هنوز در حال اجراست
+            if resource:
+                result["children_rss_mb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    finally:
+        process.terminate()
+        process.join()
+
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    else:
+        _print_report(result)
+
+    ok = True
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            ok = _compare(result, json.load(f), args.tolerance)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"\nbaseline در {args.save_baseline} ذخیره شد")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+بررسی single-flight بین پردازه‌ها: N پردازه هم‌زمان قیمت و ردیف بازار همان ارزها را از
+کش مشترک می‌خواهند و هر ارز باید در مجموع فقط یک بار از کوین‌گکو درخواست شود (قفل‌های
+یک دسته ممکن است بین پردازه‌ها تقسیم شوند، پس تعداد درخواست‌ها می‌تواند بیش از یکی باشد).
+
+    python -m bench.shared_cache --backend sqlite --workers 4
+    python -m bench.shared_cache --backend redis --workers 4   # با جایگزین محلی bench/fake_redis.py
+
+خروج با کد 1 اگه ارزی بیش از یک بار درخواست شده باشد یا مقدار
+bytes (مثل تصویر نمودار) سالم از کش مشترک برنگردد.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+
+import httpx
+
+from bench import fake_redis, fake_upstream
+
+# ارزهای خارج از snapshot (هر پردازه باید همه را از کش مشترک یا کوین‌گکو بگیرد)
+COINS = [f"coin-{i:05d}" for i in range(1, 41)]
+IMAGE = bytes(range(256)) * 64
+
+
+def _start(target, *args) -> tuple[multiprocessing.Process, int]:
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=target, args=(sender, *args), daemon=True)
+    process.start()
+    if not receiver.poll(30):
+        process.terminate()
+        raise RuntimeError("سرور جایگزین شروع نشد")
+    return process, receiver.recv()
+
+
+def _worker(env: dict, barrier, results) -> None:
+    """یک worker ربات: پس از رسیدن همه به barrier، هم‌زمان از کش مشترک می‌خواند"""
+    os.environ.update(env)
+
+    async def run() -> tuple[int, bool]:
+        # import پس از تنظیم متغیرهای محیطی
+        from cache import TTLCache, close_cache
+        from coingecko_client import close_client
+        from market_data import market_data
+        from price_cache import get_prices
+
+        images = TTLCache("bench_png", ttl=60)
+
+        async def render() -> bytes:
+            await asyncio.sleep(0.2)
+            return IMAGE
+
+        barrier.wait()
+        prices, snapshots, image = await asyncio.gather(
+            get_prices(COINS), market_data.snapshots(COINS), images.get_or_fetch("chart", render),
+        )
+        await close_client()
+        await close_cache()
+        found = sum(price is not None for price in prices.values()) + sum(row is not None for row in snapshots.values())
+        return found, image == IMAGE
+
+    results.put(asyncio.run(run()))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="بررسی single-flight کش مشترک بین چند پردازه")
+    parser.add_argument("--backend", choices=["sqlite", "redis"], default="sqlite")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=200, help="تأخیر پاسخ کوین‌گکو (پنجره هم‌زمانی)")
+    args = parser.parse_args(argv)
+
+    servers = []
+    upstream, port = _start(fake_upstream.serve, {"latency_ms": args.latency_ms})
+    servers.append(upstream)
+    try:
+        with tempfile.TemporaryDirectory(prefix="crypto_bot_shared_") as data_dir:
+            env = {
+                "CACHE_BACKEND": args.backend,
+                "CACHE_SQLITE_PATH": os.path.join(data_dir, "cache.db"),
+                "COINGECKO_API_URL": f"http://127.0.0.1:{port}/api/v3",
+                "COINGECKO_RATE_PER_MINUTE": "600000", "COINGECKO_BURST": "1000",
+                "PRICE_STREAM": "off",
+                "METRICS_PORT": "0",
+                "LOG_LEVEL": "WARNING",
+            }
+            if args.backend == "redis":
+                redis, redis_port = _start(fake_redis.serve)
+                servers.append(redis)
+                env["CACHE_REDIS_URL"] = f"redis://127.0.0.1:{redis_port}/0"
+
+            context = multiprocessing.get_context("spawn")
+            barrier, results = context.Barrier(args.workers), context.Queue()
+            workers = [context.Process(target=_worker, args=(env, barrier, results)) for _ in range(args.workers)]
+            for worker in workers:
+                worker.start()
+            outcomes = [results.get(timeout=60) for _ in workers]
+            for worker in workers:
+                worker.join()
+
+        counts = httpx.get(f"http://127.0.0.1:{port}/__stats").json()
+        id_counts = httpx.get(f"http://127.0.0.1:{port}/__ids").json()
+    finally:
+        for server in servers:
+            server.terminate()
+            server.join()
+
+    calls = {name: count for name, count in counts.items() if name.startswith("coingecko /")}
+    print(f"پشتوانه {args.backend}، {args.workers} پردازه، {len(COINS)} ارز:")
+    for name, count in sorted(calls.items()):
+        endpoint = name[len("coingecko "):]
+        per_id = [n for key, n in id_counts.items() if key.rsplit(" ", 1)[0] == endpoint]
+        print(f"  {name:<28} {count} درخواست، {len(per_id)} ارز، بیشینه {max(per_id, default=0)} بار برای هر ارز")
+    print(f"  نتایج هر پردازه: {[found for found, _ in outcomes]} | bytes سالم: {all(ok for _, ok in outcomes)}")
+    ok = all(count == 1 for count in id_counts.values()) and all(ok for _, ok in outcomes)
+    print("نتیجه:", "یک دریافت برای هر کلید ✅" if ok else "دریافت تکراری یا مقدار خراب ❌")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,448 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from cache_backend import BACKEND_ERRORS, CacheBackend, MemoryBackend, build_backend
+from rate_limiter import RateLimited
+from metrics import CallbackMetric
+from config import (
+    CACHE_BACKEND, CACHE_SQLITE_PATH, CACHE_REDIS_URL,
+    CACHE_STALE_TTL, CACHE_LOCK_TTL, CACHE_LOCK_WAIT,
+)
+
+# تنظیم لاگینگ
+logger = logging.getLogger(__name__)
+
+class BudgetExceeded(RateLimited):
+    """داده‌ای در کش نیست و دریافت آن در بودجه زمانی درخواست تمام نشد (دریافت در پس‌زمینه ادامه دارد)"""
+
+
+class LeaderCancelled(Exception):
+    """
+    درخواستی که دریافت مشترک یک کلید را انجام می‌داد لغو شد. روی future مشترک گذاشته می‌شود
+    (به‌جای لغو آن) تا منتظرهای هم‌زمان CancelledError نگیرند و دریافت را خودشان تکرار کنند.
+    """
+
+
+def as_of_marker(as_of: Optional[float]) -> str:
+    """برچسب «داده مربوط به ساعت HH:MM» برای پاسخ‌هایی که از داده قدیمی ساخته شده‌اند"""
+    if as_of is None:
+        return ""
+    return f"\n🕒 آخرین داده موجود از ساعت {time.strftime('%H:%M', time.gmtime(as_of))} (UTC)"
+
+
+# پشتوانه مشترک (sqlite یا redis) که همه کش‌ها با namespace جدا در آن ذخیره می‌شوند
+_shared: Optional[CacheBackend] = None
+# همه کش‌های ساخته‌شده (برای متریک‌ها)
+_caches: list["TTLCache"] = []
+
+
+def is_shared() -> bool:
+    """آیا کش بین چند پردازه مشترک است"""
+    return CACHE_BACKEND != "memory"
+
+
+def get_backend(max_size: int) -> CacheBackend:
+    """پشتوانه مشترک (در صورت تنظیم) یا یک کش حافظه اختصاصی با سقف max_size"""
+    global _shared
+    if not is_shared():
+        return MemoryBackend(max_size)
+    if _shared is None:
+        _shared = build_backend(CACHE_BACKEND, CACHE_SQLITE_PATH, CACHE_REDIS_URL)
+        logger.info("پشتوانه کش مشترک: %s", _shared.name)
+    return _shared
+
+
+async def close_cache(application=None) -> None:
+    """بستن اتصال پشتوانه مشترک (در post_shutdown برنامه)"""
+    if _shared is not None:
+        await _shared.close()
+
+
+class TTLCache:
+    """
+    کش با انقضای زمانی (TTL) روی یک پشتوانه قابل تعویض (حافظه، SQLite یا Redis).
+    درخواست‌های هم‌زمان یک کلید در هر پردازه به یک درخواست واحد (single-flight) تبدیل
+    می‌شوند؛ با پشتوانه مشترک، قفل دریافت باعث می‌شود در هر TTL فقط یک پردازه
+    برای هر کلید به کوین‌گکو درخواست بفرستد و بقیه منتظر نتیجه آن بمانند.
+    """
+
+    def __init__(self, namespace: str, ttl: float, max_size: int = 1000):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.backend = get_backend(max_size)
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._refreshing: dict[Hashable, asyncio.Task] = {}
+        # شمارنده‌ها برای تنظیم TTL
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.remote_hits = 0  # مقدار دریافت‌شده توسط پردازه دیگر پس از انتظار برای قفل
+        self.stale_served = 0
+        self.backend_errors = 0
+        _caches.append(self)
+
+    def _key(self, key: Hashable) -> str:
+        parts = key if isinstance(key, tuple) else (key,)
+        return ":".join([self.namespace, *map(str, parts)])
+
+    async def _get_entries(self, keys: list[str]) -> dict:
+        try:
+            return await self.backend.get_many(keys)
+        except BACKEND_ERRORS as e:
+            # خرابی پشتوانه مشترک کش را غیرفعال می‌کند، نه ربات را
+            self.backend_errors += 1
+            logger.warning("خطا در خواندن کش %s: %s", self.namespace, e)
+            return {}
+
+    async def _set_entries(self, items: dict[str, Any], ttl: Optional[float]) -> None:
+        try:
+            await self.backend.set_many(items, self.ttl if ttl is None else ttl, CACHE_STALE_TTL)
+        except BACKEND_ERRORS as e:
+            self.backend_errors += 1
+            logger.warning("خطا در نوشتن کش %s: %s", self.namespace, e)
+
+    async def _lock(self, key: str) -> Optional[str]:
+        """قفل دریافت بین پردازه‌ها؛ بدون پشتوانه مشترک single-flight محلی کافی است"""
+        if not self.backend.shared:
+            return None
+        try:
+            return await self.backend.acquire_lock(key, CACHE_LOCK_TTL)
+        except BACKEND_ERRORS as e:
+            self.backend_errors += 1
+            logger.warning("خطا در گرفتن قفل کش %s: %s", self.namespace, e)
+            return ""  # بدون قفل دریافت می‌کنیم
+
+    async def _unlock(self, key: str, token: Optional[str]) -> None:
+        if token:
+            try:
+                await self.backend.release_lock(key, token)
+            except BACKEND_ERRORS as e:
+                self.backend_errors += 1
+                logger.warning("خطا در آزاد کردن قفل کش %s: %s", self.namespace, e)
+
+    async def _wait_remote(self, keys: list[str]) -> dict[str, Any]:
+        """انتظار (تا CACHE_LOCK_WAIT) برای مقدارهایی که پردازه دارنده قفل ذخیره می‌کند"""
+        deadline = time.monotonic() + CACHE_LOCK_WAIT
+        delay = 0.05
+        found = {}
+        pending = list(keys)
+        while pending and time.monotonic() < deadline:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+            now = time.time()
+            for key, (expires_at, value) in (await self._get_entries(pending)).items():
+                if expires_at > now:
+                    found[key] = value
+            pending = [key for key in pending if key not in found]
+        self.remote_hits += len(found)
+        return found
+
+    async def get(self, key: Hashable, default: Any = None) -> Any:
+        """برگرداندن مقدار تازه کش‌شده یا default (بدون تغییر شمارنده‌ها)"""
+        skey = self._key(key)
+        entry = (await self._get_entries([skey])).get(skey)
+        return entry[1] if entry is not None and entry[0] > time.time() else default
+
+    async def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        await self._set_entries({self._key(key): value}, ttl)
+
+    async def delete(self, key: Hashable) -> None:
+        try:
+            await self.backend.delete(self._key(key))
+        except BACKEND_ERRORS as e:
+            self.backend_errors += 1
+            logger.warning("خطا در حذف از کش %s: %s", self.namespace, e)
+
+    async def get_or_fetch(
+        self,
+        key: Hashable,
+        fetcher: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None,
+        serve_stale: bool = True,
+    ) -> Any:
+        """
+        برگرداندن مقدار از کش یا دریافت آن با fetcher.
+        اگه برای همین کلید درخواستی در جریان باشد (در همین پردازه یا با قفل در پردازه دیگر)،
+        منتظر همان می‌ماند. با serve_stale و خطای RateLimited آخرین مقدار قدیمی برگردانده می‌شود.
+        """
+        skey = self._key(key)
+        entry = (await self._get_entries([skey])).get(skey)
+        if entry is not None and entry[0] > time.time():
+            self.hits += 1
+            return entry[1]
+
+        inflight = self._inflight.get(skey)
+        if inflight is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except LeaderCancelled:
+                return await self.get_or_fetch(key, fetcher, ttl, serve_stale)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[skey] = future
+        try:
+            value = await self._fetch_locked(skey, fetcher, ttl)
+        except asyncio.CancelledError:
+            future.set_exception(LeaderCancelled())
+            future.exception()
+            raise
+        except RateLimited as e:
+            # به‌جای خطا، آخرین مقدار قدیمی (اگه باشد) برگردانده می‌شود
+            if not serve_stale or entry is None:
+                future.set_exception(e)
+                future.exception()
+                raise
+            self.stale_served += 1
+            future.set_result(entry[1])
+            return entry[1]
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # جلوگیری از هشدار "exception was never retrieved"
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            del self._inflight[skey]
+
+    async def _fetch_locked(self, skey: str, fetcher: Callable[[], Awaitable[Any]], ttl: Optional[float]) -> Any:
+        token = await self._lock(skey)
+        if token is None and self.backend.shared:
+            # پردازه دیگری در حال دریافت است
+            found = await self._wait_remote([skey])
+            if skey in found:
+                return found[skey]
+            # دارنده قفل کند یا از کار افتاده: خودمان دریافت می‌کنیم
+        try:
+            if token:
+                # شاید پردازه دیگری درست قبل از گرفتن قفل مقدار را ذخیره کرده باشد
+                entry = (await self._get_entries([skey])).get(skey)
+                if entry is not None and entry[0] > time.time():
+                    self.remote_hits += 1
+                    return entry[1]
+            value = await fetcher()
+            await self._set_entries({skey: value}, ttl)
+            return value
+        finally:
+            await self._unlock(skey, token)
+
+    async def get_many_or_fetch(
+        self, keys: list[Hashable], fetcher: Callable[[list[Hashable]], Awaitable[dict]], ttl: Optional[float] = None
+    ) -> dict:
+        """
+        نسخه دسته‌ای get_or_fetch: کلیدهای موجود از کش، کلیدهای در جریان از درخواست
+        هم‌زمان، و بقیه با یک فراخوانی fetcher (که dict کلید -> مقدار برمی‌گرداند).
+        """
+        skeys = {key: self._key(key) for key in dict.fromkeys(keys)}  # حذف تکراری‌ها با حفظ ترتیب
+        entries = await self._get_entries(list(skeys.values()))
+        now = time.time()
+        results = {}
+        waiting: dict[Hashable, asyncio.Future] = {}
+        missing = []
+        for key, skey in skeys.items():
+            entry = entries.get(skey)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                results[key] = entry[1]
+            elif skey in self._inflight:
+                self.coalesced += 1
+                waiting[key] = self._inflight[skey]
+            else:
+                self.misses += 1
+                missing.append(key)
+
+        if missing:
+            loop = asyncio.get_running_loop()
+            futures = {key: loop.create_future() for key in missing}
+            self._inflight.update({skeys[key]: future for key, future in futures.items()})
+            try:
+                try:
+                    fetched = await self._fetch_many_locked(missing, skeys, fetcher, ttl)
+                except RateLimited:
+                    # اگه برای همه کلیدها مقدار قدیمی داریم، همان‌ها برگردانده می‌شوند
+                    if any(skeys[key] not in entries for key in missing):
+                        raise
+                    self.stale_served += len(missing)
+                    fetched = {key: entries[skeys[key]][1] for key in missing}
+            except asyncio.CancelledError:
+                for future in futures.values():
+                    future.set_exception(LeaderCancelled())
+                    future.exception()
+                raise
+            except Exception as e:
+                for future in futures.values():
+                    future.set_exception(e)
+                    future.exception()
+                raise
+            else:
+                for key, future in futures.items():
+                    future.set_result(fetched.get(key))
+                    results[key] = fetched.get(key)
+            finally:
+                for key in missing:
+                    self._inflight.pop(skeys[key], None)
+
+        retry = []
+        for key, future in waiting.items():
+            try:
+                results[key] = await asyncio.shield(future)
+            except LeaderCancelled:
+                retry.append(key)
+        if retry:
+            results.update(await self.get_many_or_fetch(retry, fetcher, ttl))
+        return results
+
+    async def _fetch_many_locked(
+        self, keys: list[Hashable], skeys: dict, fetcher: Callable[[list[Hashable]], Awaitable[dict]], ttl: Optional[float]
+    ) -> dict:
+        """دریافت دسته‌ای با قفل هر کلید؛ کلیدهای قفل‌شده توسط پردازه دیگر از نتیجه آن خوانده می‌شوند"""
+        tokens = dict(zip(keys, await asyncio.gather(*(self._lock(skeys[key]) for key in keys))))
+        results = {}
+        try:
+            mine = [key for key in keys if tokens[key] is not None or not self.backend.shared]
+            others = [key for key in keys if key not in mine]
+            if self.backend.shared and mine:
+                # مقدارهایی که پیش از گرفتن قفل توسط پردازه دیگر ذخیره شده‌اند
+                now = time.time()
+                entries = await self._get_entries([skeys[key] for key in mine])
+                for key in list(mine):
+                    entry = entries.get(skeys[key])
+                    if entry is not None and entry[0] > now:
+                        self.remote_hits += 1
+                        results[key] = entry[1]
+                        mine.remove(key)
+            # کلیدهای قفل‌شده خودمان پیش از انتظار برای بقیه دریافت می‌شوند؛ وگرنه پردازه‌هایی
+            # که قفل‌های یک دسته را بین خود تقسیم کرده‌اند تا CACHE_LOCK_WAIT منتظر هم می‌مانند
+            if mine:
+                await self._fetch_store(mine, skeys, fetcher, ttl, results)
+            if others:
+                found = await self._wait_remote([skeys[key] for key in others])
+                results.update({key: found[skeys[key]] for key in others if skeys[key] in found})
+                leftover = [key for key in others if skeys[key] not in found]
+                if leftover:
+                    await self._fetch_store(leftover, skeys, fetcher, ttl, results)
+            return results
+        finally:
+            await asyncio.gather(*(self._unlock(skeys[key], token) for key, token in tokens.items()))
+
+    async def _fetch_store(
+        self, keys: list[Hashable], skeys: dict, fetcher: Callable[[list[Hashable]], Awaitable[dict]],
+        ttl: Optional[float], results: dict,
+    ) -> None:
+        """دریافت کلیدها با یک فراخوانی fetcher، ذخیره در کش و افزودن به results"""
+        fetched = await fetcher(keys)
+        values = {key: fetched.get(key) for key in keys}
+        await self._set_entries({skeys[key]: value for key, value in values.items()}, ttl)
+        results.update(values)
+
+    def _refresh(self, key: Hashable, coro_factory: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """اجرای دریافت در پس‌زمینه (یک task برای هر کلید یا دسته، مستقل از لغو درخواست کاربر)"""
+        task = self._refreshing.get(key)
+        if task is None or task.done():
+            task = asyncio.create_task(coro_factory())
+            self._refreshing[key] = task
+
+            def done(finished: asyncio.Task) -> None:
+                if self._refreshing.get(key) is finished:
+                    del self._refreshing[key]
+                if not finished.cancelled() and finished.exception() is not None:
+                    logger.debug("به‌روزرسانی پس‌زمینه کش %s ناموفق بود: %s", self.namespace, finished.exception())
+            task.add_done_callback(done)
+        return task
+
+    async def _await_budget(self, task: asyncio.Task, budget: float) -> Any:
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), budget)
+        except asyncio.TimeoutError:
+            raise BudgetExceeded(max(1.0, budget)) from None
+
+    async def get_swr(
+        self, key: Hashable, fetcher: Callable[[], Awaitable[Any]], budget: float
+    ) -> tuple[Any, Optional[float]]:
+        """
+        stale-while-revalidate: مقدار تازه، یا مقدار قدیمی فوراً همراه با به‌روزرسانی
+        در پس‌زمینه، یا (اگه هیچ مقداری نیست) دریافت با سقف زمانی budget ثانیه.
+        خروجی: (مقدار، زمان دریافت مقدار قدیمی به epoch یا None اگه تازه است)
+        خطاها: BudgetExceeded اگه دریافت در budget تمام نشود، یا خطای خود دریافت
+        """
+        skey = self._key(key)
+        entry = (await self._get_entries([skey])).get(skey)
+        if entry is not None and entry[0] > time.time():
+            self.hits += 1
+            return entry[1], None
+
+        task = self._refresh(skey, lambda: self.get_or_fetch(key, fetcher, serve_stale=False))
+        if entry is not None:
+            self.stale_served += 1
+            return entry[1], entry[0] - self.ttl
+        return await self._await_budget(task, budget), None
+
+    async def get_many_swr(
+        self, keys: list[Hashable], fetcher: Callable[[list[Hashable]], Awaitable[dict]], budget: float
+    ) -> tuple[dict, Optional[float]]:
+        """
+        نسخه دسته‌ای get_swr: کلیدهای قدیمی فوراً برگردانده و همراه کلیدهای ناموجود در
+        پس‌زمینه به‌روز می‌شوند؛ فقط برای کلیدهای ناموجود تا budget ثانیه صبر می‌شود.
+        خروجی: (دیکشنری کلید -> مقدار، زمان قدیمی‌ترین مقدار قدیمی یا None)
+        """
+        skeys = {key: self._key(key) for key in dict.fromkeys(keys)}
+        entries = await self._get_entries(list(skeys.values()))
+        now = time.time()
+        results = {}
+        stale = {}
+        missing = []
+        for key, skey in skeys.items():
+            entry = entries.get(skey)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                results[key] = entry[1]
+            elif entry is not None:
+                stale[key] = entry
+            else:
+                missing.append(key)
+
+        as_of = None
+        if stale or missing:
+            refresh = [*stale, *missing]
+            task = self._refresh(tuple(refresh), lambda: self.get_many_or_fetch(refresh, fetcher))
+            if missing:
+                fetched = await self._await_budget(task, budget)
+                results.update({key: fetched.get(key) for key in refresh})
+            else:
+                self.stale_served += len(stale)
+                results.update({key: entry[1] for key, entry in stale.items()})
+                as_of = min(entry[0] for entry in stale.values()) - self.ttl
+        return results, as_of
+
+    def stats(self) -> dict:
+        """شمارنده‌های کش (برای تنظیم TTL)"""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "backend": self.backend.name,
+            "size": self.backend.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "remote_hits": self.remote_hits,
+            "evictions": getattr(self.backend, "evictions", 0),
+            "stale_served": self.stale_served,
+            "backend_errors": self.backend_errors,
+            "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+
+# نتیجه جستجوهای کش به تفکیک namespace (از شمارنده‌های موجود، بدون هزینه در مسیر اصلی)
+CACHE_OUTCOMES = ("hits", "misses", "coalesced", "remote_hits", "stale_served", "backend_errors")
+CallbackMetric(
+    "cache_lookups_total", "نتیجه جستجوهای کش", ("cache", "outcome"),
+    lambda: {(cache.namespace, outcome): getattr(cache, outcome) for cache in _caches for outcome in CACHE_OUTCOMES},
+    kind="counter",
+)
+CallbackMetric(
+    "cache_entries", "تعداد مدخل‌های کش‌های حافظه", ("cache",),
+    lambda: {(cache.namespace,): cache.backend.size() for cache in _caches if not cache.backend.shared},
+)
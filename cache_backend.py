@@ -0,0 +1,466 @@
+import asyncio
+import base64
+import binascii
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+from urllib.parse import urlparse
+
+# تنظیم لاگینگ
+logger = logging.getLogger(__name__)
+
+# مدخل کش: (زمان انقضا به ثانیه epoch، مقدار)؛ مقدار منقضی تا stale_ttl نگه داشته می‌شود
+Entry = tuple[float, Any]
+
+
+class CodecError(ValueError):
+    """مقدار قابل ذخیره در کش مشترک نیست (فقط انواع JSON و bytes پشتیبانی می‌شوند)"""
+
+
+def _encode_default(value: Any) -> Any:
+    if isinstance(value, (bytes, bytearray)):
+        return {"__bytes__": base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"نوع {type(value).__name__} در کش مشترک پشتیبانی نمی‌شود")
+
+
+def _decode_object(obj: dict) -> Any:
+    if len(obj) == 1 and "__bytes__" in obj:
+        return base64.b64decode(obj["__bytes__"], validate=True)
+    return obj
+
+
+def encode_value(value: Any) -> bytes:
+    """
+    تبدیل مقدار به JSON برای پشتوانه‌های مشترک (bytes مثل تصویر نمودار به base64).
+    داده مشترک هیچ‌وقت unpickle نمی‌شود تا نوشتن در Redis/SQLite به اجرای کد در workerها نرسد.
+    خطاها: CodecError برای انواع غیر JSON (tupleها به list تبدیل می‌شوند)
+    """
+    try:
+        return json.dumps(value, separators=(",", ":"), default=_encode_default).encode()
+    except (TypeError, ValueError) as e:
+        raise CodecError(str(e)) from e
+
+
+def decode_value(data: bytes) -> Any:
+    """خطاها: CodecError برای داده نامعتبر (مثلاً مقدار نسخه قدیمی پس از deploy)"""
+    try:
+        return json.loads(data, object_hook=_decode_object)
+    except (ValueError, TypeError, binascii.Error) as e:
+        raise CodecError(str(e)) from e
+
+
+def _decode_entries(namespace: str, rows) -> dict[str, Entry]:
+    """(کلید، انقضا، داده) -> مدخل‌ها؛ داده نامعتبر مثل miss نادیده گرفته می‌شود"""
+    found = {}
+    for key, expires_at, data in rows:
+        try:
+            found[key] = (expires_at, decode_value(data))
+        except CodecError as e:
+            logger.warning("مقدار نامعتبر در کش %s برای %s نادیده گرفته شد: %s", namespace, key, e)
+    return found
+
+
+class CacheBackend:
+    """
+    رابط پشتوانه کش. همه زمان‌ها ثانیه epoch هستند تا بین پردازه‌ها معنی داشته باشند.
+    پشتوانه‌های shared بین چند پردازه مشترک‌اند و قفل دریافت واقعی دارند.
+    """
+
+    name = "base"
+    shared = False
+
+    async def get_many(self, keys: list[str]) -> dict[str, Entry]:
+        """مدخل‌های موجود (تازه یا منقضی) برای کلیدها"""
+        raise NotImplementedError
+
+    async def set_many(self, items: dict[str, Any], ttl: float, stale_ttl: float) -> None:
+        """ذخیره مقدارها با انقضای ttl و نگهداری تا ttl + stale_ttl"""
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def acquire_lock(self, key: str, ttl: float) -> Optional[str]:
+        """گرفتن قفل دریافت کلید؛ خروجی: توکن قفل یا None اگه پردازه دیگری آن را دارد"""
+        raise NotImplementedError
+
+    async def release_lock(self, key: str, token: str) -> None:
+        """آزاد کردن قفل (فقط اگه هنوز مال همین توکن باشد)"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+    def size(self) -> Optional[int]:
+        """تعداد مدخل‌ها (فقط برای پشتوانه حافظه)"""
+        return None
+
+
+class MemoryBackend(CacheBackend):
+    """کش درون‌پردازه‌ای با حذف LRU (رفتار پیش‌فرض، بدون اشتراک بین پردازه‌ها)"""
+
+    name = "memory"
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data: "OrderedDict[str, tuple[float, float, Any]]" = OrderedDict()
+        self._locks: dict[str, tuple[str, float]] = {}
+        self.evictions = 0
+
+    async def get_many(self, keys: list[str]) -> dict[str, Entry]:
+        now = time.time()
+        found = {}
+        for key in keys:
+            entry = self._data.get(key)
+            if entry is None:
+                continue
+            expires_at, stale_until, value = entry
+            if stale_until < now:
+                del self._data[key]
+                continue
+            self._data.move_to_end(key)
+            found[key] = (expires_at, value)
+        return found
+
+    async def set_many(self, items: dict[str, Any], ttl: float, stale_ttl: float) -> None:
+        now = time.time()
+        for key, value in items.items():
+            self._data[key] = (now + ttl, now + ttl + stale_ttl, value)
+            self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    async def acquire_lock(self, key: str, ttl: float) -> Optional[str]:
+        now = time.time()
+        held = self._locks.get(key)
+        if held is not None and held[1] > now:
+            return None
+        token = secrets.token_hex(8)
+        self._locks[key] = (token, now + ttl)
+        return token
+
+    async def release_lock(self, key: str, token: str) -> None:
+        if self._locks.get(key, (None,))[0] == token:
+            del self._locks[key]
+
+    def size(self) -> Optional[int]:
+        return len(self._data)
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    کش مشترک روی یک فایل SQLite (برای چند worker روی یک میزبان).
+    قفل‌ها ردیف‌های جدول locks با زمان انقضا هستند و با upsert شرطی اتمیک گرفته می‌شوند.
+    """
+
+    name = "sqlite"
+    shared = True
+
+    # پاک‌سازی مدخل‌های کاملاً منقضی پس از این تعداد نوشتن
+    PURGE_EVERY = 500
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS cache (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        expires_at REAL NOT NULL,
+        stale_until REAL NOT NULL
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS locks (
+        key TEXT PRIMARY KEY,
+        token TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache_sqlite")
+        self._connection: Optional[sqlite3.Connection] = None
+        self._writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(self._SCHEMA)
+        return self._connection
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _get_many(self, keys: list[str]) -> dict[str, Entry]:
+        rows = self._connect().execute(
+            f"SELECT key, expires_at, value FROM cache WHERE key IN ({','.join('?' * len(keys))}) AND stale_until >= ?",
+            (*keys, time.time()),
+        ).fetchall()
+        return _decode_entries(self.name, rows)
+
+    def _set_many(self, items: dict[str, bytes], ttl: float, stale_ttl: float) -> None:
+        db = self._connect()
+        now = time.time()
+        with db:
+            db.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, stale_until) VALUES (?, ?, ?, ?)",
+                [(key, value, now + ttl, now + ttl + stale_ttl) for key, value in items.items()],
+            )
+            self._writes += len(items)
+            if self._writes >= self.PURGE_EVERY:
+                self._writes = 0
+                db.execute("DELETE FROM cache WHERE stale_until < ?", (now,))
+                db.execute("DELETE FROM locks WHERE expires_at < ?", (now,))
+
+    def _delete(self, key: str) -> None:
+        db = self._connect()
+        with db:
+            db.execute("DELETE FROM cache WHERE key=?", (key,))
+
+    def _acquire_lock(self, key: str, ttl: float, token: str) -> bool:
+        db = self._connect()
+        now = time.time()
+        with db:
+            cursor = db.execute(
+                """
+                INSERT INTO locks (key, token, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET token = excluded.token, expires_at = excluded.expires_at
+                WHERE locks.expires_at < ?
+                """,
+                (key, token, now + ttl, now),
+            )
+        return cursor.rowcount == 1
+
+    def _release_lock(self, key: str, token: str) -> None:
+        db = self._connect()
+        with db:
+            db.execute("DELETE FROM locks WHERE key=? AND token=?", (key, token))
+
+    def _close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    async def get_many(self, keys: list[str]) -> dict[str, Entry]:
+        return await self._run(self._get_many, keys) if keys else {}
+
+    async def set_many(self, items: dict[str, Any], ttl: float, stale_ttl: float) -> None:
+        payload = {key: encode_value(value) for key, value in items.items()}
+        await self._run(self._set_many, payload, ttl, stale_ttl)
+
+    async def delete(self, key: str) -> None:
+        await self._run(self._delete, key)
+
+    async def acquire_lock(self, key: str, ttl: float) -> Optional[str]:
+        token = secrets.token_hex(8)
+        return token if await self._run(self._acquire_lock, key, ttl, token) else None
+
+    async def release_lock(self, key: str, token: str) -> None:
+        await self._run(self._release_lock, key, token)
+
+    async def close(self) -> None:
+        await self._run(self._close)
+
+
+class RespError(Exception):
+    """پاسخ خطای سرور (-ERR ...)"""
+
+
+# خطاهای قابل انتظار پشتوانه‌های مشترک (در این حالت کش مثل miss رفتار می‌کند)
+BACKEND_ERRORS = (OSError, EOFError, asyncio.IncompleteReadError, sqlite3.Error, CodecError, RespError)
+
+
+class RespClient:
+    """
+    کلاینت حداقلی پروتکل RESP (Redis) روی یک اتصال asyncio.
+    فقط دستورهای ساده استفاده می‌شوند تا با Redis، KeyDB یا یک سرور جایگزین محلی کار کند.
+    """
+
+    def __init__(self, url: str):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _encode(args: tuple) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    async def _read_reply(self) -> Any:
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("اتصال RESP بسته شد")
+        prefix, body = line[:1], line[1:-2]
+        if prefix == b"+":
+            return body.decode()
+        if prefix == b"-":
+            raise RespError(body.decode())
+        if prefix == b":":
+            return int(body)
+        if prefix == b"$":
+            length = int(body)
+            return None if length < 0 else (await self._reader.readexactly(length + 2))[:-2]
+        if prefix == b"*":
+            length = int(body)
+            return None if length < 0 else [await self._read_reply() for _ in range(length)]
+        raise ConnectionError(f"پاسخ RESP نامعتبر: {line!r}")
+
+    async def _connect(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            await self._send([("AUTH", self.password)])
+        if self.db:
+            await self._send([("SELECT", self.db)])
+
+    async def _send(self, commands: list[tuple]) -> list[Any]:
+        """ارسال چند دستور پشت سر هم (pipeline) و خواندن پاسخ‌ها به همان ترتیب"""
+        self._writer.write(b"".join(self._encode(command) for command in commands))
+        await self._writer.drain()
+        replies = []
+        error = None
+        for _ in commands:
+            try:
+                replies.append(await self._read_reply())
+            except RespError as e:
+                # بقیه پاسخ‌ها باید خوانده شوند تا اتصال هم‌گام بماند
+                error = error or e
+                replies.append(None)
+        if error is not None:
+            raise error
+        return replies
+
+    async def pipeline(self, commands: list[tuple]) -> list[Any]:
+        async with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._writer is None:
+                        await self._connect()
+                    return await self._send(commands)
+                except (OSError, asyncio.IncompleteReadError):
+                    # اتصال قدیمی (مثلاً پس از ری‌استارت سرور): یک بار اتصال دوباره
+                    await self._close()
+                    if attempt:
+                        raise
+                except RespError:
+                    # همه پاسخ‌ها خوانده شده‌اند و اتصال هم‌گام است
+                    raise
+                except BaseException:
+                    # لغو یا خطای دیگر در میانه ارسال/خواندن: پاسخ‌های خوانده‌نشده روی اتصال مانده‌اند
+                    # و دستور بعدی پاسخ این دستور را می‌گرفت؛ اتصال بدون await (حتی هنگام لغو) دور ریخته می‌شود
+                    self._abort()
+                    raise
+
+    async def execute(self, *args) -> Any:
+        return (await self.pipeline([args]))[0]
+
+    def _abort(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def _close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+        self._reader = self._writer = None
+
+    async def close(self) -> None:
+        async with self._lock:
+            await self._close()
+
+
+class RedisBackend(CacheBackend):
+    """
+    کش مشترک روی Redis (برای چند worker روی چند میزبان).
+    قفل‌ها کلیدهای SET NX PX هستند؛ آزادسازی با EVAL مقایسه-و-حذف و در صورت پشتیبانی
+    نشدن EVAL (سرور جایگزین) با GET و DEL انجام می‌شود.
+    """
+
+    name = "redis"
+    shared = True
+
+    # پیشوند کلیدها تا با داده‌های دیگر همان Redis تداخل نداشته باشد
+    PREFIX = "crypto_bot:"
+
+    _RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+    def __init__(self, url: str):
+        self.client = RespClient(url)
+        self._eval_supported = True
+
+    async def get_many(self, keys: list[str]) -> dict[str, Entry]:
+        if not keys:
+            return {}
+        values = await self.client.execute("MGET", *(self.PREFIX + key for key in keys))
+        rows = []
+        for key, value in zip(keys, values):
+            if value is None:
+                continue
+            # قالب مقدار: زمان انقضا، خط جدید، JSON
+            expires_at, _, data = value.partition(b"\n")
+            try:
+                rows.append((key, float(expires_at), data))
+            except ValueError:
+                logger.warning("مقدار نامعتبر در کش redis برای %s نادیده گرفته شد", key)
+        return _decode_entries(self.name, rows)
+
+    async def set_many(self, items: dict[str, Any], ttl: float, stale_ttl: float) -> None:
+        expires_at = time.time() + ttl
+        keep_ms = max(1, int((ttl + stale_ttl) * 1000))
+        await self.client.pipeline([
+            ("SET", self.PREFIX + key, b"%.3f\n%s" % (expires_at, encode_value(value)), "PX", keep_ms)
+            for key, value in items.items()
+        ])
+
+    async def delete(self, key: str) -> None:
+        await self.client.execute("DEL", self.PREFIX + key)
+
+    async def acquire_lock(self, key: str, ttl: float) -> Optional[str]:
+        token = secrets.token_hex(8)
+        reply = await self.client.execute("SET", f"{self.PREFIX}lock:{key}", token, "NX", "PX", max(1, int(ttl * 1000)))
+        return token if reply == "OK" else None
+
+    async def release_lock(self, key: str, token: str) -> None:
+        lock_key = f"{self.PREFIX}lock:{key}"
+        if self._eval_supported:
+            try:
+                await self.client.execute("EVAL", self._RELEASE_SCRIPT, 1, lock_key, token)
+                return
+            except RespError:
+                self._eval_supported = False
+        if await self.client.execute("GET", lock_key) == token.encode():
+            await self.client.execute("DEL", lock_key)
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+def build_backend(kind: str, sqlite_path: str, redis_url: str) -> CacheBackend:
+    """ساخت پشتوانه مشترک بر اساس تنظیمات (sqlite یا redis)"""
+    if kind == "sqlite":
+        return SQLiteBackend(sqlite_path)
+    if kind == "redis":
+        return RedisBackend(redis_url)
+    raise ValueError(f"پشتوانه کش ناشناخته: {kind}")
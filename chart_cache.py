@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from cache import LeaderCancelled, TTLCache, is_shared
+from metrics import CallbackMetric
+from config import (
+    CHART_CACHE_BUCKET, CHART_CACHE_MEMORY_BYTES, CHART_CACHE_DISK_BYTES,
+    CHART_CACHE_DIR, CHART_CACHE_MAX_FILE_IDS,
+)
+
+# تنظیم لاگینگ
+logger = logging.getLogger(__name__)
+
+# کلید کش: (coin_id, days, vs_currency, theme, bucket زمان آخرین نقطه داده، قیمت آخرین نقطه)
+ChartKey = tuple[str, str, str, str, int, float]
+
+# لایه حافظه: کلید -> بایت‌های PNG (به ترتیب LRU)
+_memory: "OrderedDict[ChartKey, bytes]" = OrderedDict()
+_memory_bytes = 0
+# file_id تلگرام برای نمودارهایی که یک بار آپلود شده‌اند (با پشتوانه مشترک بین workerها)
+_file_ids = TTLCache("chart_file_id", ttl=CHART_CACHE_BUCKET * 2, max_size=CHART_CACHE_MAX_FILE_IDS)
+# لایه تصویر مشترک بین workerها (به‌جای دیسک محلی، فقط وقتی پشتوانه کش مشترک است)
+_shared_images: Optional[TTLCache] = TTLCache("chart_png", ttl=CHART_CACHE_BUCKET * 2) if is_shared() else None
+# رسم‌های در جریان (تا درخواست‌های هم‌زمان یک نمودار فقط یک بار رسم شوند)
+_inflight: dict[ChartKey, asyncio.Future] = {}
+
+# شمارنده‌ها
+stats = {"memory_hits": 0, "disk_hits": 0, "shared_hits": 0, "file_id_hits": 0, "misses": 0}
+CallbackMetric(
+    "chart_cache_lookups_total", "نتیجه جستجوی نمودار در لایه‌های کش", ("outcome",),
+    lambda: {(outcome,): count for outcome, count in stats.items()}, kind="counter",
+)
+
+
+def chart_key(
+    coin_id: str, days, vs_currency: str, theme: str, last_ts: float, last_price: float
+) -> ChartKey:
+    """
+    ساخت کلید کش از خود داده سری: bucket زمان آخرین نقطه (میلی‌ثانیه، CHART_CACHE_BUCKET ثانیه‌ای)
+    و قیمت آن. نمودار فقط وقتی دوباره رسم می‌شود که سری تغییر کرده باشد (نقطه جدید یا close تازه
+    آخرین bucket)، نه در هر مرز زمانی ساعت دیواری.
+    """
+    bucket = int(last_ts // (CHART_CACHE_BUCKET * 1000))
+    return coin_id, str(days), vs_currency, theme, bucket, float(last_price)
+
+
+def _disk_path(key: ChartKey) -> str:
+    """مسیر فایل نمودار روی دیسک"""
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()
+    return os.path.join(CHART_CACHE_DIR, f"{digest}.png")
+
+
+def _memory_put(key: ChartKey, image: bytes) -> None:
+    """افزودن به لایه حافظه و حذف LRU تا زیر سقف حجم"""
+    global _memory_bytes
+    if key in _memory:
+        _memory_bytes -= len(_memory.pop(key))
+    _memory[key] = image
+    _memory_bytes += len(image)
+    while _memory_bytes > CHART_CACHE_MEMORY_BYTES and len(_memory) > 1:
+        _, evicted = _memory.popitem(last=False)
+        _memory_bytes -= len(evicted)
+
+
+def _disk_read(key: ChartKey) -> Optional[bytes]:
+    """خواندن نمودار از لایه دیسک"""
+    try:
+        with open(_disk_path(key), "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _disk_write(key: ChartKey, image: bytes) -> None:
+    """نوشتن نمودار روی دیسک و حذف قدیمی‌ترین فایل‌ها تا زیر سقف حجم"""
+    os.makedirs(CHART_CACHE_DIR, exist_ok=True)
+    path = _disk_path(key)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(image)
+    os.replace(tmp_path, path)
+
+    entries = []
+    total = 0
+    with os.scandir(CHART_CACHE_DIR) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.endswith(".png"):
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+    for _, size, old_path in sorted(entries):
+        if total <= CHART_CACHE_DISK_BYTES:
+            break
+        try:
+            os.remove(old_path)
+            total -= size
+        except FileNotFoundError:
+            pass
+
+
+async def _get_or_render_shared(key: ChartKey, render: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[bytes]:
+    """تصویر از کش مشترک؛ با قفل بین پردازه‌ها هر نمودار فقط در یک worker رسم می‌شود"""
+    rendered = False
+
+    async def render_once() -> Optional[bytes]:
+        nonlocal rendered
+        rendered = True
+        return await render()
+
+    image = await _shared_images.get_or_fetch(key, render_once, serve_stale=False)
+    stats["misses" if rendered else "shared_hits"] += 1
+    if image is None:
+        # نبود داده کش نمی‌شود
+        await _shared_images.delete(key)
+    return image
+
+
+async def get_or_render(key: ChartKey, render: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[bytes]:
+    """
+    برگرداندن PNG نمودار از حافظه، دیسک یا با رسم جدید.
+    خروجی None از render (مثلاً نبود داده) کش نمی‌شود.
+    """
+    image = _memory.get(key)
+    if image is not None:
+        _memory.move_to_end(key)
+        stats["memory_hits"] += 1
+        return image
+
+    inflight = _inflight.get(key)
+    if inflight is not None:
+        try:
+            return await asyncio.shield(inflight)
+        except LeaderCancelled:
+            return await get_or_render(key, render)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        if _shared_images is not None:
+            image = await _get_or_render_shared(key, render)
+        else:
+            image = await asyncio.to_thread(_disk_read, key)
+            if image is not None:
+                stats["disk_hits"] += 1
+            else:
+                stats["misses"] += 1
+                image = await render()
+                if image is not None:
+                    await asyncio.to_thread(_disk_write, key, image)
+        if image is not None:
+            _memory_put(key, image)
+        future.set_result(image)
+        return image
+    except asyncio.CancelledError:
+        future.set_exception(LeaderCancelled())
+        future.exception()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # جلوگیری از هشدار "exception was never retrieved"
+        raise
+    finally:
+        del _inflight[key]
+
+
+async def get_file_id(key: ChartKey) -> Optional[str]:
+    """file_id تلگرام نمودار (اگه قبلاً ارسال شده باشد)"""
+    file_id = await _file_ids.get(key)
+    if file_id is not None:
+        stats["file_id_hits"] += 1
+    return file_id
+
+
+async def set_file_id(key: ChartKey, file_id: str) -> None:
+    """ثبت file_id پس از اولین reply_photo"""
+    await _file_ids.set(key, file_id)
+
+
+async def forget_file_id(key: ChartKey) -> None:
+    """حذف file_id نامعتبر (مثلاً اگه تلگرام آن را نپذیرد)"""
+    await _file_ids.delete(key)
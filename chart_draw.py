@@ -0,0 +1,164 @@
+import logging
+from io import BytesIO
+from typing import Optional
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.style
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.dates import AutoDateLocator, ConciseDateFormatter
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter
+
+from chart_series import bollinger, downsample_indices, ema, parse_indicators, rsi, sma
+from config import CHART_INDICATORS, CHART_MAX_POINTS, CHART_DOWNSAMPLE
+
+# این ماژول فقط در پردازه‌های pool رسم (chart_render) بارگذاری می‌شود تا matplotlib
+# در پردازه اصلی ربات import نشود.
+
+# تنظیم لاگینگ
+logger = logging.getLogger(__name__)
+
+
+def _range_label(days: str) -> str:
+    """عنوان بازه زمانی نمودار"""
+    return "کل تاریخچه" if days == "max" else f"{days} روز گذشته"
+
+
+def render_price_chart(
+    symbol: str,
+    timestamps: np.ndarray,
+    prices: np.ndarray,
+    volumes: np.ndarray,
+    days: str = "7",
+    currency: str = "usd",
+    unit: str = "$",
+    indicators: Optional[list[tuple[str, int]]] = None,
+    max_points: int = CHART_MAX_POINTS,
+    downsample: str = CHART_DOWNSAMPLE,
+) -> bytes:
+    """
+    رسم نمودار قیمت با API شیءگرای matplotlib (بدون وضعیت سراسری pyplot).
+    تابع خالص است تا در پردازه‌های جدا قابل اجرا باشد.
+    شاخص‌ها روی داده کامل محاسبه و سپس همراه قیمت به عرض تصویر کاهش داده می‌شوند،
+    پس زمان رسم با تعداد نقاط خام رشد نمی‌کند.
+    ورودی:
+        symbol: نماد ارز برای عنوان نمودار
+        timestamps: زمان‌ها به میلی‌ثانیه (float64)
+        prices: قیمت‌ها به ارز currency
+        volumes: حجم معاملات (NaN اگه موجود نباشد)
+        days: بازه نمودار (برای عنوان)
+        currency، unit: کد و نماد ارز قیمت‌ها (مثل usd و $ یا btc و BTC)
+        indicators: لیست (نام، پنجره) مثل [("sma", 20), ("rsi", 14)]
+    خروجی: بایت‌های تصویر PNG
+    """
+    if indicators is None:
+        indicators = parse_indicators(CHART_INDICATORS)
+
+    # محاسبه برداری شاخص‌ها روی داده کامل
+    lines = []
+    bands = []
+    rsi_values = None
+    for name, window in indicators:
+        if name == "sma":
+            lines.append((f"SMA {window}", sma(prices, window)))
+        elif name == "ema":
+            lines.append((f"EMA {window}", ema(prices, window)))
+        elif name == "bb":
+            _, upper, lower = bollinger(prices, window)
+            bands.append((f"Bollinger {window}", upper, lower))
+        elif name == "rsi":
+            rsi_values = (window, rsi(prices, window))
+    show_volume = any(name == "volume" for name, _ in indicators) and not np.all(np.isnan(volumes))
+
+    # محاسبه قیمت بالا و پایین روی داده کامل
+    high_price = float(np.max(prices))
+    low_price = float(np.min(prices))
+
+    # نماد ارز در متن matplotlib ($ شروع فرمول mathtext است و باید escape شود)
+    prefix = len(unit) == 1
+    unit = unit.replace("$", r"\$")
+
+    def money(value: float, decimals: int) -> str:
+        number = f"{value:,.{decimals}f}"
+        return f"{unit}{number}" if prefix else f"{number} {unit}"
+
+    # کاهش نقاط به عرض تصویر
+    keep = downsample_indices(timestamps, prices, max_points, downsample)
+    x = timestamps[keep] / 86_400_000.0  # روز از epoch (واحد تاریخ matplotlib)
+
+    # تنظیم تم تیره فقط برای همین نمودار
+    with matplotlib.style.context('dark_background'):
+        fig = Figure(figsize=(10, 5 + 1.2 * show_volume + 1.2 * (rsi_values is not None)), facecolor='black', layout='constrained')
+        FigureCanvasAgg(fig)
+        ratios = [4] + [1] * show_volume + [1] * (rsi_values is not None)
+        grid = fig.add_gridspec(len(ratios), 1, height_ratios=ratios)
+        ax = fig.add_subplot(grid[0])
+        axes = [ax]
+        ax.set_facecolor('black')
+
+        # رسم نمودار قیمت
+        ax.plot(x, prices[keep], label=f"{symbol.upper()} Price ({currency.upper()})", color='cyan', linewidth=2)
+        # رسم شاخص‌ها
+        for (label, upper, lower), color in zip(bands, ('violet', 'khaki')):
+            ax.fill_between(x, lower[keep], upper[keep], color=color, alpha=0.15, label=label)
+        for (label, values), color in zip(lines, ('orange', 'lime', 'magenta', 'yellow')):
+            ax.plot(x, values[keep], label=label, color=color, linestyle='--', linewidth=1.5)
+
+        # تنظیم محورها
+        ax.set_title(
+            f"نمودار قیمت {symbol.upper()} ({_range_label(days)})\n"
+            f"بالاترین: {money(high_price, 2 if high_price >= 1 else 8)} | پایین‌ترین: {money(low_price, 2 if low_price >= 1 else 8)}",
+            color='white', fontsize=12, pad=15
+        )
+        ax.set_ylabel(f"قیمت ({currency.upper()})", color='white', fontsize=10)
+        ax.tick_params(axis='y', colors='white')
+        ax.yaxis.set_major_formatter(FuncFormatter(lambda v, _: money(v, 0 if abs(v) >= 10 else 4 if abs(v) >= 0.01 else 8)))
+        ax.legend(facecolor='black', edgecolor='white', labelcolor='white', loc='upper left')
+
+        # نمودار میله‌ای حجم معاملات
+        if show_volume:
+            vol_ax = fig.add_subplot(grid[len(axes)], sharex=ax)
+            axes.append(vol_ax)
+            # vlines یک LineCollection می‌سازد؛ بسیار سریع‌تر از bar با یک patch برای هر میله
+            vol_ax.vlines(x, 0, volumes[keep], color='steelblue', alpha=0.7, linewidth=1)
+            vol_ax.set_ylabel("حجم", color='white', fontsize=9)
+            vol_ax.yaxis.set_major_formatter(FuncFormatter(lambda v, _: f'{v / 1e9:,.1f}B'))
+
+        # نمودار RSI با خطوط 30 و 70
+        if rsi_values is not None:
+            window, values = rsi_values
+            rsi_ax = fig.add_subplot(grid[len(axes)], sharex=ax)
+            axes.append(rsi_ax)
+            rsi_ax.plot(x, values[keep], color='gold', linewidth=1.2)
+            rsi_ax.axhline(70, color='red', linestyle=':', linewidth=1)
+            rsi_ax.axhline(30, color='green', linestyle=':', linewidth=1)
+            rsi_ax.set_ylim(0, 100)
+            rsi_ax.set_ylabel(f"RSI {window}", color='white', fontsize=9)
+
+        # تنظیم تیک‌های محور X با تاریخ‌ها (فقط روی محور پایینی)
+        locator = AutoDateLocator(maxticks=7)
+        axes[-1].xaxis.set_major_locator(locator)
+        axes[-1].xaxis.set_major_formatter(ConciseDateFormatter(locator))
+        axes[-1].set_xlabel("تاریخ", color='white', fontsize=10)
+        for axis in axes:
+            axis.grid(True, linestyle='--', alpha=0.5, color='gray')
+            axis.tick_params(colors='white')
+            if axis is not axes[-1]:
+                axis.tick_params(labelbottom=False)
+
+        # ذخیره نمودار در حافظه
+        buffer = BytesIO()
+        fig.savefig(buffer, format="png", bbox_inches='tight', facecolor='black')
+    return buffer.getvalue()
+
+
+def warm_up() -> None:
+    """
+    بارگذاری matplotlib، فونت‌ها و backend Agg با رسم یک نمودار کوچک
+    تا اولین درخواست واقعی سریع باشد.
+    """
+    timestamps = np.arange(64, dtype=np.float64) * 3_600_000.0
+    prices = np.linspace(1.0, 2.0, 64)
+    render_price_chart("warmup", timestamps, prices, prices)
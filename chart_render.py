@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Optional
+
+from metrics import render_seconds, span
+from config import CHART_WORKERS, CHART_POOL_START_METHOD
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# تنظیم لاگینگ
+logger = logging.getLogger(__name__)
+
+# pool پردازه‌های رسم نمودار (در اولین رسم یا warm-up ساخته می‌شود)
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _init_worker() -> None:
+    """initializer پردازه‌های pool: matplotlib فقط در همین پردازه‌ها بارگذاری و گرم می‌شود"""
+    import chart_draw
+    chart_draw.warm_up()
+
+
+def _draw(*args) -> bytes:
+    """اجرای رسم در پردازه pool (پردازه اصلی chart_draw را import نمی‌کند)"""
+    import chart_draw
+    return chart_draw.render_price_chart(*args)
+
+
+def _noop() -> None:
+    """کار خالی برای وادار کردن pool به ساخت همه پردازه‌ها"""
+
+
+async def start_render_pool(application=None) -> None:
+    """ساخت pool پردازه‌های رسم و گرم کردن همه workerها"""
+    global _pool
+    if _pool is not None:
+        return
+    _pool = ProcessPoolExecutor(
+        max_workers=CHART_WORKERS,
+        mp_context=multiprocessing.get_context(CHART_POOL_START_METHOD),
+        initializer=_init_worker,
+    )
+    pool = _pool
+    loop = asyncio.get_running_loop()
+    try:
+        await asyncio.gather(*(loop.run_in_executor(pool, _noop) for _ in range(CHART_WORKERS)))
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+    logger.info("pool رسم نمودار با %s پردازه آماده شد", CHART_WORKERS)
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    """کنار گذاشتن pool خراب (مثلاً پس از کشته شدن یک worker)؛ رسم بعدی pool تازه می‌سازد"""
+    global _pool
+    if _pool is pool:
+        _pool = None
+        logger.warning("pool رسم نمودار خراب شد؛ pool تازه ساخته می‌شود")
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def close_render_pool(application=None) -> None:
+    """بستن pool پردازه‌های رسم"""
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
+
+
+async def render_chart(
+    symbol: str, timestamps: np.ndarray, prices: np.ndarray, volumes: np.ndarray, days: str = "7",
+    currency: str = "usd", unit: str = "$",
+) -> bytes:
+    """
+    رسم نمودار در pool پردازه‌ها بدون مسدود کردن event loop.
+    currency و unit کد و نماد ارز قیمت‌ها هستند (workerها جدول نرخ ارز را import نمی‌کنند).
+    اگه pool خراب شده باشد (مرگ یک worker با OOM یا سیگنال)، یک بار با pool تازه تکرار می‌شود.
+    """
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        if _pool is None:
+            await start_render_pool()
+        pool = _pool
+        try:
+            with render_seconds.time(), span("render"):
+                return await loop.run_in_executor(
+                    pool, _draw, symbol, timestamps, prices, volumes, days, currency, unit
+                )
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            if attempt:
+                raise
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from startup import lazy_import
+
+# numpy در اولین محاسبه بارگذاری می‌شود (نه هنگام شروع ربات)
+np = lazy_import("numpy")
+
+# بازه‌های مجاز نمودار: ورودی کاربر -> مقدار پارامتر days کوین‌گکو
+CHART_RANGES = {
+    "1d": "1",
+    "7d": "7",
+    "30d": "30",
+    "90d": "90",
+    "365d": "365",
+    "1y": "365",
+    "max": "max",
+}
+
+
+def parse_range(text: str) -> Optional[str]:
+    """تبدیل بازه ورودی کاربر (مثل 30d یا 30) به مقدار days؛ None اگه نامعتبر باشد"""
+    text = text.strip().lower()
+    if text.isdigit():
+        text = f"{text}d"
+    return CHART_RANGES.get(text)
+
+
+def parse_market_chart(data: dict) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    تبدیل پاسخ market_chart به آرایه‌های float64 بدون حلقه پایتونی.
+    خروجی: (زمان‌ها به میلی‌ثانیه، قیمت‌ها، حجم‌ها)
+    """
+    prices = np.asarray(data.get("prices") or [], dtype=np.float64).reshape(-1, 2)
+    timestamps = prices[:, 0]
+    volumes = np.full(len(prices), np.nan)
+    raw_volumes = np.asarray(data.get("total_volumes") or [], dtype=np.float64).reshape(-1, 2)
+    if len(raw_volumes) == len(prices):
+        volumes = raw_volumes[:, 1]
+    return timestamps, prices[:, 1], volumes
+
+
+def parse_indicators(spec: str) -> list[tuple[str, int]]:
+    """
+    تبدیل رشته تنظیمات (مثل "sma20,ema50,bb20,rsi14,volume") به لیست (نام، پنجره).
+    نام‌های نامعتبر نادیده گرفته می‌شوند.
+    """
+    indicators = []
+    for item in spec.lower().split(","):
+        item = item.strip()
+        name = item.rstrip("0123456789")
+        window = item[len(name):]
+        if name in ("sma", "ema", "bb", "rsi") and window:
+            indicators.append((name, int(window)))
+        elif name == "volume":
+            indicators.append((name, 0))
+    return indicators
+
+
+def sma(values: np.ndarray, window: int) -> np.ndarray:
+    """میانگین متحرک ساده با cumsum؛ نقاط ابتدایی (کمتر از window) برابر NaN"""
+    result = np.full(len(values), np.nan)
+    if window <= 0 or len(values) < window:
+        return result
+    cumsum = np.cumsum(np.insert(values, 0, 0.0))
+    result[window - 1:] = (cumsum[window:] - cumsum[:-window]) / window
+    return result
+
+
+def ema(values: np.ndarray, window: int = 0, alpha: Optional[float] = None) -> np.ndarray:
+    """
+    میانگین متحرک نمایی (معادل adjust=True) به‌صورت کانولوشن با وزن‌های بریده‌شده.
+    وزن‌هایی که از 1e-12 کوچک‌ترند حذف می‌شوند، پس هزینه O(n·k) در کد C است.
+    """
+    if alpha is None:
+        alpha = 2.0 / (window + 1)
+    n = len(values)
+    if n == 0:
+        return np.empty(0)
+    decay = 1.0 - alpha
+    length = n if decay <= 0 else min(n, int(np.ceil(np.log(1e-12) / np.log(decay))) + 1)
+    weights = decay ** np.arange(length)
+    numerator = np.convolve(values, weights)[:n]
+    denominator = np.convolve(np.ones(n), weights)[:n]
+    return numerator / denominator
+
+
+def bollinger(values: np.ndarray, window: int, width: float = 2.0) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """باندهای بولینگر: (میانه، باند بالا، باند پایین) با واریانس متحرک از cumsum"""
+    middle = sma(values, window)
+    mean_sq = sma(values * values, window)
+    std = np.sqrt(np.maximum(mean_sq - middle * middle, 0.0))
+    return middle, middle + width * std, middle - width * std
+
+
+def rsi(values: np.ndarray, window: int = 14) -> np.ndarray:
+    """شاخص قدرت نسبی با هموارسازی Wilder (EMA با alpha=1/window)"""
+    result = np.full(len(values), np.nan)
+    if len(values) <= window:
+        return result
+    delta = np.diff(values)
+    gains = ema(np.clip(delta, 0, None), alpha=1.0 / window)
+    losses = ema(np.clip(-delta, 0, None), alpha=1.0 / window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = gains / losses
+        result[1:] = np.where(losses == 0, 100.0, 100.0 - 100.0 / (1.0 + rs))
+    result[:window] = np.nan
+    return result
+
+
+def minmax_indices(y: np.ndarray, threshold: int) -> np.ndarray:
+    """کاهش نقاط با نگه داشتن کمینه و بیشینه هر bucket (کاملاً برداری)"""
+    n = len(y)
+    if threshold >= n or threshold < 4:
+        return np.arange(n)
+    buckets = threshold // 2
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    size = int(np.max(np.diff(edges)))
+    # ماتریس bucketها با padding (NaN) برای argmin/argmax برداری
+    index = edges[:-1, None] + np.arange(size)[None, :]
+    valid = index < edges[1:, None]
+    padded = np.where(valid, y[np.minimum(index, n - 1)], np.nan)
+    mins = edges[:-1] + np.nanargmin(padded, axis=1)
+    maxs = edges[:-1] + np.nanargmax(padded, axis=1)
+    return np.unique(np.concatenate(([0, n - 1], mins, maxs)))
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    الگوریتم Largest-Triangle-Three-Buckets: انتخاب threshold نقطه که شکل نمودار را حفظ کند.
+    حلقه فقط روی bucketهاست (به اندازه عرض تصویر) و محاسبه داخل هر bucket برداری است.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    prev = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        # میانگین bucket بعدی به‌عنوان رأس سوم مثلث
+        avg_x = x[next_start:next_end].mean() if next_end > next_start else x[-1]
+        avg_y = y[next_start:next_end].mean() if next_end > next_start else y[-1]
+        bucket_x, bucket_y = x[start:end], y[start:end]
+        areas = np.abs(
+            (x[prev] - avg_x) * (bucket_y - y[prev]) - (x[prev] - bucket_x) * (avg_y - y[prev])
+        )
+        prev = start + int(np.argmax(areas))
+        selected[i + 1] = prev
+    return selected
+
+
+def downsample_indices(x: np.ndarray, y: np.ndarray, threshold: int, method: str = "lttb") -> np.ndarray:
+    """انتخاب اندیس نقاط قابل نمایش در عرض تصویر با روش lttb یا minmax"""
+    if method == "minmax":
+        return minmax_indices(y, threshold)
+    return lttb_indices(x, y, threshold)
@@ -0,0 +1,108 @@
+import logging
+import time
+from typing import Optional
+
+from rate_limiter import RateLimited
+from metrics import CallbackMetric
+from config import CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT
+
+# تنظیم لاگینگ
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpen(RateLimited):
+    """
+    مدار باز است و درخواستی به کوین‌گکو فرستاده نمی‌شود.
+    زیرکلاس RateLimited است تا کش‌ها داده قدیمی برگردانند و کاربر پیام «دوباره امتحان کنید» ببیند.
+    """
+
+
+class CircuitBreaker:
+    """
+    قطع‌کن مدار سه‌حالته:
+        closed: درخواست‌ها عادی ارسال می‌شوند و خطاهای پشت‌سرهم شمرده می‌شوند
+        open: پس از failure_threshold خطا، تا reset_timeout ثانیه همه درخواست‌ها فوراً رد می‌شوند
+        half_open: پس از reset_timeout فقط یک درخواست آزمایشی؛ موفقیت مدار را می‌بندد
+    پاسخ 429 نه موفقیت است نه خطا (کوین‌گکو در دسترس است ولی سهمیه تمام شده) و وضعیت را تغییر نمی‌دهد.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        # شمارنده‌ها
+        self.opened = 0
+        self.short_circuited = 0
+
+    def check(self) -> Optional[float]:
+        """
+        پیش از هر درخواست؛ اگه مدار باز است CircuitOpen.
+        در half_open جای درخواست آزمایشی گرفته و شناسه آن برگردانده می‌شود (وگرنه None)؛
+        اگه درخواست به کوین‌گکو نرسد یا نتیجه‌اش خنثی باشد، باید با release_probe آزاد شود.
+        """
+        if self.state == "closed":
+            return None
+        now = time.monotonic()
+        if self.state == "open":
+            remaining = self._opened_at + self.reset_timeout - now
+            if remaining > 0:
+                self.short_circuited += 1
+                raise CircuitOpen(remaining)
+            self.state = "half_open"
+            self._probe_started = None
+        # half_open: فقط یک درخواست آزمایشی هم‌زمان (آزمایش گم‌شده پس از reset_timeout جایگزین می‌شود)
+        if self._probe_started is not None and now - self._probe_started < self.reset_timeout:
+            self.short_circuited += 1
+            raise CircuitOpen(1.0)
+        self._probe_started = now
+        return now
+
+    def release_probe(self, probe: Optional[float]) -> None:
+        """آزادسازی جای آزمایش بدون تغییر وضعیت (لغو، RateLimited پیش از ارسال یا پاسخ 429)"""
+        if probe is not None and self._probe_started == probe:
+            self._probe_started = None
+
+    def record_success(self) -> None:
+        if self.state != "closed":
+            logger.info("ارتباط با کوین‌گکو برقرار شد؛ مدار بسته شد")
+        self.state = "closed"
+        self._failures = 0
+        self._probe_started = None
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opened += 1
+                logger.warning(
+                    "%s خطای پشت‌سرهم از کوین‌گکو؛ توقف درخواست‌ها به مدت %.0f ثانیه",
+                    self._failures, self.reset_timeout,
+                )
+            self.state = "open"
+            self._opened_at = time.monotonic()
+            self._probe_started = None
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self._failures,
+            "opened": self.opened,
+            "short_circuited": self.short_circuited,
+        }
+
+
+# قطع‌کن مشترک همه درخواست‌های کوین‌گکو
+breaker = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT)
+
+CallbackMetric(
+    "coingecko_circuit_state", "وضعیت قطع‌کن مدار (1 برای حالت فعلی)", ("state",),
+    lambda: {(state,): int(breaker.state == state) for state in ("closed", "open", "half_open")},
+)
+CallbackMetric(
+    "coingecko_circuit_events_total", "باز شدن مدار و درخواست‌های ردشده در قطعی", ("event",),
+    lambda: {("opened",): breaker.opened, ("short_circuited",): breaker.short_circuited},
+    kind="counter",
+)
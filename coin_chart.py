@@ -1,140 +1,111 @@
 import logging
-import requests
-import matplotlib.pyplot as plt
+from typing import Optional
 from telegram.ext import ContextTypes
-from telegram import Update
+from telegram import Message, Update
+from telegram.error import BadRequest
+from outbound import dispatcher, reply_text
+from symbol_index import resolve_symbol, not_found_message, symbol_for_id
 from io import BytesIO
-import numpy as np
-from datetime import datetime, timedelta
+from chart_render import render_chart
+from market_data import market_data, failure_message
+from user_settings import currency_for
+from exchange_rates import unit
+from metrics import observe_handler
+from chart_cache import chart_key, get_or_render, get_file_id, set_file_id, forget_file_id
 
 # تنظیم لاگینگ
 logger = logging.getLogger(__name__)
 
-# URL API کوین‌گکو
-COINGECKO_API = "https://api.coingecko.com/api/v3"
-
-# دیکشنری نگاشت نمادهای اختصاری به شناسه‌های کامل
-SYMBOL_TO_ID = {
-    "btc": "bitcoin",
-    "eth": "ethereum",
-    "usdt": "tether",
-    "bnb": "binancecoin",
-    "sol": "solana",
-    "xrp": "ripple",
-    "usdc": "usd-coin",
-    "ada": "cardano",
-    "avax": "avalanche-2",
-    "doge": "dogecoin",
-}
-
-async def get_coin_chart(update: Update, context: ContextTypes.DEFAULT_TYPE, symbol: str) -> None:
+@observe_handler("chart")
+async def get_coin_chart(update: Update, context: ContextTypes.DEFAULT_TYPE, symbol: str, days: str = "7") -> None:
     """
-    دریافت و نمایش نمودار قیمت 7 روزه ارز با نماد یا شناسه داده‌شده (case-insensitive).
-    ورودی: نماد ارز (مثل btc یا BTC) یا شناسه (مثل bitcoin)
+    دریافت و نمایش نمودار قیمت ارز با نماد یا شناسه داده‌شده (case-insensitive).
+    ورودی:
+        symbol: نماد ارز (مثل btc یا BTC) یا شناسه (مثل bitcoin)
+        days: بازه نمودار به روز یا "max" (پیش‌فرض 7 روز)
     """
-    logger.debug(f"ورودی نماد: {symbol}")
+    logger.debug("ورودی نماد: %s", symbol)
     if not symbol:
         logger.debug("هیچ نمادی وارد نشده")
-        await update.message.reply_text(
+        reply_text(
+            update.message,
             "لطفاً نماد ارز را وارد کنید. مثال: btc، eth، bitcoin"
         )
         return
 
     # تبدیل نماد به حروف کوچک برای سازگاری
     symbol = symbol.lower()
-    logger.debug(f"درخواست نمودار برای ارز: {symbol} توسط کاربر {update.effective_user.id}")
+    logger.debug("درخواست نمودار برای ارز: %s در چت %s", symbol, update.message.chat_id)
 
-    # تبدیل نماد اختصاری به شناسه کامل (اگه لازم باشه)
-    coin_id = SYMBOL_TO_ID.get(symbol, symbol)
-    logger.debug(f"شناسه ارز برای API: {coin_id}")
+    # تبدیل نماد، نام یا شناسه به شناسه کامل از ایندکس محلی (بدون درخواست شبکه)
+    coin_id = resolve_symbol(symbol)
+    if coin_id is None:
+        logger.debug("نماد در ایندکس یافت نشد: %s", symbol)
+        reply_text(update.message, not_found_message(symbol))
+        return
+    logger.debug("شناسه ارز برای API: %s", coin_id)
 
     try:
-        # درخواست به API کوین‌گکو برای نمودار قیمت 7 روزه
-        response = requests.get(
-            f"{COINGECKO_API}/coins/{coin_id}/market_chart?vs_currency=usd&days=7"
-        )
-        response.raise_for_status()
-        data = response.json()
-        logger.debug(f"پاسخ API برای {coin_id}: {data}")
-
-        if not data.get("prices"):
-            logger.debug(f"داده‌ای برای نمودار یافت نشد: {coin_id}")
-            await update.message.reply_text(
+        currency = currency_for(update)
+        # سری از ذخیره‌ساز محلی (فقط بخش جدید از کوین‌گکو دریافت می‌شود)؛ کلید کش از آخرین نقطه آن ساخته می‌شود
+        series = await market_data.series(coin_id, days, currency)
+        if not len(series):
+            logger.debug("داده‌ای برای نمودار یافت نشد: %s", coin_id)
+            reply_text(
+                update.message,
                 "داده‌ای برای نمودار یافت نشد! نماد را بررسی کنید."
             )
             return
+        key = chart_key(coin_id, days, currency, "dark", series.timestamps[-1], series.prices[-1])
 
-        # استخراج قیمت‌ها و زمان‌ها
-        prices = [price[1] for price in data["prices"]]
-        timestamps = [price[0] for price in data["prices"]]  # زمان‌ها به‌صورت timestamp
-
-        # تبدیل زمان‌ها به تاریخ خوانا
-        dates = [datetime.fromtimestamp(ts / 1000) for ts in timestamps]
-        date_labels = [date.strftime("%Y-%m-%d") for date in dates]
-
-        # محاسبه قیمت بالا و پایین
-        high_price = max(prices)
-        low_price = min(prices)
-
-        # محاسبه میانگین متحرک 3 روزه
-        window_size = 3
-        moving_average = np.convolve(prices, np.ones(window_size)/window_size, mode='valid')
-        # تنظیم طول برای تطبیق با داده‌ها
-        ma_x = range(window_size-1, len(prices))
-
-        # تنظیم تم تیره
-        plt.style.use('dark_background')
-        fig, ax = plt.subplots(figsize=(10, 5), facecolor='black')
-        ax.set_facecolor('black')
-
-        # رسم نمودار قیمت
-        ax.plot(prices, label=f"{symbol.upper()} Price (USD)", color='cyan', linewidth=2)
-        # رسم میانگین متحرک
-        ax.plot(ma_x, moving_average, label="3-Day Moving Average", color='orange', linestyle='--', linewidth=1.5)
-
-        # تنظیم محورها
-        ax.set_title(
-            f"نمودار قیمت {symbol.upper()} (7 روز گذشته)\n"
-            f"بالاترین: ${high_price:,.2f} | پایین‌ترین: ${low_price:,.2f}",
-            color='white', fontsize=12, pad=15
-        )
-        ax.set_xlabel("تاریخ", color='white', fontsize=10)
-        ax.set_ylabel("قیمت (دلار)", color='white', fontsize=10)
-
-        # تنظیم تیک‌های محور X با تاریخ‌ها
-        step = len(dates) // 5  # 5 تیک روی محور X
-        if step == 0:
-            step = 1
-        ax.set_xticks(range(0, len(dates), step))
-        ax.set_xticklabels([date_labels[i] for i in range(0, len(dates), step)], rotation=45, color='white')
-
-        # تنظیم تیک‌های محور Y
-        ax.tick_params(axis='y', colors='white')
-        ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, _: f'${x:,.0f}'))
-
-        # اضافه کردن گرید و لجند
-        ax.grid(True, linestyle='--', alpha=0.5, color='gray')
-        ax.legend(facecolor='black', edgecolor='white', labelcolor='white')
+        async def render() -> Optional[bytes]:
+            # رسم نمودار در pool پردازه‌ها (بدون مسدود کردن event loop)
+            # نماد از شناسه گرفته می‌شود تا تصویر کش‌شده برای btc و bitcoin یکسان باشد
+            return await render_chart(
+                symbol_for_id(coin_id), series.timestamps, series.prices, series.volumes, days, currency, unit(currency)
+            )
 
-        # تنظیمات نهایی
-        plt.tight_layout()
+        message = update.message
+
+        async def send_photo(image: bytes) -> Message:
+            sent = await message.reply_photo(photo=BytesIO(image))
+            # ذخیره file_id تا دفعه بعد بایت‌ها دوباره آپلود نشوند
+            await set_file_id(key, sent.photo[-1].file_id)
+            return sent
+
+        # اگه همین نمودار قبلاً آپلود شده، file_id تلگرام دوباره استفاده می‌شود
+        file_id = await get_file_id(key)
+        if file_id is not None:
+            async def send_cached() -> Message:
+                try:
+                    return await message.reply_photo(photo=file_id)
+                except BadRequest as e:
+                    # file_id نامعتبر: تصویر (معمولاً از کش حافظه یا دیسک) دوباره آپلود می‌شود
+                    logger.debug("file_id نمودار %s پذیرفته نشد: %s", coin_id, e)
+                    await forget_file_id(key)
+                    try:
+                        image = await get_or_render(key, render)
+                    except Exception as render_err:
+                        return await message.reply_text(failure_message(render_err, f"نمودار ارز {coin_id}"))
+                    if image is None:
+                        # مثل مسیر اصلی؛ پاسخ مستقیم چون همین حالا در صف خروجی همین چت هستیم
+                        logger.debug("داده‌ای برای نمودار یافت نشد: %s", coin_id)
+                        return await message.reply_text("داده‌ای برای نمودار یافت نشد! نماد را بررسی کنید.")
+                    return await send_photo(image)
+            dispatcher.submit(message.chat_id, send_cached)
+            return
 
-        # ذخیره نمودار در حافظه
-        buffer = BytesIO()
-        plt.savefig(buffer, format="png", bbox_inches='tight', facecolor='black')
-        buffer.seek(0)
-        plt.close()
+        image = await get_or_render(key, render)
+        if image is None:
+            logger.debug("داده‌ای برای نمودار یافت نشد: %s", coin_id)
+            reply_text(
+                update.message,
+                "داده‌ای برای نمودار یافت نشد! نماد را بررسی کنید."
+            )
+            return
 
-        await update.message.reply_photo(
-            photo=buffer
-        )
+        # ارسال از طریق صف خروجی؛ هندلر منتظر آپلود نمی‌ماند
+        dispatcher.submit(message.chat_id, lambda: send_photo(image))
 
-    except requests.exceptions.HTTPError as http_err:
-        logger.error(f"خطای HTTP در دریافت نمودار ارز {coin_id}: {http_err}")
-        await update.message.reply_text("خطای سرور API. دوباره امتحان کنید یا نماد دیگری وارد کنید.")
-    except requests.exceptions.RequestException as req_err:
-        logger.error(f"خطای شبکه در دریافت نمودار ارز {coin_id}: {req_err}")
-        await update.message.reply_text("خطای شبکه. اینترنت خود را بررسی کنید.")
     except Exception as e:
-        logger.error(f"خطای عمومی در دریافت نمودار ارز {coin_id}: {e}")
-        await update.message.reply_text("خطایی رخ داد. دوباره امتحان کنید یا نماد دیگری وارد کنید.")
\ No newline at end of file
+        reply_text(update.message, failure_message(e, f"نمودار ارز {coin_id}"))
@@ -1,90 +1,72 @@
 import logging
-import requests
 from telegram.ext import ContextTypes
 from telegram import Update
+from outbound import reply_text
+from symbol_index import resolve_symbol, not_found_message
+from market_data import MarketSnapshot, market_data, failure_message
+from cache import as_of_marker
+from exchange_rates import format_amount
+from user_settings import currency_for
+from metrics import observe_handler
 
 # تنظیم لاگینگ
 logger = logging.getLogger(__name__)
 
-# URL API کوین‌گکو
-COINGECKO_API = "https://api.coingecko.com/api/v3"
-
-# دیکشنری نگاشت نمادهای اختصاری به شناسه‌های کامل
-SYMBOL_TO_ID = {
-    "btc": "bitcoin",
-    "eth": "ethereum",
-    "usdt": "tether",
-    "bnb": "binancecoin",
-    "sol": "solana",
-    "xrp": "ripple",
-    "usdc": "usd-coin",
-    "ada": "cardano",
-    "avax": "avalanche-2",
-    "doge": "dogecoin",
-}
-
+@observe_handler("info")
 async def get_coin_info(update: Update, context: ContextTypes.DEFAULT_TYPE, symbol: str) -> None:
     """
     دریافت و نمایش اطلاعات ارز با نماد یا شناسه داده‌شده (case-insensitive).
     ورودی: نماد ارز (مثل btc یا BTC) یا شناسه (مثل bitcoin)
     """
-    logger.debug(f"ورودی نماد: {symbol}")
+    logger.debug("ورودی نماد: %s", symbol)
     if not symbol:
         logger.debug("هیچ نمادی وارد نشده")
-        await update.message.reply_text(
+        reply_text(
+            update.message,
             "لطفاً نماد ارز را وارد کنید. مثال: /info btc، /info eth"
         )
         return
 
     # تبدیل نماد به حروف کوچک برای سازگاری
     symbol = symbol.lower()
-    logger.debug(f"درخواست اطلاعات برای ارز: {symbol} توسط کاربر {update.effective_user.id}")
+    logger.debug("درخواست اطلاعات برای ارز: %s در چت %s", symbol, update.message.chat_id)
 
-    # تبدیل نماد اختصاری به شناسه کامل (اگه لازم باشه)
-    coin_id = SYMBOL_TO_ID.get(symbol, symbol)
-    logger.debug(f"شناسه ارز برای API: {coin_id}")
+    # تبدیل نماد، نام یا شناسه به شناسه کامل از ایندکس محلی (بدون درخواست شبکه)
+    coin_id = resolve_symbol(symbol)
+    if coin_id is None:
+        logger.debug("نماد در ایندکس یافت نشد: %s", symbol)
+        reply_text(update.message, not_found_message(symbol))
+        return
+    logger.debug("شناسه ارز برای API: %s", coin_id)
 
     try:
-        # درخواست به API کوین‌گکو برای اطلاعات ارز
-        response = requests.get(
-            f"{COINGECKO_API}/coins/markets?vs_currency=usd&ids={coin_id}&per_page=1&page=1"
-        )
-        response.raise_for_status()
-        data = response.json()
-        logger.debug(f"پاسخ API برای {coin_id}: {data}")
+        # ارزهای پرطرفدار از snapshot پس‌زمینه، بقیه از کش مشترک یا API کوین‌گکو
+        coin = await market_data.snapshot(coin_id, currency_for(update))
+    except Exception as e:
+        reply_text(update.message, failure_message(e, f"اطلاعات ارز {coin_id}"))
+        return
 
-        if not data:
-            logger.debug(f"ارز یافت نشد: {coin_id}")
-            await update.message.reply_text(
-                "ارز یافت نشد! نماد را بررسی کنید. مثال: btc، eth، bitcoin"
-            )
-            return
+    if coin is None:
+        logger.debug("ارز یافت نشد: %s", coin_id)
+        reply_text(
+            update.message,
+            "ارز یافت نشد! نماد را بررسی کنید. مثال: btc، eth، bitcoin"
+        )
+        return
 
-        # استخراج اطلاعات
-        coin = data[0]
-        name = coin["name"]
-        symbol = coin["symbol"].upper()
-        price = coin["current_price"]
-        change_24h = coin["price_change_percentage_24h"]
-        volume_24h = coin["total_volume"]
-        market_cap = coin["market_cap"]
+    reply_text(update.message, format_coin_info(coin))
 
-        # ساخت پیام
-        message = (
-            f"📊 اطلاعات {name} ({symbol}):\n"
-            f"💵 قیمت: ${price:,.2f}\n"
-            f"📈 تغییر 24 ساعته: {change_24h:.2f}%\n"
-            f"📉 حجم معاملات 24 ساعته: ${volume_24h:,.0f}\n"
-            f"🏦 ارزش بازار: ${market_cap:,.0f}"
-        )
-        await update.message.reply_text(message)
 
-    except requests.exceptions.HTTPError as http_err:
-        logger.error(f"خطای HTTP در دریافت اطلاعات ارز {coin_id}: {http_err}")
-        await update.message.reply_text("خطای سرور API. دوباره امتحان کنید.")
-    except requests.exceptions.RequestException as req_err:
-        logger.error(f"خطای شبکه در دریافت اطلاعات ارز {coin_id}: {req_err}")
-        await update.message.reply_text("خطای شبکه. اینترنت خود را بررسی کنید.")
-    except Exception as e:
-        logger.error(f"خطای عمومی در دریافت اطلاعات ارز {coin_id}: {e}")
-        await update.message.reply_text("خطایی رخ داد. دوباره امتحان کنید.")
\ No newline at end of file
+def format_coin_info(coin: MarketSnapshot) -> str:
+    """متن اطلاعات یک ارز (قیمت، تغییر، حجم و ارزش بازار) به ارز coin.vs_currency"""
+    currency = coin.vs_currency
+    change_24h = f"{coin.change_24h:.2f}%" if coin.change_24h is not None else "-"
+    volume_24h = format_amount(coin.volume_24h, currency, 0) if coin.volume_24h is not None else "-"
+    market_cap = format_amount(coin.market_cap, currency, 0) if coin.market_cap is not None else "-"
+    return (
+        f"📊 اطلاعات {coin.name} ({coin.symbol.upper()}):\n"
+        f"💵 قیمت: {format_amount(coin.price, currency)}\n"
+        f"📈 تغییر 24 ساعته: {change_24h}\n"
+        f"📉 حجم معاملات 24 ساعته: {volume_24h}\n"
+        f"🏦 ارزش بازار: {market_cap}"
+    ) + as_of_marker(coin.as_of)
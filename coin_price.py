@@ -1,76 +1,101 @@
 import logging
-import requests
+import re
 from telegram.ext import ContextTypes
 from telegram import Update
+from outbound import reply_text
+from symbol_index import resolve_symbol, not_found_message
+from telegram.constants import ParseMode
+from market_data import market_data, failure_message, oldest_as_of
+from cache import as_of_marker
+from exchange_rates import format_amount
+from user_settings import currency_for
+from metrics import observe_handler
+from config import PRICE_BATCH_MAX_SYMBOLS
 
 # تنظیم لاگینگ
 logger = logging.getLogger(__name__)
 
-# URL API کوین‌گکو
-COINGECKO_API = "https://api.coingecko.com/api/v3"
-
-# دیکشنری نگاشت نمادهای اختصاری به شناسه‌های کامل
-SYMBOL_TO_ID = {
-    "btc": "bitcoin",
-    "eth": "ethereum",
-    "usdt": "tether",
-    "bnb": "binancecoin",
-    "sol": "solana",
-    "xrp": "ripple",
-    "usdc": "usd-coin",
-    "ada": "cardano",
-    "avax": "avalanche-2",
-    "doge": "dogecoin",
-}
-
+@observe_handler("price")
 async def get_coin_price(update: Update, context: ContextTypes.DEFAULT_TYPE, symbol: str) -> None:
     """
     دریافت و نمایش قیمت ارز با نماد یا شناسه داده‌شده (case-insensitive).
     ورودی: نماد ارز (مثل btc یا BTC) یا شناسه (مثل bitcoin)
     """
-    logger.debug(f"ورودی نماد: {symbol}")
+    logger.debug("ورودی نماد: %s", symbol)
     if not symbol:
         logger.debug("هیچ نمادی وارد نشده")
-        await update.message.reply_text(
+        reply_text(
+            update.message,
             "لطفاً نماد ارز را وارد کنید. مثال: btc، eth، bitcoin"
         )
         return
 
+    # چند نماد (جدا شده با فاصله یا کاما) با یک درخواست دسته‌ای پاسخ داده می‌شوند
+    symbols = [s for s in re.split(r"[\s,]+", symbol.lower()) if s]
+    if len(symbols) > 1:
+        await get_coin_prices(update, context, symbols)
+        return
+
     # تبدیل نماد به حروف کوچک برای سازگاری
     symbol = symbol.lower()
-    logger.debug(f"درخواست قیمت برای ارز: {symbol} توسط کاربر {update.effective_user.id}")
+    logger.debug("درخواست قیمت برای ارز: %s در چت %s", symbol, update.message.chat_id)
 
-    # تبدیل نماد اختصاری به شناسه کامل (اگه لازم باشه)
-    coin_id = SYMBOL_TO_ID.get(symbol, symbol)
-    logger.debug(f"شناسه ارز برای API: {coin_id}")
+    # تبدیل نماد، نام یا شناسه به شناسه کامل از ایندکس محلی (بدون درخواست شبکه)
+    coin_id = resolve_symbol(symbol)
+    if coin_id is None:
+        logger.debug("نماد در ایندکس یافت نشد: %s", symbol)
+        reply_text(update.message, not_found_message(symbol))
+        return
+    logger.debug("شناسه ارز برای API: %s", coin_id)
 
     try:
-        # درخواست به API کوین‌گکو برای قیمت ارز
-        response = requests.get(
-            f"{COINGECKO_API}/simple/price?ids={coin_id}&vs_currencies=usd"
+        # قیمت از لایه داده بازار (snapshot، کش یا API کوین‌گکو) در بودجه زمانی درخواست
+        quote = await market_data.quote(coin_id, currency_for(update))
+    except Exception as e:
+        reply_text(update.message, failure_message(e, f"قیمت ارز {coin_id}"))
+        return
+
+    if quote is None:
+        logger.debug("ارز یافت نشد: %s", coin_id)
+        reply_text(
+            update.message,
+            "ارز یافت نشد! نماد را بررسی کنید. مثال: btc، eth، bitcoin"
         )
-        response.raise_for_status()
-        data = response.json()
-        logger.debug(f"پاسخ API برای {coin_id}: {data}")
+        return
 
-        if coin_id not in data:
-            logger.debug(f"ارز یافت نشد: {coin_id}")
-            await update.message.reply_text(
-                "ارز یافت نشد! نماد را بررسی کنید. مثال: btc، eth، bitcoin"
-            )
-            return
+    reply_text(
+        update.message,
+        f"قیمت {symbol.upper()}: {format_amount(quote.price, quote.vs_currency)}" + as_of_marker(quote.as_of)
+    )
 
-        price = data[coin_id]["usd"]
-        await update.message.reply_text(
-            f"قیمت {symbol.upper()}: ${price:,.2f}"
-        )
+async def get_coin_prices(update: Update, context: ContextTypes.DEFAULT_TYPE, symbols: list[str]) -> None:
+    """
+    دریافت و نمایش قیمت چند ارز در یک جدول با یک درخواست دسته‌ای.
+    ورودی: لیست نمادها یا شناسه‌ها (مثل ["btc", "eth", "solana"])
+    """
+    symbols = list(dict.fromkeys(symbols))[:PRICE_BATCH_MAX_SYMBOLS]
+    logger.debug("درخواست قیمت برای %s ارز در چت %s", len(symbols), update.message.chat_id)
+
+    # تبدیل نمادها به شناسه کامل (نمادهای ناشناخته None می‌شوند و درخواستی برایشان ارسال نمی‌شود)
+    coin_ids = {symbol: resolve_symbol(symbol) for symbol in symbols}
 
-    except requests.exceptions.HTTPError as http_err:
-        logger.error(f"خطای HTTP در دریافت قیمت ارز {coin_id}: {http_err}")
-        await update.message.reply_text("خطای سرور API. دوباره امتحان کنید یا نماد دیگری وارد کنید.")
-    except requests.exceptions.RequestException as req_err:
-        logger.error(f"خطای شبکه در دریافت قیمت ارز {coin_id}: {req_err}")
-        await update.message.reply_text("خطای شبکه. اینترنت خود را بررسی کنید.")
+    try:
+        currency = currency_for(update)
+        quotes = await market_data.quotes([coin_id for coin_id in coin_ids.values() if coin_id], currency)
     except Exception as e:
-        logger.error(f"خطای عمومی در دریافت قیمت ارز {coin_id}: {e}")
-        await update.message.reply_text("خطایی رخ داد. دوباره امتحان کنید یا نماد دیگری وارد کنید.")
\ No newline at end of file
+        reply_text(update.message, failure_message(e, f"قیمت ارزهای {list(coin_ids.values())}"))
+        return
+
+    # ساخت جدول با عرض ثابت
+    width = max(len(symbol) for symbol in symbols)
+    rows = []
+    for symbol, coin_id in coin_ids.items():
+        quote = quotes.get(coin_id) if coin_id else None
+        price_text = format_amount(quote.price, currency) if quote is not None else "یافت نشد"
+        rows.append(f"{symbol.upper():<{width}}  {price_text}")
+
+    reply_text(
+        update.message,
+        "💰 قیمت ارزها:\n<pre>" + "\n".join(rows) + "</pre>" + as_of_marker(oldest_as_of(quotes.values())),
+        parse_mode=ParseMode.HTML,
+    )
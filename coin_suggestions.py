@@ -32,4 +32,13 @@ def get_suggestions_panel(mode: str) -> InlineKeyboardMarkup:
     if row:  # اضافه کردن ردیف آخر اگه پر نشده
         keyboard.append(row)
 
+    # دکمه قیمت همه نمادهای محبوب با یک درخواست دسته‌ای
+    if mode == "price":
+        keyboard.append([
+            InlineKeyboardButton(
+                text="📋 همه",
+                callback_data=f"price_{','.join(POPULAR_COINS)}"  # price_btc,eth,...
+            )
+        ])
+
     return InlineKeyboardMarkup(keyboard)
\ No newline at end of file
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import time
+from typing import Any, Optional
+
+import httpx
+
+from config import (
+    COINGECKO_API, HTTP_TIMEOUT, HTTP_CONNECT_TIMEOUT,
+    HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP_MAX_CONCURRENCY,
+    COINGECKO_DEFAULT_RETRY_AFTER,
+)
+from rate_limiter import Priority, RateLimited, parse_retry_after, scheduler
+from circuit_breaker import CircuitOpen, breaker
+from metrics import span, upstream_rejected, upstream_seconds
+
+# تنظیم لاگینگ
+logger = logging.getLogger(__name__)
+
+# کلاینت مشترک و سمافور محدودکننده هم‌زمانی (در شروع برنامه ساخته می‌شوند)
+_client: Optional[httpx.AsyncClient] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _build_client() -> httpx.AsyncClient:
+    """ساخت کلاینت async با connection pool و keep-alive"""
+    return httpx.AsyncClient(
+        base_url=COINGECKO_API,
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        ),
+        headers={"Accept": "application/json"},
+    )
+
+
+async def start_client(application=None) -> None:
+    """ساخت کلاینت مشترک (در post_init برنامه صدا زده می‌شود)"""
+    global _client, _semaphore
+    if _client is None:
+        _client = _build_client()
+        _semaphore = asyncio.Semaphore(HTTP_MAX_CONCURRENCY)
+        logger.debug("کلاینت کوین‌گکو ساخته شد")
+
+
+def endpoint_label(path: str) -> str:
+    """برچسب endpoint برای متریک‌ها (شناسه ارز جایگزین می‌شود تا تعداد برچسب‌ها محدود بماند)"""
+    parts = path.split("/")
+    if len(parts) > 2 and parts[1] == "coins" and parts[2] not in ("list", "markets"):
+        parts[2] = "{id}"
+    return "/".join(parts)
+
+
+async def close_client(application=None) -> None:
+    """بستن کلاینت مشترک و آزادسازی اتصال‌ها (در post_shutdown برنامه)"""
+    global _client, _semaphore
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        _semaphore = None
+        logger.debug("کلاینت کوین‌گکو بسته شد")
+
+
+async def get_json(
+    path: str,
+    params: Optional[dict] = None,
+    timeout: Optional[float] = None,
+    priority: Priority = Priority.INTERACTIVE,
+) -> Any:
+    """
+    ارسال درخواست GET به کوین‌گکو (از طریق زمان‌بند نرخ سراسری) و برگرداندن پاسخ JSON.
+    ورودی:
+        path: مسیر endpoint (مثل /simple/price)
+        params: پارامترهای query
+        timeout: زمان‌انتظار اختصاصی این درخواست (ثانیه)
+        priority: کلاس اولویت در صف زمان‌بند
+    خطاها: RateLimited وقتی بودجه نرخ تمام شده، پاسخ 429 است یا مدار باز است (CircuitOpen)،
+    httpx.HTTPStatusError برای بقیه پاسخ‌های خطا و httpx.RequestError برای خطای شبکه
+    """
+    if _client is None:
+        # اگه برنامه هنوز کلاینت رو نساخته (مثلاً در اسکریپت‌ها)
+        await start_client()
+
+    kwargs = {"params": params}
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+
+    endpoint = endpoint_label(path)
+    try:
+        # در زمان قطعی کوین‌گکو درخواست فرستاده نمی‌شود (و توکن نرخ هم مصرف نمی‌شود)
+        probe = breaker.check()
+    except CircuitOpen:
+        upstream_rejected.inc(endpoint, "circuit_open")
+        raise
+    try:
+        try:
+            with span("rate_wait"):
+                await scheduler.acquire(priority)
+        except RateLimited:
+            upstream_rejected.inc(endpoint, "rate_limited")
+            raise
+        async with _semaphore:
+            started = time.perf_counter()
+            try:
+                with span(f"GET {endpoint}"):
+                    response = await _client.get(path, **kwargs)
+            except httpx.TransportError as e:
+                upstream_seconds.observe(time.perf_counter() - started, endpoint, type(e).__name__)
+                breaker.record_failure()
+                raise
+    except BaseException:
+        # درخواست آزمایشی به کوین‌گکو نرسید (RateLimited یا لغو)؛ جای آن برای درخواست بعدی آزاد می‌شود
+        breaker.release_probe(probe)
+        raise
+    upstream_seconds.observe(time.perf_counter() - started, endpoint, response.status_code)
+    if response.status_code == 429:
+        # 429 برای قطع‌کن خنثی است: کوین‌گکو پاسخ داده ولی سهمیه تمام شده
+        breaker.release_probe(probe)
+        # توقف همه درخواست‌ها تا پایان Retry-After (به‌جای تکرار فوری و بدتر کردن وضعیت)
+        retry_after = parse_retry_after(response.headers.get("Retry-After"), COINGECKO_DEFAULT_RETRY_AFTER)
+        scheduler.pause(retry_after)
+        raise RateLimited(retry_after)
+    if response.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    response.raise_for_status()
+    return response.json()
@@ -0,0 +1,174 @@
+import os
+from dotenv import load_dotenv
+
+# بارگذاری متغیرهای محیطی از فایل .env (قبل از خواندن تنظیمات)
+load_dotenv()
+
+# URL API کوین‌گکو
+COINGECKO_API = os.getenv("COINGECKO_API_URL", "https://api.coingecko.com/api/v3")
+
+# تنظیمات کلاینت HTTP مشترک
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))  # ثانیه، برای هر درخواست
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+HTTP_MAX_CONCURRENCY = int(os.getenv("HTTP_MAX_CONCURRENCY", "8"))  # حداکثر درخواست هم‌زمان به کوین‌گکو
+
+# تنظیمات کش قیمت
+PRICE_CACHE_TTL = float(os.getenv("PRICE_CACHE_TTL", "30"))  # ثانیه
+PRICE_CACHE_MAX_SIZE = int(os.getenv("PRICE_CACHE_MAX_SIZE", "1000"))
+
+# شناسه کاربران مدیر (با کاما جدا شده) برای دستورات مدیریتی مثل /stats
+ADMIN_USER_IDS = {int(uid) for uid in os.getenv("ADMIN_USER_IDS", "").split(",") if uid.strip()}
+
+# تنظیمات poller پس‌زمینه بازار
+MARKET_POLL_INTERVAL = float(os.getenv("MARKET_POLL_INTERVAL", "60"))  # ثانیه
+MARKET_POLL_MAX_BACKOFF = float(os.getenv("MARKET_POLL_MAX_BACKOFF", "600"))  # سقف تأخیر پس از خطا
+MARKET_POLL_JITTER = float(os.getenv("MARKET_POLL_JITTER", "0.1"))  # نسبت تصادفی‌سازی فاصله‌ها
+MARKET_SNAPSHOT_MAX_AGE = float(os.getenv("MARKET_SNAPSHOT_MAX_AGE", str(MARKET_POLL_INTERVAL * 3)))
+# لیست شناسه‌های ارز (با کاما جدا شده)؛ خالی یعنی ارزهای محبوب و 10 ارز برتر
+MARKET_WATCHLIST = [coin.strip() for coin in os.getenv("MARKET_WATCHLIST", "").split(",") if coin.strip()]
+# تعداد ارزهای برتر (بر اساس ارزش بازار) در snapshot؛ /top در همین ارزها صفحه‌بندی می‌شود
+MARKET_TOP_SIZE = max(10, int(os.getenv("MARKET_TOP_SIZE", "250")))
+# تعداد ارز در هر صفحه /top
+TOP_PAGE_SIZE = int(os.getenv("TOP_PAGE_SIZE", "10"))
+
+# تنظیمات دستور /price چندارزی
+PRICE_BATCH_MAX_SYMBOLS = int(os.getenv("PRICE_BATCH_MAX_SYMBOLS", "50"))
+PRICE_BATCH_MAX_IDS_LENGTH = int(os.getenv("PRICE_BATCH_MAX_IDS_LENGTH", "1500"))  # سقف طول پارامتر ids
+
+# تنظیمات ایندکس نمادها (/coins/list)
+SYMBOL_INDEX_PATH = os.getenv("SYMBOL_INDEX_PATH", os.path.join("data", "coins_list.json"))
+SYMBOL_INDEX_REFRESH = float(os.getenv("SYMBOL_INDEX_REFRESH", "86400"))  # ثانیه (روزانه)
+
+# تنظیمات pool پردازه‌های رسم نمودار
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", str(min(4, os.cpu_count() or 1))))
+CHART_POOL_START_METHOD = os.getenv("CHART_POOL_START_METHOD", "spawn")  # spawn امن‌تر از fork در کنار event loop
+
+# تنظیمات کش تصاویر نمودار
+CHART_CACHE_BUCKET = int(os.getenv("CHART_CACHE_BUCKET", "300"))  # ثانیه؛ طول bucket زمان آخرین نقطه داده در کلید نمودار
+CHART_CACHE_MEMORY_BYTES = int(os.getenv("CHART_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+CHART_CACHE_DISK_BYTES = int(os.getenv("CHART_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))
+CHART_CACHE_DIR = os.getenv("CHART_CACHE_DIR", os.path.join("data", "charts"))
+CHART_CACHE_MAX_FILE_IDS = int(os.getenv("CHART_CACHE_MAX_FILE_IDS", "5000"))
+
+# تنظیمات داده و شاخص‌های نمودار
+CHART_INDICATORS = os.getenv("CHART_INDICATORS", "sma20,ema50,bb20,rsi14,volume")
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "1000"))  # حدوداً عرض تصویر به پیکسل
+CHART_DOWNSAMPLE = os.getenv("CHART_DOWNSAMPLE", "lttb")  # lttb یا minmax
+
+# تنظیمات ذخیره‌ساز محلی سری‌های زمانی قیمت
+TIMESERIES_DB_PATH = os.getenv("TIMESERIES_DB_PATH", os.path.join("data", "timeseries.db"))
+TIMESERIES_MIN_REFRESH = float(os.getenv("TIMESERIES_MIN_REFRESH", "60"))  # حداقل فاصله backfill انتهای سری (ثانیه)
+TIMESERIES_COMPACT_INTERVAL = float(os.getenv("TIMESERIES_COMPACT_INTERVAL", "21600"))  # ثانیه
+
+# بودجه نرخ سراسری کوین‌گکو (token bucket)
+COINGECKO_RATE_PER_MINUTE = float(os.getenv("COINGECKO_RATE_PER_MINUTE", "30"))
+COINGECKO_BURST = int(os.getenv("COINGECKO_BURST", "5"))
+COINGECKO_DEFAULT_RETRY_AFTER = float(os.getenv("COINGECKO_DEFAULT_RETRY_AFTER", "60"))  # اگه 429 بدون Retry-After بیاید
+# حداکثر انتظار در صف برای هر کلاس اولویت (ثانیه)؛ بیشتر از آن یعنی RateLimited
+RATE_MAX_WAIT_INTERACTIVE = float(os.getenv("RATE_MAX_WAIT_INTERACTIVE", "5"))
+RATE_MAX_WAIT_BACKGROUND = float(os.getenv("RATE_MAX_WAIT_BACKGROUND", "120"))
+RATE_MAX_WAIT_BACKFILL = float(os.getenv("RATE_MAX_WAIT_BACKFILL", "30"))
+
+# حالت اجرای ربات: polling یا webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram").strip("/")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # آدرس عمومی (مثلاً https://bot.example.com)
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # مقدار هدر X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_DROP_PENDING = os.getenv("WEBHOOK_DROP_PENDING", "0") == "1"
+# صف و هم‌زمانی پردازش آپدیت‌ها
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", "1000"))
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "32"))
+# آدرس Bot API (برای سرور محلی یا جعلی تلگرام)؛ خالی یعنی https://api.telegram.org
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL", "").rstrip("/")
+
+# تنظیمات هشدار قیمت
+ALERTS_DB_PATH = os.getenv("ALERTS_DB_PATH", os.path.join("data", "alerts.db"))
+ALERT_CHECK_INTERVAL = float(os.getenv("ALERT_CHECK_INTERVAL", "60"))  # ثانیه
+ALERT_MAX_PER_USER = int(os.getenv("ALERT_MAX_PER_USER", "20"))
+
+# چند ارزی: قیمت‌ها همیشه به دلار دریافت و با جدول /exchange_rates به ارز کاربر تبدیل می‌شوند
+FX_REFRESH_INTERVAL = float(os.getenv("FX_REFRESH_INTERVAL", "600"))  # ثانیه
+DEFAULT_CURRENCY = os.getenv("DEFAULT_CURRENCY", "usd").lower()
+USER_SETTINGS_DB_PATH = os.getenv("USER_SETTINGS_DB_PATH", os.path.join("data", "user_settings.db"))
+
+# صف ارسال پیام‌های خروجی (محدودیت‌های flood تلگرام)
+OUTBOUND_RATE = float(os.getenv("OUTBOUND_RATE", "25"))  # پیام در ثانیه (سقف سراسری تلگرام حدود 30)
+OUTBOUND_BURST = int(os.getenv("OUTBOUND_BURST", "25"))
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))  # پیام در ثانیه برای هر چت خصوصی
+OUTBOUND_GROUP_RATE_PER_MINUTE = float(os.getenv("OUTBOUND_GROUP_RATE_PER_MINUTE", "20"))  # هر گروه
+OUTBOUND_CHAT_BURST = int(os.getenv("OUTBOUND_CHAT_BURST", "3"))
+OUTBOUND_CONCURRENCY = int(os.getenv("OUTBOUND_CONCURRENCY", "16"))  # درخواست هم‌زمان به Bot API
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))  # تکرار پس از RetryAfter
+OUTBOUND_QUEUE_SIZE = int(os.getenv("OUTBOUND_QUEUE_SIZE", "10000"))  # سقف صف هشدار/پیام همگانی
+
+# پشتوانه کش: memory (هر پردازه جدا)، sqlite (فایل مشترک روی یک میزبان) یا redis (چند میزبان)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", os.path.join("data", "cache.db"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_STALE_TTL = float(os.getenv("CACHE_STALE_TTL", "3600"))  # نگهداری مقدار منقضی برای زمان خطا (ثانیه)
+CACHE_LOCK_TTL = float(os.getenv("CACHE_LOCK_TTL", "15"))  # عمر قفل دریافت بین پردازه‌ها (ثانیه)
+CACHE_LOCK_WAIT = float(os.getenv("CACHE_LOCK_WAIT", "5"))  # انتظار برای نتیجه پردازه دارنده قفل (ثانیه)
+INFO_CACHE_TTL = float(os.getenv("INFO_CACHE_TTL", "60"))  # ثانیه
+TOP_CACHE_TTL = float(os.getenv("TOP_CACHE_TTL", "60"))  # ثانیه
+
+# بودجه زمانی هر درخواست کاربر: پس از این مدت با تازه‌ترین داده موجود پاسخ داده می‌شود
+REQUEST_BUDGET_MS = int(os.getenv("REQUEST_BUDGET_MS", "2500"))
+# قطع‌کن مدار کوین‌گکو: پس از این تعداد خطای پشت‌سرهم، درخواست‌ها تا مدتی ارسال نمی‌شوند
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))  # ثانیه
+
+# متریک‌ها (endpoint محلی /metrics با قالب Prometheus)؛ پورت 0 یعنی غیرفعال
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+# ثبت span‌های زمانی هر آپدیت در لاگ (برای پیدا کردن محل صرف زمان)
+TRACE_UPDATES = os.getenv("TRACE_UPDATES", "false").lower() in ("1", "true", "yes")
+
+# لاگینگ: سطح کلی، سطح هر logger (مثل httpx=WARNING,coin_price=DEBUG) و قالب خروجی (text یا json)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "httpx=WARNING,httpcore=WARNING")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# نمونه‌برداری پیام‌های DEBUG پرتکرار: حداکثر این تعداد در ثانیه برای هر محل لاگ (0 یعنی بدون محدودیت)
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "5"))
+LOG_SAMPLE_BURST = int(os.getenv("LOG_SAMPLE_BURST", "20"))
+# حداکثر طول پاسخ‌های API در لاگ (کاراکتر)؛ 0 یعنی فقط اندازه پاسخ لاگ شود
+LOG_PAYLOAD_MAX = int(os.getenv("LOG_PAYLOAD_MAX", "500"))
+
+# warm-up پس از فعال شدن polling/webhook (ساخت pool رسم و بارگذاری numpy)؛ false یعنی بارگذاری در اولین نمودار
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() in ("1", "true", "yes")
+STARTUP_WARMUP_DELAY = float(os.getenv("STARTUP_WARMUP_DELAY", "1"))  # ثانیه
+
+# حالت inline (@bot btc): پاسخ فقط از snapshot بازار، بدون درخواست به کوین‌گکو
+INLINE_MAX_RESULTS = min(50, int(os.getenv("INLINE_MAX_RESULTS", "20")))  # سقف تلگرام 50 نتیجه است
+# مدت نگهداری پاسخ در کش سرور تلگرام (ثانیه)؛ نصف فاصله poll تا قیمت‌ها زیاد عقب نمانند
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", str(int(MARKET_POLL_INTERVAL // 2))))
+# تعداد پاسخ‌های آماده پرس‌وجوهای پرتکرار (مثل "b" یا "bt") که تا snapshot بعدی نگه داشته می‌شوند
+INLINE_ANSWER_CACHE_SIZE = int(os.getenv("INLINE_ANSWER_CACHE_SIZE", "512"))
+
+# پیام‌های زنده (/live btc eth): یک تیک مشترک برای همه پیام‌ها؛ فقط پیام‌هایی که متنشان تغییر کرده ویرایش می‌شوند
+LIVE_TICK_INTERVAL = float(os.getenv("LIVE_TICK_INTERVAL", "15"))  # ثانیه
+LIVE_DURATION = float(os.getenv("LIVE_DURATION", "3600"))  # عمر هر اشتراک (ثانیه)
+LIVE_MAX_COINS = int(os.getenv("LIVE_MAX_COINS", "10"))  # حداکثر ارز در هر پیام زنده
+
+# جریان قیمت WebSocket صرافی (کم‌تأخیر، اختیاری)؛ با PRICE_STREAM=binance قیمت USDT این ارزها
+# پیش از snapshot و کوین‌گکو از این جریان خوانده می‌شود. پیش‌فرض off: اتصال دائمی به یک سرویس
+# ثالث جدید فقط با انتخاب صریح (بایننس از برخی کشورها در دسترس نیست)
+PRICE_STREAM = os.getenv("PRICE_STREAM", "off").lower()  # off یعنی غیرفعال
+PRICE_STREAM_URL = os.getenv("PRICE_STREAM_URL", "wss://stream.binance.com:9443/stream")
+# نگاشت شناسه کوین‌گکو به جفت ارز صرافی (قیمت USDT معادل دلار در نظر گرفته می‌شود)
+PRICE_STREAM_PAIRS = {
+    coin.strip(): pair.strip().upper()
+    for coin, _, pair in (item.partition("=") for item in os.getenv(
+        "PRICE_STREAM_PAIRS",
+        "bitcoin=BTCUSDT,ethereum=ETHUSDT,binancecoin=BNBUSDT,solana=SOLUSDT,ripple=XRPUSDT,"
+        "usd-coin=USDCUSDT,cardano=ADAUSDT,avalanche-2=AVAXUSDT,dogecoin=DOGEUSDT,tron=TRXUSDT,"
+        "chainlink=LINKUSDT,polkadot=DOTUSDT,litecoin=LTCUSDT",
+    ).split(","))
+    if coin.strip() and pair.strip()
+}
+PRICE_STREAM_MAX_AGE = float(os.getenv("PRICE_STREAM_MAX_AGE", "10"))  # قیمت قدیمی‌تر از این (ثانیه) نادیده گرفته می‌شود
+PRICE_STREAM_IDLE_TIMEOUT = float(os.getenv("PRICE_STREAM_IDLE_TIMEOUT", "30"))  # بدون پیام تا این مدت یعنی اتصال مرده
+PRICE_STREAM_MAX_BACKOFF = float(os.getenv("PRICE_STREAM_MAX_BACKOFF", "60"))  # سقف تأخیر اتصال دوباره (ثانیه)
@@ -1,25 +1,50 @@
+# startup پیش از بقیه import‌ها تا زمان import و مراحل شروع را بسنجد
+import startup
+import asyncio
 import logging
-import requests
-import matplotlib.pyplot as plt
+import re
+import secrets
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application, CommandHandler, ContextTypes, CallbackQueryHandler, MessageHandler, 
-    filters, ConversationHandler
+    filters, ConversationHandler, InlineQueryHandler
 )
-from io import BytesIO
 from dotenv import load_dotenv
 import os
-from top_coins import get_top_coins_panel
+from top_coins import get_top_coins_panel, parse_top_callback
 from coin_info import get_coin_info
 from coin_price import get_coin_price
 from coin_suggestions import get_suggestions_panel
 from coin_chart import get_coin_chart
-
-# تنظیم لاگینگ با جزئیات بیشتر
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.DEBUG
+from chart_series import CHART_RANGES, parse_range
+from coingecko_client import start_client, close_client
+from cache import close_cache
+from price_cache import get_stats as get_price_cache_stats
+from rate_limiter import scheduler
+from circuit_breaker import breaker
+from market_poller import start_market_poller
+from symbol_index import start_symbol_index
+from chart_render import close_render_pool
+from timeseries_store import start_timeseries_store, close_timeseries_store
+from inline_mode import inline_query
+from exchange_rates import start_exchange_rates
+from user_settings import currency, currency_for, start_user_settings, close_user_settings
+from live import live, start_live, get_stats as get_live_stats
+from price_stream import start_price_stream, close_price_stream, get_stats as get_stream_stats
+from alerts import alert, list_alerts, delete_alert, start_alerts, close_alerts
+from outbound import reply_text, reply_html, edit_text, start_outbound, stop_outbound, get_stats as get_outbound_stats
+from logging_setup import setup_logging
+from metrics import observe_handler, track, start_metrics_server, stop_metrics_server
+from config import (
+    ADMIN_USER_IDS, BOT_MODE, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_URL,
+    WEBHOOK_SECRET, WEBHOOK_DROP_PENDING, UPDATE_QUEUE_SIZE, CONCURRENT_UPDATES, TELEGRAM_API_BASE_URL,
+    STARTUP_WARMUP, STARTUP_WARMUP_DELAY,
 )
+
+# تنظیم لاگینگ (صف پس‌زمینه، سطح‌ها و قالب از متغیرهای محیطی)
+setup_logging()
 logger = logging.getLogger(__name__)
+startup.mark("imports")
 
 # بارگذاری متغیرهای محیطی از فایل .env
 load_dotenv()
@@ -27,17 +52,21 @@ load_dotenv()
 # دریافت توکن از متغیر محیطی
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
-# URLهای API کوین‌گکو
-COINGECKO_API = "https://api.coingecko.com/api/v3"
+# فقط نوع آپدیت‌هایی که هندلر دارند از تلگرام دریافت می‌شوند
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY, Update.INLINE_QUERY]
 
 # حالت‌های ConversationHandler
 COIN_SYMBOL_INFO = 0
 COIN_SYMBOL_PRICE = 1
 COIN_SYMBOL_CHART = 2
 
+# شاخه‌های button_handler (برچسب متریک؛ داده‌های ناشناخته زیر other شمرده می‌شوند)
+BUTTON_BRANCHES = {"price", "info", "chart", "top", "restart", "price_", "info_", "chart_", "coin_", "t:"}
+
+@observe_handler("start")
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """ارسال پیام خوش‌آمدگویی با پنل شیشه‌ای"""
-    logger.debug(f"دریافت پیام /start از کاربر {update.effective_user.id}")
+    logger.debug("دریافت پیام /start از کاربر %s", update.effective_user.id)
     user = update.effective_user
     # تعریف دکمه‌های پنل شیشه‌ای با ایموجی
     keyboard = [
@@ -47,12 +76,13 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         ],
         [
             InlineKeyboardButton("📈 نمودار قیمت", callback_data="chart"),
-            InlineKeyboardButton("🏆 10 ارز برتر", callback_data="top"),
+            InlineKeyboardButton("🏆 ارزهای برتر", callback_data="top"),
         ],
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
-    await update.message.reply_html(
+    reply_html(
+        update.message,
         rf"سلام {user.mention_html()}! 👋 به ربات قیمت ارز دیجیتال خوش آمدید! 📈"
         "\nیکی از گزینه‌های زیر را انتخاب کنید:",
         reply_markup=reply_markup,
@@ -61,15 +91,17 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 async def restart(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """ری‌استارت ربات (همان عملکرد /start)"""
-    logger.debug(f"دریافت پیام /restart از کاربر {update.effective_user.id}")
+    logger.debug("دریافت پیام /restart از کاربر %s", update.effective_user.id)
     await start(update, context)
 
+@observe_handler("message")
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """مدیریت پیام‌های غیرفرمان با دکمه شروع مجدد"""
-    logger.debug(f"دریافت پیام متنی: {update.message.text} از کاربر {update.effective_user.id}")
+    logger.debug("دریافت پیام متنی: %s از کاربر %s", update.message.text, update.effective_user.id)
     keyboard = [[InlineKeyboardButton("🔄 شروع مجدد", callback_data="restart")]]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.message.reply_text(
+    reply_text(
+        update.message,
         "لطفاً از دستورات ربات استفاده کنید یا برای بازگشت به منوی اصلی، دکمه زیر را بزنید:",
         reply_markup=reply_markup,
         reply_to_message_id=update.message.message_id
@@ -80,7 +112,8 @@ async def start_coin_info(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     query = update.callback_query
     await query.answer()
     reply_markup = get_suggestions_panel("info")
-    await query.message.reply_text(
+    reply_text(
+        query.message,
         "لطفاً نماد ارز را وارد کنید (مثال: btc، eth، bitcoin) یا یکی از نمادهای زیر را انتخاب کنید:",
         reply_markup=reply_markup,
         reply_to_message_id=query.message.message_id
@@ -92,7 +125,8 @@ async def start_coin_price(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     query = update.callback_query
     await query.answer()
     reply_markup = get_suggestions_panel("price")
-    await query.message.reply_text(
+    reply_text(
+        query.message,
         "لطفاً نماد ارز را وارد کنید (مثل btc، eth، bitcoin) یا یکی از نمادهای زیر را انتخاب کنید:",
         reply_markup=reply_markup,
         reply_to_message_id=query.message.message_id
@@ -104,7 +138,8 @@ async def start_coin_chart(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     query = update.callback_query
     await query.answer()
     reply_markup = get_suggestions_panel("chart")
-    await query.message.reply_text(
+    reply_text(
+        query.message,
         "لطفاً نماد ارز را وارد کنید (مثل btc، eth، bitcoin) یا یکی از نمادهای زیر را انتخاب کنید:",
         reply_markup=reply_markup,
         reply_to_message_id=query.message.message_id
@@ -114,7 +149,7 @@ async def start_coin_chart(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 async def receive_coin_symbol_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """دریافت نماد ارز و نمایش اطلاعات"""
     symbol = update.message.text.strip()
-    logger.debug(f"نماد دریافت‌شده برای اطلاعات: {symbol} از کاربر {update.effective_user.id}")
+    logger.debug("نماد دریافت‌شده برای اطلاعات: %s از کاربر %s", symbol, update.effective_user.id)
     await get_coin_info(update, context, symbol)
     # پایان مکالمه
     return ConversationHandler.END
@@ -122,7 +157,7 @@ async def receive_coin_symbol_info(update: Update, context: ContextTypes.DEFAULT
 async def receive_coin_symbol_price(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """دریافت نماد ارز و نمایش قیمت"""
     symbol = update.message.text.strip()
-    logger.debug(f"نماد دریافت‌شده برای قیمت: {symbol} از کاربر {update.effective_user.id}")
+    logger.debug("نماد دریافت‌شده برای قیمت: %s از کاربر %s", symbol, update.effective_user.id)
     await get_coin_price(update, context, symbol)
     # پایان مکالمه
     return ConversationHandler.END
@@ -130,15 +165,16 @@ async def receive_coin_symbol_price(update: Update, context: ContextTypes.DEFAUL
 async def receive_coin_symbol_chart(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """دریافت نماد ارز و نمایش نمودار"""
     symbol = update.message.text.strip()
-    logger.debug(f"نماد دریافت‌شده برای نمودار: {symbol} از کاربر {update.effective_user.id}")
+    logger.debug("نماد دریافت‌شده برای نمودار: %s از کاربر %s", symbol, update.effective_user.id)
     await get_coin_chart(update, context, symbol)
     # پایان مکالمه
     return ConversationHandler.END
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """لغو مکالمه"""
-    logger.debug(f"لغو مکالمه توسط کاربر {update.effective_user.id}")
-    await update.message.reply_text(
+    logger.debug("لغو مکالمه توسط کاربر %s", update.effective_user.id)
+    reply_text(
+        update.message,
         "عملیات لغو شد. برای شروع دوباره، /start را بزنید."
     )
     return ConversationHandler.END
@@ -147,97 +183,217 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     """مدیریت کلیک روی دکمه‌های پنل"""
     query = update.callback_query
     await query.answer()
-    logger.debug(f"کلیک روی دکمه: {query.data} توسط کاربر {query.from_user.id}")
-
-    if query.data == "price":
-        return await start_coin_price(update, context)
-    elif query.data == "info":
-        return await start_coin_info(update, context)
-    elif query.data == "chart":
-        return await start_coin_chart(update, context)
-    elif query.data == "top":
-        message, reply_markup = get_top_coins_panel()
-        await query.message.reply_text(
-            message,
-            reply_markup=reply_markup,
-            reply_to_message_id=query.message.message_id
-        )
-    elif query.data == "restart":
-        await start(query, context)
-    elif query.data.startswith("price_") or query.data.startswith("info_") or query.data.startswith("chart_"):
-        # مدیریت کلیک روی نمادهای پیشنهادی
-        try:
-            mode, coin = query.data.split("_", 1)
-            logger.debug(f"کلیک روی نماد پیشنهادی: mode={mode}, coin={coin}")
-            if mode == "price":
-                await get_coin_price(query, context, coin)
-            elif mode == "info":
-                await get_coin_info(query, context, coin)
-            elif mode == "chart":
-                await get_coin_chart(query, context, coin)
-        except Exception as e:
-            logger.error(f"خطا در پردازش کلیک نماد پیشنهادی: {query.data}, خطا: {e}")
-            await query.message.reply_text("خطایی رخ داد. لطفاً دوباره امتحان کنید.")
-    elif query.data.startswith("coin_"):
-        # مدیریت کلیک روی دکمه‌های 10 ارز برتر
-        coin_id = query.data.split("_")[1]
-        await get_coin_info(query, context, coin_id)
+    logger.debug("کلیک روی دکمه: %s توسط کاربر %s", query.data, query.from_user.id)
+
+    branch = re.match(r"[a-z]*[_:]?", query.data).group()
+    async with track(f"button:{branch if branch in BUTTON_BRANCHES else 'other'}", update):
+        if query.data == "price":
+            return await start_coin_price(update, context)
+        elif query.data == "info":
+            return await start_coin_info(update, context)
+        elif query.data == "chart":
+            return await start_coin_chart(update, context)
+        elif query.data == "top":
+            message, reply_markup = await get_top_coins_panel(currency_for(query))
+            reply_text(
+                query.message,
+                message,
+                reply_markup=reply_markup,
+                reply_to_message_id=query.message.message_id
+            )
+        elif query.data.startswith("t:"):
+            # صفحه‌بندی و نماهای /top: همان پیام ویرایش می‌شود
+            view, page = parse_top_callback(query.data)
+            message, reply_markup = await get_top_coins_panel(currency_for(query), view, page)
+            edit_text(query.message, message, reply_markup=reply_markup)
+        elif query.data == "restart":
+            await start(query, context)
+        elif query.data.startswith("price_") or query.data.startswith("info_") or query.data.startswith("chart_"):
+            # مدیریت کلیک روی نمادهای پیشنهادی
+            try:
+                mode, coin = query.data.split("_", 1)
+                logger.debug("کلیک روی نماد پیشنهادی: mode=%s, coin=%s", mode, coin)
+                if mode == "price":
+                    await get_coin_price(query, context, coin)
+                elif mode == "info":
+                    await get_coin_info(query, context, coin)
+                elif mode == "chart":
+                    await get_coin_chart(query, context, coin)
+            except Exception as e:
+                logger.error("خطا در پردازش کلیک نماد پیشنهادی: %s, خطا: %s", query.data, e)
+                reply_text(query.message, "خطایی رخ داد. لطفاً دوباره امتحان کنید.")
+        elif query.data.startswith("coin_"):
+            # مدیریت کلیک روی دکمه‌های 10 ارز برتر
+            coin_id = query.data.split("_", 1)[1]
+            await get_coin_info(query, context, coin_id)
 
 async def price(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """نمایش قیمت لحظه‌ای یک ارز (برای دستور مستقیم /price)"""
-    logger.debug(f"اجرای دستور /price توسط کاربر {update.effective_user.id}")
+    """نمایش قیمت لحظه‌ای یک یا چند ارز (برای دستور مستقیم /price)"""
+    logger.debug("اجرای دستور /price توسط کاربر %s", update.effective_user.id)
     if not context.args:
-        await update.message.reply_text(
-            "لطفاً نماد ارز را وارد کنید. مثال: /price btc"
+        reply_text(
+            update.message,
+            "لطفاً نماد ارز را وارد کنید. مثال: /price btc یا /price btc eth sol"
         )
         return
 
-    symbol = context.args[0].lower()
+    # همه نمادها با هم (برای جدول قیمت چند ارز)
+    symbol = " ".join(context.args).lower()
     await get_coin_price(update, context, symbol)
 
 async def info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """نمایش اطلاعات ارز با استفاده از ماژول (برای دستور مستقیم /info)"""
-    logger.debug(f"اجرای دستور /info توسط کاربر {update.effective_user.id}")
+    logger.debug("اجرای دستور /info توسط کاربر %s", update.effective_user.id)
     symbol = context.args[0] if context.args else ""
     await get_coin_info(update, context, symbol)
 
 async def chart(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """نمایش نمودار قیمت (برای دستور مستقیم /chart)"""
-    logger.debug(f"اجرای دستور /chart توسط کاربر {update.effective_user.id}")
+    logger.debug("اجرای دستور /chart توسط کاربر %s", update.effective_user.id)
     if not context.args:
-        await update.message.reply_text(
-            "لطفاً نماد ارز را وارد کنید. مثال: /chart btc"
+        reply_text(
+            update.message,
+            "لطفاً نماد ارز را وارد کنید. مثال: /chart btc یا /chart btc 30d"
         )
         return
 
     symbol = context.args[0].lower()
-    await get_coin_chart(update, context, symbol)
-
+    # بازه اختیاری: 1d، 7d، 30d، 90d، 365d یا max
+    days = "7"
+    if len(context.args) > 1:
+        days = parse_range(context.args[1])
+        if days is None:
+            reply_text(
+                update.message,
+                "بازه نامعتبر است. بازه‌های مجاز: " + "، ".join(CHART_RANGES)
+            )
+            return
+    await get_coin_chart(update, context, symbol, days)
+
+@observe_handler("top")
 async def top(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """نمایش 10 ارز برتر با استفاده از ماژول"""
-    logger.debug(f"اجرای دستور /top توسط کاربر {update.effective_user.id}")
-    message, reply_markup = get_top_coins_panel()
-    await update.message.reply_text(
+    """نمایش صفحه اول ارزهای برتر (با دکمه‌های صفحه‌بندی و مرتب‌سازی) با استفاده از ماژول"""
+    logger.debug("اجرای دستور /top توسط کاربر %s", update.effective_user.id)
+    message, reply_markup = await get_top_coins_panel(currency_for(update))
+    reply_text(
+        update.message,
         message,
         reply_markup=reply_markup
     )
 
-async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """مدیریت خطاها"""
-    logger.error(f"خطا رخ داد: {context.error}")
-    if update:
-        await update.message.reply_text(
-            "خطایی رخ داد. لطفاً دوباره امتحان کنید."
-        )
-
-def main() -> None:
-    """اجرای ربات"""
-    if not BOT_TOKEN:
-        logger.error("توکن ربات پیدا نشد! لطفاً فایل .env را بررسی کنید.")
+@observe_handler("stats")
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """نمایش شمارنده‌های کش (برای تنظیم TTL) - فقط برای مدیران"""
+    logger.debug("اجرای دستور /stats توسط کاربر %s", update.effective_user.id)
+    if ADMIN_USER_IDS and update.effective_user.id not in ADMIN_USER_IDS:
         return
 
-    logger.info("ربات شروع به کار کرد!")
-    application = Application.builder().token(BOT_TOKEN).build()
+    cache_stats = get_price_cache_stats()
+    reply_text(
+        update.message,
+        "📊 آمار کش قیمت:\n"
+        f"پشتوانه: {cache_stats['backend']} | اندازه: {cache_stats['size'] if cache_stats['size'] is not None else '-'}\n"
+        f"hit: {cache_stats['hits']} | miss: {cache_stats['misses']} | coalesced: {cache_stats['coalesced']} "
+        f"| از worker دیگر: {cache_stats['remote_hits']}\n"
+        f"evictions: {cache_stats['evictions']} | stale: {cache_stats['stale_served']}\n"
+        f"نرخ hit: {cache_stats['hit_ratio']:.1%}\n"
+        f"پیش از کش: جریان قیمت {cache_stats['stream_hits']} | snapshot {cache_stats['snapshot_hits']}"
+    )
+
+    rate_stats = scheduler.stats()
+    breaker_stats = breaker.stats()
+    depth = rate_stats["queue_depth"]
+    reply_text(
+        update.message,
+        "🚦 زمان‌بند درخواست‌های کوین‌گکو:\n"
+        f"صف: interactive={depth['interactive']} background={depth['background']} backfill={depth['backfill']}\n"
+        f"مجاز: {rate_stats['granted']} | ردشده: {rate_stats['rejected']} | 429: {rate_stats['throttled']}\n"
+        f"انتظار میانگین: {rate_stats['wait_avg']:.2f}s | بیشینه: {rate_stats['wait_max']:.2f}s\n"
+        f"مدار: {breaker_stats['state']} | باز شده: {breaker_stats['opened']} | ردشده در قطعی: {breaker_stats['short_circuited']}"
+    )
+
+    outbound_stats = get_outbound_stats()
+    lanes = outbound_stats["queue_depth"]
+    reply_text(
+        update.message,
+        "📤 صف ارسال تلگرام:\n"
+        f"صف: interactive={lanes['interactive']} alert={lanes['alert']} broadcast={lanes['broadcast']} live={lanes['live']}\n"
+        f"در حال ارسال: {outbound_stats['in_flight']} | چت‌ها: {outbound_stats['chats']}\n"
+        f"ارسال‌شده: {outbound_stats['sent']} | ناموفق: {outbound_stats['failed']} | "
+        f"دورریخته: {outbound_stats['dropped']} | RetryAfter: {outbound_stats['flood_waits']}"
+    )
+
+    live_stats = get_live_stats()
+    reply_text(
+        update.message,
+        "📡 پیام‌های زنده:\n"
+        f"اشتراک‌ها: {live_stats['subscriptions']} | ارزها: {live_stats['coins']} | تیک‌ها: {live_stats['ticks']}\n"
+        f"ویرایش‌شده: {live_stats['edits']} | بدون تغییر: {live_stats['unchanged']}"
+    )
+
+    stream_stats = get_stream_stats()
+    if stream_stats is not None:
+        reply_text(
+            update.message,
+            f"🔌 جریان قیمت {stream_stats['source']}: {'متصل' if stream_stats['connected'] else 'قطع'}\n"
+            f"اتصال‌ها: {stream_stats['connects']} | پیام‌ها: {stream_stats['messages']} | "
+            f"نامعتبر: {stream_stats['errors']} | ارزهای تازه: {stream_stats['fresh']}"
+        )
+
+async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """مدیریت خطاها"""
+    logger.error("خطا رخ داد: %s", context.error)
+    # آپدیت ممکن است callback یا بدون پیام باشد (update.message همیشه وجود ندارد)
+    if isinstance(update, Update) and update.effective_message:
+        reply_text(update.effective_message, "خطایی رخ داد. لطفاً دوباره امتحان کنید.")
+
+async def post_init(application: Application) -> None:
+    """آماده‌سازی منابع مشترک پس از ساخت برنامه"""
+    await start_metrics_server(application)
+    await start_client(application)
+    await start_symbol_index(application)
+    await start_price_stream(application)
+    start_market_poller(application)
+    start_exchange_rates(application)
+    start_timeseries_store(application)
+    await start_outbound(application)
+    await start_alerts(application)
+    await start_user_settings(application)
+    start_live(application)
+    startup.mark("post_init")
+    if STARTUP_WARMUP and application.job_queue is not None:
+        # job queue پس از فعال شدن polling/webhook شروع می‌شود؛ pool رسم و numpy آن‌وقت بارگذاری می‌شوند
+        application.job_queue.run_once(startup.warm_up, STARTUP_WARMUP_DELAY, name="warm_up")
+    else:
+        startup.log_startup_report("پس از post_init")
+
+async def post_shutdown(application: Application) -> None:
+    """آزادسازی منابع مشترک هنگام خاموش شدن برنامه"""
+    await close_price_stream(application)
+    await stop_outbound(application)
+    await close_alerts(application)
+    await close_user_settings(application)
+    await close_render_pool(application)
+    await close_timeseries_store(application)
+    await close_client(application)
+    await close_cache(application)
+    await stop_metrics_server(application)
+
+def build_application(token: str) -> Application:
+    """ساخت برنامه و ثبت همه هندلرها (مشترک بین polling و webhook)"""
+    builder = (
+        Application.builder()
+        .token(token)
+        # صف محدود آپدیت‌ها: در صورت پر شدن، دریافت آپدیت جدید منتظر می‌ماند (backpressure)
+        .update_queue(asyncio.Queue(maxsize=UPDATE_QUEUE_SIZE))
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if TELEGRAM_API_BASE_URL:
+        # برای اجرا در برابر سرور جعلی/محلی Bot API
+        builder = builder.base_url(f"{TELEGRAM_API_BASE_URL}/bot").base_file_url(f"{TELEGRAM_API_BASE_URL}/file/bot")
+    application = builder.build()
 
     # تعریف ConversationHandler برای اطلاعات ارز
     info_handler = ConversationHandler(
@@ -273,18 +429,54 @@ def main() -> None:
     application.add_handler(CommandHandler("info", info))
     application.add_handler(CommandHandler("chart", chart))
     application.add_handler(CommandHandler("top", top))
+    application.add_handler(CommandHandler("stats", stats))
+    application.add_handler(CommandHandler("alert", alert))
+    application.add_handler(CommandHandler("alerts", list_alerts))
+    application.add_handler(CommandHandler("delalert", delete_alert))
+    application.add_handler(CommandHandler("currency", currency))
+    application.add_handler(CommandHandler("live", live))
     application.add_handler(info_handler)
     application.add_handler(price_handler)
     application.add_handler(chart_handler)
     application.add_handler(CallbackQueryHandler(button_handler))
+    application.add_handler(InlineQueryHandler(inline_query))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
 
     # هندلر خطا
     application.add_error_handler(error_handler)
+    return application
+
+def main() -> None:
+    """اجرای ربات"""
+    if not BOT_TOKEN:
+        logger.error("توکن ربات پیدا نشد! لطفاً فایل .env را بررسی کنید.")
+        return
+
+    logger.info("ربات شروع به کار کرد!")
+    application = build_application(BOT_TOKEN)
 
     # شروع ربات
-    logger.info("شروع polling ربات...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if BOT_MODE == "webhook":
+        if not WEBHOOK_URL:
+            logger.error("حالت webhook نیاز به WEBHOOK_URL دارد! لطفاً فایل .env را بررسی کنید.")
+            return
+        secret_token = WEBHOOK_SECRET
+        if not secret_token:
+            secret_token = secrets.token_urlsafe(32)
+            logger.warning("WEBHOOK_SECRET تنظیم نشده؛ یک توکن تصادفی برای این اجرا ساخته شد")
+        logger.info("شروع webhook ربات روی %s:%s/%s ...", WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH)
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            secret_token=secret_token,
+            allowed_updates=ALLOWED_UPDATES,
+            drop_pending_updates=WEBHOOK_DROP_PENDING,
+        )
+    else:
+        logger.info("شروع polling ربات...")
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,130 @@
+import logging
+from typing import Optional
+
+import httpx
+from telegram.ext import Application, ContextTypes
+
+from cache import TTLCache
+from coingecko_client import get_json
+from rate_limiter import Priority, RateLimited
+from config import FX_REFRESH_INTERVAL
+
+# تنظیم لاگینگ
+logger = logging.getLogger(__name__)
+
+# جدول /exchange_rates: کد ارز -> {"name", "unit", "value", "type"}؛ value = مقدار آن ارز به ازای 1 BTC
+_rates: dict[str, dict] = {}
+# جدول مشترک بین workerها؛ دریافت هم‌زمان (مثلاً چند کاربر پیش از اولین به‌روزرسانی) یکی می‌شود
+rates_cache = TTLCache("exchange_rates", ttl=FX_REFRESH_INTERVAL * 0.9, max_size=1)
+
+# واحد نمایش دلار حتی پیش از بارگذاری جدول
+USD_UNIT = "$"
+
+
+class UnsupportedCurrency(ValueError):
+    """ارز در جدول نرخ‌های کوین‌گکو وجود ندارد"""
+
+    def __init__(self, currency: str):
+        super().__init__(currency)
+        self.currency = currency
+
+
+def supported_currencies() -> list[str]:
+    """کد ارزهای قابل انتخاب (دلار همیشه)"""
+    return sorted(set(_rates) | {"usd"})
+
+
+def is_crypto(currency: str) -> bool:
+    """آیا ارز مقصد رمزارز است (مثل btc، eth یا sats)؟"""
+    return _rates.get(currency, {}).get("type") == "crypto"
+
+
+def rate(currency: str) -> float:
+    """
+    ضریب تبدیل دلار به currency از جدول محلی.
+    خطاها: UnsupportedCurrency اگه ارز در جدول نباشد (یا جدول هنوز بارگذاری نشده باشد)
+    """
+    if currency == "usd":
+        return 1.0
+    target = _rates.get(currency)
+    if target is None or "usd" not in _rates:
+        raise UnsupportedCurrency(currency)
+    return target["value"] / _rates["usd"]["value"]
+
+
+def btc_rate(currency: str) -> float:
+    """مقدار currency به ازای 1 BTC (برای تبدیل سری‌ها به ارزهای رمزارزی)"""
+    target = _rates.get(currency)
+    if target is None:
+        raise UnsupportedCurrency(currency)
+    return target["value"]
+
+
+def unit(currency: str) -> str:
+    """نماد نمایش ارز (مثل $، €، BTC)"""
+    if currency == "usd":
+        return USD_UNIT
+    return _rates.get(currency, {}).get("unit") or currency.upper()
+
+
+def format_amount(value: float, currency: str = "usd", decimals: Optional[int] = None) -> str:
+    """
+    قالب‌بندی مبلغ با نماد ارز: نمادهای تک‌حرفی پیش از عدد ($1,234.56) و بقیه پس از آن (0.0123 BTC).
+    ورودی: decimals تعداد رقم اعشار؛ پیش‌فرض 2 برای ارزهای فیات و برای رمزارزها بسته به
+    بزرگی مبلغ (0.05000000 BTC ولی 5,000,000 sats)
+    """
+    if decimals is None:
+        if not is_crypto(currency):
+            decimals = 2
+        else:
+            decimals = 8 if abs(value) < 1 else 4 if abs(value) < 1000 else 0
+    symbol = unit(currency)
+    number = f"{value:,.{decimals}f}"
+    return f"{symbol}{number}" if len(symbol) == 1 else f"{number} {symbol}"
+
+
+async def _load() -> None:
+    """دریافت جدول از کش مشترک یا کوین‌گکو و جایگزینی جدول محلی"""
+    global _rates
+
+    async def fetch() -> dict:
+        data = await get_json("/exchange_rates", priority=Priority.BACKGROUND)
+        return {"rates": data["rates"]}
+
+    snapshot = await rates_cache.get_or_fetch("all", fetch, serve_stale=False)
+    _rates = snapshot["rates"]
+
+
+async def ensure_rates(currency: str) -> float:
+    """
+    ضریب تبدیل برای currency؛ اگه جدول هنوز بارگذاری نشده، یک بار (برای همه ارزها) دریافت می‌شود.
+    خطاها: UnsupportedCurrency، یا خطای دریافت جدول
+    """
+    if currency != "usd" and not _rates:
+        await _load()
+    return rate(currency)
+
+
+async def refresh_exchange_rates(context: Optional[ContextTypes.DEFAULT_TYPE] = None) -> None:
+    """به‌روزرسانی دوره‌ای جدول نرخ‌ها (یک درخواست برای همه ارزها)"""
+    try:
+        await _load()
+        logger.debug("جدول نرخ ارزها به‌روز شد: %s ارز", len(_rates))
+    except RateLimited as rate_err:
+        logger.warning("محدودیت نرخ در دریافت نرخ ارزها: %s", rate_err)
+    except httpx.HTTPStatusError as http_err:
+        logger.warning("خطای HTTP در دریافت نرخ ارزها: %s", http_err)
+    except httpx.RequestError as req_err:
+        logger.warning("خطای شبکه در دریافت نرخ ارزها: %s", req_err)
+    except Exception as e:
+        logger.error("خطای عمومی در به‌روزرسانی نرخ ارزها: %s", e)
+
+
+def start_exchange_rates(application: Application) -> None:
+    """زمان‌بندی دریافت دوره‌ای جدول نرخ‌ها روی job queue برنامه"""
+    if application.job_queue is None:
+        logger.warning("job queue در دسترس نیست؛ نرخ ارزها فقط هنگام نیاز دریافت می‌شوند")
+        return
+    application.job_queue.run_repeating(
+        refresh_exchange_rates, interval=FX_REFRESH_INTERVAL, first=0, name="exchange_rates"
+    )
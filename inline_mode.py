@@ -0,0 +1,101 @@
+import bisect
+import logging
+from typing import Optional
+
+from telegram import InlineQueryResultArticle, InlineQueryResultsButton, InputTextMessageContent, Update
+from telegram.ext import ContextTypes
+
+from coin_info import format_coin_info
+from market_data import MarketSnapshot
+from market_poller import get_snapshot_rows, is_fresh, snapshot_time, snapshot_version
+from metrics import observe_handler
+from top_coins import COIN_EMOJIS
+from config import INLINE_MAX_RESULTS, INLINE_CACHE_TIME, INLINE_ANSWER_CACHE_SIZE
+
+# تنظیم لاگینگ
+logger = logging.getLogger(__name__)
+
+
+def _article(coin: MarketSnapshot) -> InlineQueryResultArticle:
+    """نتیجه inline یک ارز؛ متن ارسالی همان پیام /info است"""
+    change = f" | 24h {coin.change_24h:+.2f}%" if coin.change_24h is not None else ""
+    return InlineQueryResultArticle(
+        id=coin.coin_id,
+        title=f"{COIN_EMOJIS.get(coin.coin_id, '💸')} {coin.symbol.upper()} · {coin.name}",
+        description=f"${coin.price:,.2f}{change}",
+        input_message_content=InputTextMessageContent(format_coin_info(coin)),
+    )
+
+
+class InlineResults:
+    """
+    نتایج inline ساخته‌شده از یک نسخه snapshot بازار: یک article برای هر ارز (مشترک بین
+    همه پرس‌وجوها)، کلیدهای مرتب (نماد، شناسه، نام) برای جستجوی پیشوندی با bisect و
+    پاسخ‌های آماده پرس‌وجوهای تکراری.
+    """
+
+    __slots__ = ("key", "articles", "terms", "answers")
+
+    def __init__(self, key: tuple, rows: list[dict], as_of: Optional[float]):
+        self.key = key
+        coins = sorted(
+            (MarketSnapshot(row, "usd", as_of) for row in rows if row.get("current_price") is not None),
+            key=lambda coin: coin.rank or float("inf"),
+        )
+        self.articles = [_article(coin) for coin in coins]
+        # (کلید، اندیس article)؛ اندیس همان ترتیب ارزش بازار است
+        self.terms = sorted({
+            (term, position)
+            for position, coin in enumerate(coins)
+            for term in (coin.symbol.lower(), coin.coin_id, coin.name.lower())
+        })
+        self.answers: dict[str, list[InlineQueryResultArticle]] = {"": self.articles[:INLINE_MAX_RESULTS]}
+
+    def search(self, query: str) -> list[InlineQueryResultArticle]:
+        """ارزهایی که نماد، شناسه یا نامشان با query شروع می‌شود (تطبیق کامل و ارزش بازار بیشتر اول)"""
+        answer = self.answers.get(query)
+        if answer is not None:
+            return answer
+
+        best: dict[int, tuple[bool, int]] = {}
+        for term, position in self.terms[bisect.bisect_left(self.terms, (query,)):]:
+            if not term.startswith(query):
+                break
+            order = (term != query, position)
+            if position not in best or order < best[position]:
+                best[position] = order
+        answer = [self.articles[position] for position in sorted(best, key=best.get)[:INLINE_MAX_RESULTS]]
+
+        if len(self.answers) >= INLINE_ANSWER_CACHE_SIZE:
+            # قدیمی‌ترین پاسخ (غیر از پاسخ پرس‌وجوی خالی) حذف می‌شود
+            del self.answers[next(key for key in self.answers if key)]
+        self.answers[query] = answer
+        return answer
+
+
+# نتایج نسخه فعلی snapshot (با تغییر نسخه یا تازگی snapshot دوباره ساخته می‌شود)
+_results: Optional[InlineResults] = None
+
+
+def get_inline_results() -> InlineResults:
+    """نتایج inline برای snapshot فعلی (ساخت دوباره فقط یک بار پس از هر به‌روزرسانی poller)"""
+    global _results
+    fresh = is_fresh()
+    key = (snapshot_version(), fresh)
+    if _results is None or _results.key != key:
+        _results = InlineResults(key, get_snapshot_rows(), None if fresh else snapshot_time())
+        logger.debug("نتایج inline برای snapshot %s ساخته شد: %s ارز", key[0], len(_results.articles))
+    return _results
+
+
+@observe_handler("inline")
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    پاسخ به پرس‌وجوی inline (@bot btc) از نتایج آماده، بدون درخواست به کوین‌گکو.
+    پرس‌وجوی خالی ارزهای برتر snapshot را نشان می‌دهد.
+    """
+    query = update.inline_query
+    articles = get_inline_results().search(query.query.strip().lower())
+    # بدون نتیجه: دکمه باز کردن ربات برای جستجوی کامل با /info
+    button = None if articles else InlineQueryResultsButton("🔎 جستجو در ربات", start_parameter="inline")
+    await query.answer(articles, cache_time=INLINE_CACHE_TIME, is_personal=False, button=button)
@@ -0,0 +1,267 @@
+import logging
+import re
+import time
+from typing import Optional
+
+from telegram import Bot, Update
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, Forbidden
+from telegram.ext import Application, ContextTypes
+
+from exchange_rates import format_amount, rate, UnsupportedCurrency
+from market_data import market_data, failure_message
+from metrics import CallbackMetric, observe_handler
+from outbound import Lane, dispatcher, reply_text
+from rate_limiter import Priority
+from symbol_index import resolve_symbol, not_found_message
+from user_settings import currency_for
+from config import LIVE_TICK_INTERVAL, LIVE_DURATION, LIVE_MAX_COINS
+
+# تنظیم لاگینگ
+logger = logging.getLogger(__name__)
+
+# خطاهای ویرایشی که یعنی پیام دیگر قابل به‌روزرسانی نیست (حذف شده یا خیلی قدیمی)
+_GONE_ERRORS = ("message to edit not found", "message can't be edited", "chat not found")
+
+
+class LiveSubscription:
+    """
+    یک پیام زنده (حداکثر یکی در هر چت).
+    text آخرین متن ساخته‌شده و shown متنی است که واقعاً در تلگرام نمایش داده شده؛ در هر
+    لحظه حداکثر یک ویرایش در صف است و آن ویرایش تازه‌ترین text را هنگام ارسال می‌فرستد.
+    """
+
+    __slots__ = ("chat_id", "message_id", "symbols", "coin_ids", "currency", "expires_at", "text", "shown", "editing")
+
+    def __init__(self, chat_id: int, message_id: int, symbols: list[str], coin_ids: list[str],
+                 currency: str, expires_at: float, text: str):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.symbols = symbols
+        self.coin_ids = coin_ids
+        self.currency = currency
+        self.expires_at = expires_at
+        self.text = text
+        self.shown = text
+        self.editing = False
+
+
+# اشتراک‌ها به تفکیک چت و ایندکس ارز -> چت‌های مشترک (تیک فقط ارزهای همین ایندکس را دریافت می‌کند)
+_subscriptions: dict[int, LiveSubscription] = {}
+_subscribers: dict[str, set[int]] = {}
+# شمارنده‌ها: ویرایش‌های ارسال‌شده و ویرایش‌های حذف‌شده چون متن تغییری نکرده بود
+stats = {"ticks": 0, "edits": 0, "unchanged": 0}
+
+CallbackMetric("live_subscriptions", "پیام‌های زنده فعال", (), lambda: {(): len(_subscriptions)})
+CallbackMetric(
+    "live_edits_total", "ویرایش پیام‌های زنده", ("result",),
+    lambda: {("sent",): stats["edits"], ("unchanged",): stats["unchanged"]},
+    kind="counter",
+)
+
+
+def render_live(symbols: list[str], coin_ids: list[str], prices: dict[str, Optional[float]], currency: str) -> str:
+    """
+    متن پیام زنده؛ بدون زمان به‌روزرسانی یا انقضا تا متن فقط با تغییر قیمت تغییر کند
+    و بین همه پیام‌های با ارزهای یکسان مشترک باشد.
+    """
+    width = max(len(symbol) for symbol in symbols)
+    rows = []
+    for symbol, coin_id in zip(symbols, coin_ids):
+        price = prices.get(coin_id)
+        rows.append(f"{symbol.upper():<{width}}  {format_amount(price, currency) if price is not None else '—'}")
+    return (
+        "📡 قیمت زنده:\n<pre>" + "\n".join(rows) + "</pre>\n"
+        f"به‌روزرسانی هر {LIVE_TICK_INTERVAL:.0f} ثانیه تا {LIVE_DURATION / 60:.0f} دقیقه | توقف: /live stop"
+    )
+
+
+def _subscribe(subscription: LiveSubscription) -> None:
+    _subscriptions[subscription.chat_id] = subscription
+    for coin_id in subscription.coin_ids:
+        _subscribers.setdefault(coin_id, set()).add(subscription.chat_id)
+
+
+def _unsubscribe(chat_id: int) -> Optional[LiveSubscription]:
+    subscription = _subscriptions.pop(chat_id, None)
+    if subscription is not None:
+        for coin_id in subscription.coin_ids:
+            chats = _subscribers.get(coin_id)
+            if chats is not None:
+                chats.discard(chat_id)
+                if not chats:
+                    del _subscribers[coin_id]
+    return subscription
+
+
+def _edit(bot: Bot, subscription: LiveSubscription) -> None:
+    """ویرایش پیام زنده از صف ارسال (اگه ویرایش قبلی هنوز در صف باشد، همان متن تازه را می‌فرستد)"""
+    if subscription.editing:
+        return
+    subscription.editing = True
+
+    async def edit():
+        text = subscription.text
+        try:
+            if text != subscription.shown:
+                await bot.edit_message_text(
+                    text, chat_id=subscription.chat_id, message_id=subscription.message_id,
+                    parse_mode=ParseMode.HTML,
+                )
+                stats["edits"] += 1
+            subscription.shown = text
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                subscription.shown = text
+            elif any(reason in str(e).lower() for reason in _GONE_ERRORS):
+                logger.debug("پیام زنده چت %s دیگر قابل ویرایش نیست: %s", subscription.chat_id, e)
+                if _subscriptions.get(subscription.chat_id) is subscription:
+                    _unsubscribe(subscription.chat_id)
+            else:
+                raise
+        except Forbidden:
+            # ربات مسدود یا از گروه حذف شده
+            if _subscriptions.get(subscription.chat_id) is subscription:
+                _unsubscribe(subscription.chat_id)
+            raise
+        finally:
+            subscription.editing = False
+
+    dispatcher.submit(subscription.chat_id, edit, Lane.LIVE)
+
+
+def _finish(bot: Bot, subscription: LiveSubscription, note: str) -> None:
+    """آخرین ویرایش پیام زنده (بدون خط توقف) و برداشتن سنجاق آن"""
+    subscription.text = subscription.text.rsplit("\n", 1)[0] + f"\n{note}"
+    # ویرایش در صف (اگه باشد) ممکن است متن قبلی را برداشته باشد؛ متن پایانی جداگانه فرستاده می‌شود
+    subscription.editing = False
+    _edit(bot, subscription)
+
+    async def unpin():
+        try:
+            return await bot.unpin_chat_message(subscription.chat_id, subscription.message_id)
+        except BadRequest as e:
+            logger.debug("برداشتن سنجاق پیام زنده چت %s ممکن نشد: %s", subscription.chat_id, e)
+
+    dispatcher.submit(subscription.chat_id, unpin, Lane.LIVE)
+
+
+async def live_tick(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    تیک مشترک همه پیام‌های زنده: قیمت همه ارزهای دارای مشترک با یک فراخوانی دسته‌ای
+    (snapshot، کش یا یک درخواست کوین‌گکو) دریافت می‌شود و هر متن یک بار برای هر
+    ترکیب (ارزها، ارز نمایش) ساخته و بین همه پیام‌های آن ترکیب پخش می‌شود. پیام‌هایی
+    که متنشان تغییری نکرده ویرایش نمی‌شوند و اشتراک‌های منقضی پایان می‌یابند.
+    """
+    if not _subscriptions:
+        return
+    now = time.time()
+    for subscription in [s for s in _subscriptions.values() if s.expires_at <= now]:
+        _unsubscribe(subscription.chat_id)
+        _finish(context.bot, subscription, "⏹ پخش زنده به پایان رسید. شروع دوباره: /live")
+    if not _subscribers:
+        return
+
+    try:
+        prices = await market_data.latest_prices(list(_subscribers), "usd", priority=Priority.BACKGROUND)
+    except Exception as e:
+        logger.warning("خطا در دریافت قیمت برای پیام‌های زنده: %s", e)
+        return
+    stats["ticks"] += 1
+
+    texts: dict[tuple, str] = {}
+    rates: dict[str, float] = {}
+    for subscription in _subscriptions.values():
+        key = (tuple(subscription.symbols), tuple(subscription.coin_ids), subscription.currency)
+        text = texts.get(key)
+        if text is None:
+            currency = subscription.currency
+            if currency not in rates:
+                try:
+                    rates[currency] = rate(currency)
+                except UnsupportedCurrency:
+                    # جدول نرخ‌ها هنوز بارگذاری نشده؛ این اشتراک در تیک بعدی به‌روز می‌شود
+                    continue
+            factor = rates[currency]
+            converted = {coin_id: prices[coin_id] * factor if prices.get(coin_id) is not None else None
+                         for coin_id in subscription.coin_ids}
+            text = texts[key] = render_live(subscription.symbols, subscription.coin_ids, converted, currency)
+        subscription.text = text
+        if text == subscription.shown:
+            stats["unchanged"] += 1
+        else:
+            _edit(context.bot, subscription)
+
+
+@observe_handler("live")
+async def live(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    شروع پیام زنده (دستور /live btc eth): یک پیام سنجاق‌شده در چت که تا LIVE_DURATION
+    ثانیه در جا به‌روز می‌شود. /live stop پیام زنده فعلی چت را متوقف می‌کند.
+    """
+    logger.debug("اجرای دستور /live توسط کاربر %s", update.effective_user.id)
+    chat_id = update.effective_chat.id
+    symbols = [s for s in re.split(r"[\s,]+", " ".join(context.args).lower()) if s]
+    if not symbols:
+        reply_text(update.message, "لطفاً نماد ارز را وارد کنید. مثال: /live btc eth\nتوقف: /live stop")
+        return
+
+    if symbols == ["stop"]:
+        subscription = _unsubscribe(chat_id)
+        if subscription is None:
+            reply_text(update.message, "پیام زنده‌ای در این چت فعال نیست.")
+            return
+        _finish(context.bot, subscription, "⏹ پخش زنده متوقف شد. شروع دوباره: /live")
+        reply_text(update.message, "⏹ پیام زنده متوقف شد.")
+        return
+
+    symbols = list(dict.fromkeys(symbols))[:LIVE_MAX_COINS]
+    coin_ids = []
+    for symbol in symbols:
+        coin_id = resolve_symbol(symbol)
+        if coin_id is None:
+            reply_text(update.message, not_found_message(symbol))
+            return
+        coin_ids.append(coin_id)
+
+    currency = currency_for(update)
+    try:
+        quotes = await market_data.quotes(coin_ids, currency)
+    except Exception as e:
+        reply_text(update.message, failure_message(e, f"قیمت زنده ارزهای {coin_ids}"))
+        return
+
+    expires_at = time.time() + LIVE_DURATION
+    prices = {coin_id: quote.price if quote is not None else None for coin_id, quote in quotes.items()}
+    text = render_live(symbols, coin_ids, prices, currency)
+    message = await reply_text(update.message, text, parse_mode=ParseMode.HTML)
+    if message is None:
+        return
+
+    # هر چت یک پیام زنده: پیام قبلی همین چت متوقف می‌شود
+    previous = _unsubscribe(chat_id)
+    if previous is not None:
+        _finish(context.bot, previous, "⏹ پخش زنده با پیام جدید جایگزین شد.")
+    _subscribe(LiveSubscription(chat_id, message.message_id, symbols, coin_ids, currency, expires_at, text))
+
+    async def pin():
+        try:
+            return await context.bot.pin_chat_message(chat_id, message.message_id, disable_notification=True)
+        except BadRequest as e:
+            # مثلاً در گروهی که ربات اجازه سنجاق ندارد؛ پیام بدون سنجاق به‌روز می‌شود
+            logger.debug("سنجاق پیام زنده در چت %s ممکن نشد: %s", chat_id, e)
+
+    dispatcher.submit(chat_id, pin, Lane.INTERACTIVE)
+
+
+def get_stats() -> dict:
+    """شمارنده‌های پیام‌های زنده"""
+    return {"subscriptions": len(_subscriptions), "coins": len(_subscribers), **stats}
+
+
+def start_live(application: Application) -> None:
+    """زمان‌بندی تیک مشترک پیام‌های زنده روی job queue برنامه"""
+    if application.job_queue is None:
+        logger.warning("job queue در دسترس نیست؛ پیام‌های زنده به‌روز نمی‌شوند")
+        return
+    application.job_queue.run_repeating(live_tick, interval=LIVE_TICK_INTERVAL, first=LIVE_TICK_INTERVAL, name="live")
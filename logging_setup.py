@@ -0,0 +1,164 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import time
+from typing import Any, Optional
+
+from config import (
+    LOG_LEVEL, LOG_LEVELS, LOG_FORMAT, LOG_SAMPLE_RATE, LOG_SAMPLE_BURST, LOG_PAYLOAD_MAX,
+)
+
+# فیلدهای استاندارد LogRecord (بقیه فیلدها از extra= در خروجی JSON می‌آیند)
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sampled_out"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """یک شیء JSON در هر خط: زمان، سطح، logger، پیام و فیلدهای extra"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "sampled_out", 0):
+            entry["sampled_out"] = record.sampled_out
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                entry[key] = value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """قالب متنی قبلی به‌همراه تعداد پیام‌های حذف‌شده در نمونه‌برداری"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        if getattr(record, "sampled_out", 0):
+            line += f" (+{record.sampled_out} مورد مشابه حذف شد)"
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """
+    نمونه‌برداری با نرخ محدود برای پیام‌های DEBUG: برای هر محل لاگ (logger و قالب پیام)
+    یک سطل توکن با ظرفیت LOG_SAMPLE_BURST و نرخ LOG_SAMPLE_RATE در ثانیه.
+    تعداد پیام‌های حذف‌شده در فیلد sampled_out پیام بعدی همان محل ثبت می‌شود.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        # (نام logger، قالب پیام) -> [توکن‌ها، آخرین به‌روزرسانی، تعداد حذف‌شده]
+        self._buckets: dict[tuple[str, Any], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate <= 0:
+            return True
+        now = time.monotonic()
+        key = (record.name, record.msg)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) > 10_000:
+                self._buckets.clear()
+            bucket = self._buckets[key] = [float(self.burst), now, 0]
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            bucket[2] += 1
+            return False
+        bucket[0] -= 1
+        record.sampled_out, bucket[2] = bucket[2], 0
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler بدون قالب‌بندی در thread فراخوان: ساخت پیام و نوشتن آن هر دو در
+    thread پس‌زمینه QueueListener انجام می‌شوند تا event loop معطل نشود.
+    (آرگومان‌های لاگ پس از فراخوانی نباید تغییر کنند.)
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class payload:
+    """
+    نمایش تنبل و کوتاه‌شده یک پاسخ API برای لاگ: فقط هنگام نوشتن (در thread پس‌زمینه)
+    به رشته تبدیل و به LOG_PAYLOAD_MAX کاراکتر محدود می‌شود؛ با LOG_PAYLOAD_MAX=0 فقط اندازه.
+    مثال: logger.debug("پاسخ API: %s", payload(data))
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __str__(self) -> str:
+        if LOG_PAYLOAD_MAX <= 0:
+            size = len(self.value) if hasattr(self.value, "__len__") else "?"
+            return f"<{type(self.value).__name__} با {size} عضو>"
+        text = json.dumps(self.value, ensure_ascii=False, default=str)
+        if len(text) > LOG_PAYLOAD_MAX:
+            return f"{text[:LOG_PAYLOAD_MAX]}… ({len(text)} کاراکتر)"
+        return text
+
+
+def _parse_levels(spec: str) -> dict[str, str]:
+    """خواندن LOG_LEVELS به شکل «httpx=WARNING,coin_price=DEBUG»"""
+    levels = {}
+    for item in spec.split(","):
+        name, sep, level = item.partition("=")
+        if sep and name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging() -> None:
+    """
+    راه‌اندازی لاگینگ برنامه (جایگزین basicConfig): همه لاگ‌ها از یک صف به thread
+    پس‌زمینه QueueListener می‌روند و آنجا با قالب متنی یا JSON (LOG_FORMAT) نوشته می‌شوند.
+    سطح کلی از LOG_LEVEL و سطح هر logger از LOG_LEVELS خوانده می‌شود.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE, LOG_SAMPLE_BURST))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL.upper())
+    for name, level in _parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """نوشتن باقی‌مانده صف و توقف thread لاگ (در خروج برنامه)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import logging
+from typing import Iterable, Optional
+
+import httpx
+
+from cache import TTLCache
+from coingecko_client import get_json
+from exchange_rates import UnsupportedCurrency, btc_rate, ensure_rates, is_crypto
+from logging_setup import payload
+from startup import lazy_import
+from market_poller import get_market_row, get_top_rows, snapshot_time
+from price_cache import chunk_ids, get_prices, get_quotes
+from rate_limiter import Priority, RateLimited, rate_limited_message
+from symbol_index import update_market_cap_ranks
+from timeseries_store import get_series
+from config import INFO_CACHE_TTL, TOP_CACHE_TTL, PRICE_CACHE_MAX_SIZE, REQUEST_BUDGET_MS
+
+# numpy فقط برای تبدیل سری‌ها به ارزهای رمزارزی (بارگذاری در اولین استفاده)
+np = lazy_import("numpy")
+
+# تنظیم لاگینگ
+logger = logging.getLogger(__name__)
+
+# کش ردیف بازار ارزهای خارج از snapshot با کلید (coin_id, vs_currency)
+info_cache = TTLCache("info", ttl=INFO_CACHE_TTL, max_size=PRICE_CACHE_MAX_SIZE)
+# کش فهرست ارزهای برتر (وقتی snapshot بازار تازه نیست)
+top_cache = TTLCache("top", ttl=TOP_CACHE_TTL, max_size=4)
+
+
+class Quote:
+    """قیمت یک ارز؛ as_of زمان دریافت داده قدیمی (epoch) یا None اگه تازه است"""
+
+    __slots__ = ("coin_id", "vs_currency", "price", "as_of")
+
+    def __init__(self, coin_id: str, vs_currency: str, price: float, as_of: Optional[float] = None):
+        self.coin_id = coin_id
+        self.vs_currency = vs_currency
+        self.price = price
+        self.as_of = as_of
+
+
+class MarketSnapshot:
+    """ردیف بازار یک ارز (خروجی /coins/markets) با مبالغ تبدیل‌شده به vs_currency با ضریب rate"""
+
+    __slots__ = (
+        "coin_id", "symbol", "name", "vs_currency", "price", "change_24h",
+        "volume_24h", "market_cap", "rank", "as_of",
+    )
+
+    def __init__(self, row: dict, vs_currency: str = "usd", as_of: Optional[float] = None, rate: float = 1.0):
+        self.coin_id = row["id"]
+        self.symbol = row["symbol"]
+        self.name = row["name"]
+        self.vs_currency = vs_currency
+        self.price = _convert(row["current_price"], rate)
+        self.change_24h = row.get("price_change_percentage_24h")
+        self.volume_24h = _convert(row.get("total_volume"), rate)
+        self.market_cap = _convert(row.get("market_cap"), rate)
+        self.rank = row.get("market_cap_rank")
+        self.as_of = as_of
+
+
+class PriceSeries:
+    """سری قیمت یک ارز در بازه days (آرایه‌های numpy هم‌طول)"""
+
+    __slots__ = ("coin_id", "vs_currency", "days", "timestamps", "prices", "volumes")
+
+    def __init__(
+        self, coin_id: str, vs_currency: str, days: str,
+        timestamps: np.ndarray, prices: np.ndarray, volumes: np.ndarray,
+    ):
+        self.coin_id = coin_id
+        self.vs_currency = vs_currency
+        self.days = days
+        self.timestamps = timestamps
+        self.prices = prices
+        self.volumes = volumes
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+
+def _convert(value: Optional[float], rate: float) -> Optional[float]:
+    return value * rate if value is not None else None
+
+
+def oldest_as_of(results: Iterable) -> Optional[float]:
+    """قدیمی‌ترین as_of در نتایج (None و نتایج تازه نادیده گرفته می‌شوند)"""
+    return min((result.as_of for result in results if result is not None and result.as_of), default=None)
+
+
+def failure_message(error: Exception, subject: str) -> str:
+    """
+    ثبت خطای دریافت داده در لاگ و ساخت پیام مناسب برای کاربر.
+    ورودی: خطا و توضیح داده درخواستی برای لاگ (مثل "قیمت ارز bitcoin")
+    خروجی: متن پاسخ به کاربر
+    """
+    if isinstance(error, UnsupportedCurrency):
+        logger.warning("ارز %s برای %s در جدول نرخ‌ها نیست", error.currency, subject)
+        return f"ارز {error.currency.upper()} پشتیبانی نمی‌شود. ارز دیگری با /currency انتخاب کنید."
+    if isinstance(error, RateLimited):
+        logger.warning("محدودیت نرخ در دریافت %s: %s", subject, error)
+        return rate_limited_message(error)
+    if isinstance(error, httpx.HTTPStatusError):
+        logger.error("خطای HTTP در دریافت %s: %s", subject, error)
+        return "خطای سرور API. دوباره امتحان کنید."
+    if isinstance(error, httpx.RequestError):
+        logger.error("خطای شبکه در دریافت %s: %s", subject, error)
+        return "خطای شبکه. اینترنت خود را بررسی کنید."
+    logger.error("خطای عمومی در دریافت %s: %s", subject, error)
+    return "خطایی رخ داد. دوباره امتحان کنید."
+
+
+class MarketDataService:
+    """
+    لایه واحد دسترسی به داده بازار برای همه دستورها. هر متد به ترتیب از snapshot
+    پس‌زمینه، کش مشترک (stale-while-revalidate در بودجه REQUEST_BUDGET_MS) و درخواست
+    دسته‌ای به کوین‌گکو استفاده می‌کند و در قطعی کوین‌گکو به snapshot قدیمی برمی‌گردد.
+    داده همیشه به دلار دریافت و کش می‌شود و با جدول exchange_rates به vs_currency
+    تبدیل می‌شود؛ پس ارزهای دیگر درخواست یا ورودی کش اضافه‌ای ندارند.
+    """
+
+    async def quotes(self, coin_ids: list[str], vs_currency: str = "usd") -> dict[str, Optional[Quote]]:
+        """
+        قیمت چند ارز برای پاسخ به کاربر (یک درخواست /simple/price برای همه ارزهای ناموجود).
+        خروجی: دیکشنری شناسه ارز -> Quote (None برای ارزهای یافت‌نشده)
+        """
+        rate = await ensure_rates(vs_currency)
+        prices, as_of = await get_quotes(coin_ids, "usd")
+        return {
+            coin_id: Quote(coin_id, vs_currency, price * rate, as_of) if price is not None else None
+            for coin_id, price in prices.items()
+        }
+
+    async def quote(self, coin_id: str, vs_currency: str = "usd") -> Optional[Quote]:
+        return (await self.quotes([coin_id], vs_currency)).get(coin_id)
+
+    async def latest_prices(
+        self, coin_ids: list[str], vs_currency: str = "usd", priority: Priority = Priority.BACKGROUND
+    ) -> dict[str, Optional[float]]:
+        """قیمت تازه (بدون داده قدیمی و بودجه زمانی) برای کارهای پس‌زمینه مثل بررسی هشدارها"""
+        return await get_prices(coin_ids, vs_currency, priority=priority)
+
+    async def snapshots(self, coin_ids: list[str], vs_currency: str = "usd") -> dict[str, Optional[MarketSnapshot]]:
+        """
+        ردیف بازار چند ارز: ارزهای snapshot تازه بدون درخواست، بقیه با یک درخواست
+        /coins/markets?ids=... (در دسته‌های محدود به طول URL).
+        خروجی: دیکشنری شناسه ارز -> MarketSnapshot (None برای ارزهای یافت‌نشده)
+        """
+        rate = await ensure_rates(vs_currency)
+        results: dict[str, Optional[MarketSnapshot]] = {}
+        remaining = []
+        for coin_id in dict.fromkeys(coin_ids):
+            row = get_market_row(coin_id)
+            if row is not None:
+                results[coin_id] = MarketSnapshot(row, vs_currency, rate=rate)
+            else:
+                remaining.append(coin_id)
+        if not remaining:
+            return results
+
+        async def fetch(keys: list[tuple[str, str]]) -> dict:
+            fetched = {}
+            for chunk in chunk_ids([coin_id for coin_id, _ in keys]):
+                rows = await get_json(
+                    "/coins/markets",
+                    params={"vs_currency": "usd", "ids": ",".join(chunk), "per_page": len(chunk), "page": 1},
+                )
+                logger.debug("پاسخ API برای %s: %s", chunk, payload(rows))
+                fetched.update({(row["id"], "usd"): row for row in rows})
+            return fetched
+
+        try:
+            rows, as_of = await info_cache.get_many_swr(
+                [(coin_id, "usd") for coin_id in remaining], fetch, REQUEST_BUDGET_MS / 1000
+            )
+        except (RateLimited, httpx.HTTPError):
+            # حالت آفلاین: آخرین snapshot بازار حتی اگه قدیمی باشد
+            rows = {(coin_id, "usd"): get_market_row(coin_id, allow_stale=True) for coin_id in remaining}
+            if any(row is None for row in rows.values()):
+                raise
+            as_of = snapshot_time()
+
+        for (coin_id, _), row in rows.items():
+            results[coin_id] = MarketSnapshot(row, vs_currency, as_of, rate) if row else None
+        return results
+
+    async def snapshot(self, coin_id: str, vs_currency: str = "usd") -> Optional[MarketSnapshot]:
+        return (await self.snapshots([coin_id], vs_currency)).get(coin_id)
+
+    async def top(self, count: int = 10, vs_currency: str = "usd") -> list[MarketSnapshot]:
+        """count ارز برتر بر اساس ارزش بازار (بدون snapshot تازه، حداکثر 250 ارز با یک درخواست)"""
+        rate = await ensure_rates(vs_currency)
+        rows = get_top_rows(count)
+        as_of = None
+        if rows is None:
+            async def fetch() -> list:
+                rows = await get_json(
+                    "/coins/markets",
+                    params={"vs_currency": "usd", "order": "market_cap_desc", "per_page": min(count, 250), "page": 1},
+                )
+                update_market_cap_ranks(rows)
+                return rows
+
+            try:
+                rows, as_of = await top_cache.get_swr(("usd", count), fetch, REQUEST_BUDGET_MS / 1000)
+            except (RateLimited, httpx.HTTPError):
+                rows = get_top_rows(count, allow_stale=True)
+                if rows is None:
+                    raise
+                as_of = snapshot_time()
+        return [MarketSnapshot(row, vs_currency, as_of, rate) for row in rows]
+
+    async def series(self, coin_id: str, days: str = "7", vs_currency: str = "usd") -> PriceSeries:
+        """
+        سری قیمت از ذخیره‌ساز محلی (فقط بخش جدید از کوین‌گکو دریافت می‌شود).
+        ارزهای فیات با نرخ فعلی تبدیل می‌شوند؛ برای رمزارزها (btc، eth، sats، ...) قیمت هر نقطه
+        بر قیمت بیت‌کوین در همان زمان (سری دلاری بیت‌کوین از همان ذخیره‌ساز) تقسیم می‌شود.
+        """
+        rate = await ensure_rates(vs_currency)
+        timestamps, prices, volumes = await get_series(coin_id, days, "usd")
+        if vs_currency != "usd" and len(prices):
+            if is_crypto(vs_currency):
+                btc_times, btc_prices, _ = await get_series("bitcoin", days, "usd")
+                if not len(btc_prices):
+                    return PriceSeries(coin_id, vs_currency, days, timestamps[:0], prices[:0], volumes[:0])
+                rate = btc_rate(vs_currency) / np.interp(timestamps, btc_times, btc_prices)
+            prices, volumes = prices * rate, volumes * rate
+        return PriceSeries(coin_id, vs_currency, days, timestamps, prices, volumes)
+
+
+market_data = MarketDataService()
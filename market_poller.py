@@ -0,0 +1,165 @@
+import logging
+import random
+import time
+from typing import Optional
+
+import httpx
+from telegram.ext import Application, ContextTypes
+
+from cache import TTLCache
+from coingecko_client import get_json
+from rate_limiter import Priority, RateLimited
+from symbol_index import SYMBOL_TO_ID, update_market_cap_ranks
+from config import (
+    MARKET_POLL_INTERVAL, MARKET_POLL_MAX_BACKOFF, MARKET_POLL_JITTER,
+    MARKET_SNAPSHOT_MAX_AGE, MARKET_WATCHLIST, MARKET_TOP_SIZE,
+)
+
+# تنظیم لاگینگ
+logger = logging.getLogger(__name__)
+
+# سقف per_page در /coins/markets کوین‌گکو
+MARKETS_PAGE_LIMIT = 250
+
+# آخرین snapshot بازار: شناسه ارز -> ردیف /coins/markets
+_rows: dict[str, dict] = {}
+# همان ردیف‌ها مرتب بر اساس رتبه ارزش بازار (یک بار در هر به‌روزرسانی)
+_ranked: list[dict] = []
+_updated_at: float = 0.0
+# شماره نسخه snapshot (با هر به‌روزرسانی موفق یکی زیاد می‌شود؛ برای ساخت دوباره داده‌های مشتق)
+_version = 0
+# تعداد خطاهای پشت‌سرهم (برای backoff) و آخرین Retry-After
+_failures = 0
+_retry_after = 0.0
+# snapshot مشترک بین workerها (کمی کوتاه‌تر از فاصله poll تا هر دور داده تازه بگیرد)
+snapshot_cache = TTLCache("market_snapshot", ttl=MARKET_POLL_INTERVAL * (1 - MARKET_POLL_JITTER), max_size=1)
+
+
+def get_watchlist() -> list[str]:
+    """
+    لیست شناسه ارزهایی که poller علاوه بر MARKET_TOP_SIZE ارز برتر به‌روز نگه می‌دارد.
+    پیش‌فرض: نمادهای محبوب پنل پیشنهادی + ارزهای پنل 10 ارز برتر
+    """
+    if MARKET_WATCHLIST:
+        return MARKET_WATCHLIST
+
+    from coin_suggestions import POPULAR_COINS
+    from top_coins import COIN_EMOJIS
+
+    watchlist = [SYMBOL_TO_ID.get(symbol, symbol) for symbol in POPULAR_COINS]
+    watchlist += [coin_id for coin_id in COIN_EMOJIS if coin_id not in watchlist]
+    return watchlist
+
+
+def is_fresh() -> bool:
+    """آیا snapshot به اندازه کافی تازه است؟"""
+    return bool(_rows) and time.monotonic() - _updated_at <= MARKET_SNAPSHOT_MAX_AGE
+
+
+def snapshot_time() -> Optional[float]:
+    """زمان دریافت snapshot فعلی (ثانیه epoch) یا None اگه هنوز snapshot نداریم"""
+    if not _rows:
+        return None
+    return time.time() - (time.monotonic() - _updated_at)
+
+
+def snapshot_version() -> int:
+    """شماره نسخه snapshot فعلی (0 یعنی هنوز snapshot نداریم)"""
+    return _version
+
+
+def get_snapshot_rows() -> list[dict]:
+    """همه ردیف‌های snapshot فعلی (حتی قدیمی) بدون ترتیب خاص"""
+    return list(_rows.values())
+
+
+def get_market_row(coin_id: str, allow_stale: bool = False) -> Optional[dict]:
+    """
+    ردیف بازار یک ارز از snapshot (اگه تازه باشه) یا None.
+    با allow_stale snapshot قدیمی هم برگردانده می‌شود (برای زمان قطعی کوین‌گکو)
+    """
+    if not allow_stale and not is_fresh():
+        return None
+    return _rows.get(coin_id)
+
+
+def get_top_rows(count: int, allow_stale: bool = False) -> Optional[list[dict]]:
+    """
+    count ارز برتر (بر اساس رتبه ارزش بازار) از snapshot.
+    اگه snapshot تازه نباشه (و allow_stale نباشد) یا ارز کافی نداشته باشه، None
+    """
+    if (not allow_stale and not is_fresh()) or len(_ranked) < count:
+        return None
+    return _ranked[:count]
+
+
+def _next_delay() -> float:
+    """فاصله تا اجرای بعدی با backoff نمایی پس از خطا و jitter تصادفی"""
+    delay = MARKET_POLL_INTERVAL
+    if _failures:
+        delay = min(MARKET_POLL_MAX_BACKOFF, MARKET_POLL_INTERVAL * 2 ** _failures)
+        delay = max(delay, _retry_after)
+    return delay * random.uniform(1 - MARKET_POLL_JITTER, 1 + MARKET_POLL_JITTER)
+
+
+async def refresh_market_snapshot(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """به‌روزرسانی snapshot با یک درخواست دسته‌ای /coins/markets و زمان‌بندی اجرای بعدی"""
+    global _rows, _ranked, _updated_at, _version, _failures, _retry_after
+    watchlist = get_watchlist()
+    async def fetch() -> dict:
+        # MARKET_TOP_SIZE ارز برتر (صفحه‌های 250تایی) و سپس ارزهای watchlist خارج از آن‌ها
+        rows = []
+        per_page = min(MARKET_TOP_SIZE, MARKETS_PAGE_LIMIT)
+        for page in range(1, -(-MARKET_TOP_SIZE // per_page) + 1):
+            rows += await get_json(
+                "/coins/markets",
+                params={"vs_currency": "usd", "order": "market_cap_desc", "per_page": per_page, "page": page},
+                priority=Priority.BACKGROUND,
+            )
+        rows = rows[:MARKET_TOP_SIZE]
+        known = {row["id"] for row in rows}
+        missing = [coin_id for coin_id in watchlist if coin_id not in known]
+        if missing:
+            rows += await get_json(
+                "/coins/markets",
+                params={"vs_currency": "usd", "ids": ",".join(missing), "per_page": len(missing), "page": 1},
+                priority=Priority.BACKGROUND,
+            )
+        return {"fetched_at": time.time(), "rows": rows}
+
+    try:
+        # با کش مشترک فقط یکی از workerها در هر بازه snapshot را از کوین‌گکو می‌گیرد
+        snapshot = await snapshot_cache.get_or_fetch("usd", fetch, serve_stale=False)
+        data = snapshot["rows"]
+        _rows = {row["id"]: row for row in data}
+        _ranked = sorted(_rows.values(), key=lambda row: row.get("market_cap_rank") or float("inf"))
+        _version += 1
+        update_market_cap_ranks(data)
+        # سن snapshot از زمان دریافت واقعی (شاید توسط worker دیگر) حساب می‌شود
+        _updated_at = time.monotonic() - max(0.0, time.time() - snapshot["fetched_at"])
+        _failures = 0
+        _retry_after = 0.0
+        logger.debug("snapshot بازار به‌روز شد: %s ارز", len(_rows))
+    except RateLimited as rate_err:
+        _failures += 1
+        _retry_after = rate_err.retry_after
+        logger.warning("محدودیت نرخ در به‌روزرسانی snapshot بازار: %s", rate_err)
+    except httpx.HTTPStatusError as http_err:
+        _failures += 1
+        logger.warning("خطای HTTP در به‌روزرسانی snapshot بازار: %s", http_err)
+    except httpx.RequestError as req_err:
+        _failures += 1
+        logger.warning("خطای شبکه در به‌روزرسانی snapshot بازار: %s", req_err)
+    except Exception as e:
+        _failures += 1
+        logger.error("خطای عمومی در به‌روزرسانی snapshot بازار: %s", e)
+    finally:
+        context.job_queue.run_once(refresh_market_snapshot, when=_next_delay(), name="market_poller")
+
+
+def start_market_poller(application: Application) -> None:
+    """ثبت اولین اجرای poller روی job queue برنامه"""
+    if application.job_queue is None:
+        logger.warning("job queue در دسترس نیست؛ poller بازار غیرفعال است")
+        return
+    application.job_queue.run_once(refresh_market_snapshot, when=0, name="market_poller")
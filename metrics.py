@@ -0,0 +1,278 @@
+import asyncio
+import bisect
+import contextvars
+import functools
+import logging
+import math
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from config import METRICS_LISTEN, METRICS_PORT, TRACE_UPDATES
+
+# تنظیم لاگینگ
+logger = logging.getLogger(__name__)
+
+# مرزهای پیش‌فرض هیستوگرام (ثانیه)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_metrics: list["_Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _sorted(values: dict) -> list:
+    """مرتب‌سازی نمونه‌ها بر اساس برچسب (برچسب‌ها ممکن است عدد یا رشته باشند)"""
+    return sorted(values.items(), key=lambda item: tuple(map(str, item[0])))
+
+
+def _format_labels(labelnames: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        _metrics.append(self)
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """شمارنده افزایشی با برچسب"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in _sorted(self._values):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """هیستوگرام تجمعی (bucketهای ثابت، مجموع و تعداد)"""
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # برچسب‌ها -> [شمارش هر bucket (غیرتجمعی)، مجموع، تعداد]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    @contextmanager
+    def time(self, *labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def samples(self) -> Iterator[str]:
+        for labels, (counts, total, count) in _sorted(self._values):
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, math.inf), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}"
+
+
+class CallbackMetric(_Metric):
+    """
+    متریکی که هنگام خواندن /metrics از یک تابع پر می‌شود (برای شمارنده‌های موجود
+    کش‌ها، صف‌ها و زمان‌بند، بدون افزودن هزینه به مسیر اصلی).
+    callback: دیکشنری tuple برچسب‌ها -> مقدار
+    """
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: tuple[str, ...], callback: Callable[[], dict], kind: str = "gauge"
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.callback = callback
+
+    def samples(self) -> Iterator[str]:
+        try:
+            values = self.callback()
+        except Exception as e:
+            logger.warning("خطا در خواندن متریک %s: %s", self.name, e)
+            return
+        for labels, value in _sorted(values):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+def render_metrics() -> str:
+    """همه متریک‌ها در قالب متنی Prometheus"""
+    return "\n".join(metric.render() for metric in _metrics) + "\n"
+
+
+# متریک‌های مشترک
+handler_seconds = Histogram("bot_handler_seconds", "زمان اجرای هندلرهای ربات", ("handler",))
+handler_errors = Counter("bot_handler_errors_total", "خطاهای پیش‌بینی‌نشده هندلرها", ("handler",))
+upstream_seconds = Histogram("coingecko_request_seconds", "زمان درخواست‌های کوین‌گکو", ("endpoint", "status"))
+upstream_rejected = Counter(
+    "coingecko_rejected_total", "درخواست‌های کوین‌گکو که ارسال نشدند", ("endpoint", "reason")
+)
+render_seconds = Histogram(
+    "chart_render_seconds", "زمان رسم نمودار در pool پردازه‌ها", (),
+    buckets=(0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0),
+)
+
+
+# ----------------------------- trace -----------------------------
+
+# spanهای آپدیت جاری: لیست (نام، شروع نسبی، مدت) یا None اگه trace فعال نیست
+_trace: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("trace", default=None)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """ثبت یک span در trace آپدیت جاری (بدون هزینه وقتی trace فعال نیست)"""
+    spans = _trace.get()
+    if spans is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans.append((name, started, time.perf_counter() - started))
+
+
+def observe_handler(name: str):
+    """
+    دکوراتور هندلرهای async: زمان اجرا در bot_handler_seconds، خطاها در
+    bot_handler_errors_total و (با TRACE_UPDATES) لاگ spanهای هر آپدیت.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(update, context, *args, **kwargs):
+            async with track(name, update):
+                return await handler(update, context, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class track:
+    """
+    context manager async برای اندازه‌گیری یک هندلر یا شاخه‌ای از آن
+    (مثلاً شاخه‌های button_handler) با همان متریک‌های observe_handler
+    """
+
+    def __init__(self, name: str, update=None):
+        self.name = name
+        self.update = update
+        self._token = None
+
+    async def __aenter__(self) -> "track":
+        self._started = time.perf_counter()
+        if TRACE_UPDATES and _trace.get() is None:
+            self._token = _trace.set([])
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        elapsed = time.perf_counter() - self._started
+        handler_seconds.observe(elapsed, self.name)
+        if exc_type is not None and not issubclass(exc_type, asyncio.CancelledError):
+            handler_errors.inc(self.name)
+        if self._token is None:
+            # هندلر تودرتو: یک span در trace هندلر بیرونی
+            spans = _trace.get()
+            if spans is not None:
+                spans.append((self.name, self._started, elapsed))
+        else:
+            spans = _trace.get()
+            _trace.reset(self._token)
+            update_id = getattr(self.update, "update_id", None) or getattr(self.update, "id", "-")
+            logger.info(
+                "trace update=%s handler=%s total=%.1fms %s",
+                update_id, self.name, elapsed * 1000,
+                " ".join(f"{name}@{(start - self._started) * 1000:.0f}ms={duration * 1000:.1f}ms"
+                         for name, start, duration in spans),
+            )
+
+
+# ----------------------------- endpoint -----------------------------
+
+_server: Optional[asyncio.AbstractServer] = None
+
+
+async def _handle_http(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """سرور HTTP حداقلی: فقط GET /metrics"""
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), 5)
+        while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+            pass  # رد کردن هدرها
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            status, body = "200 OK", render_metrics().encode()
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            status, body, content_type = "404 Not Found", b"not found\n", "text/plain"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(application=None) -> None:
+    """اجرای endpoint محلی /metrics (در post_init)"""
+    global _server
+    if METRICS_PORT and _server is None:
+        try:
+            _server = await asyncio.start_server(_handle_http, METRICS_LISTEN, METRICS_PORT)
+            logger.info("endpoint متریک روی http://%s:%d/metrics", METRICS_LISTEN, METRICS_PORT)
+        except OSError as e:
+            logger.warning("راه‌اندازی endpoint متریک ممکن نشد: %s", e)
+
+
+async def stop_metrics_server(application=None) -> None:
+    global _server
+    if _server is not None:
+        _server.close()
+        await _server.wait_closed()
+        _server = None
@@ -0,0 +1,368 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Optional
+
+from telegram import Bot, Message
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+from telegram.ext import Application
+
+from metrics import CallbackMetric
+from config import (
+    OUTBOUND_RATE, OUTBOUND_BURST, OUTBOUND_CHAT_RATE, OUTBOUND_GROUP_RATE_PER_MINUTE,
+    OUTBOUND_CHAT_BURST, OUTBOUND_CONCURRENCY, OUTBOUND_MAX_RETRIES, OUTBOUND_QUEUE_SIZE,
+)
+
+# تنظیم لاگینگ
+logger = logging.getLogger(__name__)
+
+# حداکثر زمان تخلیه صف هنگام خاموش شدن (ثانیه)
+DRAIN_TIMEOUT = 5.0
+# فاصله پاک‌سازی وضعیت چت‌های بیکار (ثانیه)
+PRUNE_INTERVAL = 60.0
+
+
+class Lane(IntEnum):
+    """مسیرهای اولویت ارسال (عدد کمتر = اولویت بیشتر)"""
+    INTERACTIVE = 0  # پاسخ مستقیم به کاربر
+    ALERT = 1        # هشدارهای قیمت
+    BROADCAST = 2    # پیام‌های همگانی
+    LIVE = 3         # ویرایش پیام‌های زنده (/live)
+
+
+class TokenBucket:
+    """token bucket ساده بدون انتظار (فقط محاسبه زمان آماده شدن توکن بعدی)"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """ثانیه تا در دسترس بودن یک توکن (0 یعنی همین الان)"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+class _Job:
+    """
+    یک ارسال در صف: send هر بار یک coroutine تازه می‌سازد تا تکرار پس از RetryAfter ممکن باشد.
+    seq شماره ترتیب ثبت است و در تکرار هم حفظ می‌شود تا کار جلوتر از پیام‌های بعدی همان چت بماند.
+    """
+
+    __slots__ = ("chat_id", "send", "lane", "future", "seq", "attempts")
+
+    def __init__(self, chat_id: int, send: Callable[[], Awaitable[Any]], lane: Lane, future: asyncio.Future, seq: int):
+        self.chat_id = chat_id
+        self.send = send
+        self.lane = lane
+        self.future = future
+        self.seq = seq
+        self.attempts = 0
+
+
+class _Chat:
+    """وضعیت ارسال یک چت: bucket اختصاصی، توقف flood و کارهای منتظر پایان ارسال جاری"""
+
+    __slots__ = ("bucket", "paused_until", "busy", "waiting")
+
+    def __init__(self, chat_id: int):
+        # گروه‌ها (شناسه منفی) محدودیت سخت‌گیرانه‌تری دارند
+        rate = OUTBOUND_CHAT_RATE if chat_id > 0 else OUTBOUND_GROUP_RATE_PER_MINUTE / 60.0
+        self.bucket = TokenBucket(rate, OUTBOUND_CHAT_BURST)
+        self.paused_until = 0.0
+        self.busy = False
+        self.waiting: list[tuple[int, int, _Job]] = []
+
+
+class OutboundDispatcher:
+    """
+    صف ارسال پیام‌های تلگرام با bucket سراسری و bucket هر چت.
+    کارها به ترتیب اولویت مسیر ارسال می‌شوند؛ کاری که چتش هنوز مجاز نیست کنار گذاشته
+    می‌شود تا بقیه چت‌ها منتظر نمانند. در هر چت فقط یک ارسال هم‌زمان انجام می‌شود تا ترتیب
+    پیام‌ها حفظ شود. خطای RetryAfter چت را متوقف و کار را دوباره در صف می‌گذارد.
+    """
+
+    def __init__(self):
+        self._bot: Optional[Bot] = None
+        self._heap: list[tuple[int, int, _Job]] = []
+        self._timers: list[tuple[float, int, int, _Job]] = []  # کارهای منتظر زمان (bucket یا flood چت)
+        self._chats: dict[int, _Chat] = {}
+        self._global = TokenBucket(OUTBOUND_RATE, OUTBOUND_BURST)
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._tasks: set[asyncio.Task] = set()
+        self._pending = 0
+        self._last_prune = time.monotonic()
+        # شمارنده‌ها
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.flood_waits = 0
+
+    def submit(self, chat_id: int, send: Callable[[], Awaitable[Any]], lane: Lane = Lane.INTERACTIVE) -> asyncio.Future:
+        """
+        افزودن یک ارسال به صف (بدون انتظار).
+        خروجی: future که با نتیجه ارسال (مثلاً Message) یا None در صورت خطا/دور ریختن کامل می‌شود
+        """
+        future = asyncio.get_running_loop().create_future()
+        if lane != Lane.INTERACTIVE and self._pending >= OUTBOUND_QUEUE_SIZE:
+            # پاسخ‌های کاربر هیچ‌وقت دور ریخته نمی‌شوند؛ فقط هشدار، پیام همگانی و ویرایش زنده
+            self.dropped += 1
+            logger.warning("صف ارسال پر است؛ پیام %s چت %s دور ریخته شد", lane.name.lower(), chat_id)
+            future.set_result(None)
+            return future
+
+        self._pending += 1
+        self._push(_Job(chat_id, send, lane, future, next(self._seq)))
+        if self._runner is None or self._runner.done():
+            # اجرای خودکار (مثلاً در اسکریپت‌ها بدون start_outbound)
+            self.start()
+        return future
+
+    def _push(self, job: _Job) -> None:
+        heapq.heappush(self._heap, (job.lane, job.seq, job))
+        self._wakeup.set()
+
+    def _chat(self, chat_id: int) -> _Chat:
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _Chat(chat_id)
+        return chat
+
+    def _next_ready(self, now: float) -> Optional[_Job]:
+        """بیرون آوردن مهم‌ترین کاری که چتش همین الان مجاز به ارسال است"""
+        while self._timers and self._timers[0][0] <= now:
+            _, lane, seq, job = heapq.heappop(self._timers)
+            heapq.heappush(self._heap, (lane, seq, job))
+
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            job = entry[2]
+            chat = self._chat(job.chat_id)
+            if chat.busy:
+                chat.waiting.append(entry)
+                continue
+            ready_at = max(chat.paused_until, now + chat.bucket.delay(now))
+            if ready_at > now:
+                heapq.heappush(self._timers, (ready_at, *entry))
+                continue
+            return job
+        return None
+
+    async def _run(self) -> None:
+        """حلقه اصلی: انتخاب کار آماده، رعایت bucket سراسری و اجرای ارسال در task جدا"""
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            if now - self._last_prune >= PRUNE_INTERVAL:
+                self._prune(now)
+
+            job = self._next_ready(now)
+            if job is None:
+                timeout = self._timers[0][0] - now if self._timers else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            delay = self._global.delay(now)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._semaphore.acquire()
+
+            now = time.monotonic()
+            self._global.take(now)
+            chat = self._chat(job.chat_id)
+            chat.bucket.take(now)
+            chat.busy = True
+            task = asyncio.create_task(self._deliver(job, chat))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _deliver(self, job: _Job, chat: _Chat) -> None:
+        """اجرای یک ارسال و مدیریت خطاهای تلگرام"""
+        job.attempts += 1
+        retry = False
+        try:
+            result = await job.send()
+            self.sent += 1
+            job.future.set_result(result)
+        except RetryAfter as e:
+            retry_after = float(e.retry_after)
+            self.flood_waits += 1
+            chat.paused_until = max(chat.paused_until, time.monotonic() + retry_after)
+            # کاهش سرعت سراسری تا bucket از نو پر شود
+            self._global.tokens = min(self._global.tokens, 0.0)
+            logger.warning("محدودیت flood تلگرام برای چت %s؛ توقف %.0f ثانیه", job.chat_id, retry_after)
+            retry = job.attempts <= OUTBOUND_MAX_RETRIES
+            if not retry:
+                self.failed += 1
+                job.future.set_result(None)
+        except Forbidden as e:
+            # کاربر ربات را مسدود کرده یا از گروه حذف شده
+            self.failed += 1
+            logger.info("ارسال به چت %s مجاز نیست: %s", job.chat_id, e)
+            job.future.set_result(None)
+        except TelegramError as e:
+            self.failed += 1
+            logger.error("خطا در ارسال پیام به چت %s: %s", job.chat_id, e)
+            job.future.set_result(None)
+        except Exception as e:
+            self.failed += 1
+            logger.error("خطای عمومی در ارسال پیام به چت %s: %s", job.chat_id, e)
+            job.future.set_result(None)
+        finally:
+            self._semaphore.release()
+            chat.busy = False
+            if retry:
+                # با همان seq: پیام‌های بعدی این چت پشت آن می‌مانند
+                self._push(job)
+            else:
+                self._pending -= 1
+            # کارهای منتظر این چت دوباره در صف قرار می‌گیرند (ترتیب با seq حفظ می‌شود)
+            for entry in chat.waiting:
+                heapq.heappush(self._heap, entry)
+            chat.waiting.clear()
+            self._wakeup.set()
+
+    def _prune(self, now: float) -> None:
+        """حذف وضعیت چت‌های بیکار تا دیکشنری چت‌ها بی‌نهایت بزرگ نشود"""
+        self._last_prune = now
+        scheduled = {entry[2].chat_id for entry in self._heap} | {entry[3].chat_id for entry in self._timers}
+        for chat_id in [
+            chat_id for chat_id, chat in self._chats.items()
+            if not chat.busy and not chat.waiting and chat_id not in scheduled
+            and chat.paused_until <= now and chat.bucket.is_full(now)
+        ]:
+            del self._chats[chat_id]
+
+    def start(self, bot: Optional[Bot] = None) -> None:
+        if bot is not None:
+            self._bot = bot
+        if self._runner is None or self._runner.done():
+            self._wakeup = asyncio.Event()
+            self._semaphore = asyncio.Semaphore(OUTBOUND_CONCURRENCY)
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = DRAIN_TIMEOUT) -> None:
+        """تخلیه صف (تا timeout ثانیه) و توقف حلقه ارسال"""
+        deadline = time.monotonic() + timeout
+        while self._pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._pending:
+            logger.warning("%s پیام در صف ارسال هنگام خاموش شدن ارسال نشد", self._pending)
+
+    def stats(self) -> dict:
+        """عمق صف به تفکیک مسیر و شمارنده‌های ارسال"""
+        depth = {lane.name.lower(): 0 for lane in Lane}
+        queued = [entry[2] for entry in self._heap] + [entry[3] for entry in self._timers]
+        queued += [entry[2] for chat in self._chats.values() for entry in chat.waiting]
+        for job in queued:
+            depth[job.lane.name.lower()] += 1
+        return {
+            "queue_depth": depth,
+            "in_flight": len(self._tasks),
+            "chats": len(self._chats),
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "flood_waits": self.flood_waits,
+        }
+
+
+# صف ارسال مشترک همه هندلرها
+dispatcher = OutboundDispatcher()
+
+CallbackMetric(
+    "telegram_outbound_queue_depth", "پیام‌های منتظر ارسال", ("lane",),
+    lambda: {(lane,): depth for lane, depth in dispatcher.stats()["queue_depth"].items()},
+)
+CallbackMetric(
+    "telegram_outbound_in_flight", "ارسال‌های در جریان", (), lambda: {(): len(dispatcher._tasks)},
+)
+CallbackMetric(
+    "telegram_outbound_messages_total", "نتیجه ارسال پیام‌ها", ("result",),
+    lambda: {
+        ("sent",): dispatcher.sent, ("failed",): dispatcher.failed,
+        ("dropped",): dispatcher.dropped, ("flood_wait",): dispatcher.flood_waits,
+    },
+    kind="counter",
+)
+
+
+def reply_text(message: Message, text: str, lane: Lane = Lane.INTERACTIVE, **kwargs) -> asyncio.Future:
+    """پاسخ متنی به پیام از طریق صف ارسال (هندلر منتظر تلگرام نمی‌ماند)"""
+    return dispatcher.submit(message.chat_id, lambda: message.reply_text(text, **kwargs), lane)
+
+
+def reply_html(message: Message, text: str, lane: Lane = Lane.INTERACTIVE, **kwargs) -> asyncio.Future:
+    """پاسخ HTML به پیام از طریق صف ارسال"""
+    return dispatcher.submit(message.chat_id, lambda: message.reply_html(text, **kwargs), lane)
+
+
+def edit_text(message: Message, text: str, lane: Lane = Lane.INTERACTIVE, **kwargs) -> asyncio.Future:
+    """
+    ویرایش متن (و دکمه‌های) پیام از طریق صف ارسال؛ ویرایش بدون تغییر
+    (خطای "message is not modified" تلگرام) نادیده گرفته می‌شود.
+    """
+    async def edit():
+        try:
+            return await message.edit_text(text, **kwargs)
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                raise
+            return message
+
+    return dispatcher.submit(message.chat_id, edit, lane)
+
+
+def send_message(chat_id: int, text: str, lane: Lane = Lane.ALERT, **kwargs) -> asyncio.Future:
+    """ارسال پیام مستقل (مثلاً هشدار) با bot برنامه از طریق صف ارسال"""
+    return dispatcher.submit(chat_id, lambda: dispatcher._bot.send_message(chat_id=chat_id, text=text, **kwargs), lane)
+
+
+def get_stats() -> dict:
+    """شمارنده‌های صف ارسال"""
+    return dispatcher.stats()
+
+
+async def start_outbound(application: Application) -> None:
+    """اجرای حلقه ارسال با bot برنامه (در post_init)"""
+    dispatcher.start(application.bot)
+
+
+async def stop_outbound(application: Optional[Application] = None) -> None:
+    """تخلیه و توقف صف ارسال (در post_shutdown)"""
+    await dispatcher.stop()
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+from cache import TTLCache
+from logging_setup import payload
+from metrics import CallbackMetric
+from coingecko_client import get_json
+from rate_limiter import Priority, RateLimited
+from config import PRICE_CACHE_TTL, PRICE_CACHE_MAX_SIZE, PRICE_BATCH_MAX_IDS_LENGTH, REQUEST_BUDGET_MS
+from market_poller import get_market_row, snapshot_time
+from price_stream import get_stream_price
+
+# تنظیم لاگینگ
+logger = logging.getLogger(__name__)
+
+# کش مشترک قیمت‌ها با کلید (coin_id, vs_currency)
+price_cache = TTLCache("price", ttl=PRICE_CACHE_TTL, max_size=PRICE_CACHE_MAX_SIZE)
+
+# قیمت‌هایی که بدون مراجعه به کش از جریان قیمت یا snapshot بازار داده شدند
+# (جدا از شمارنده‌های price_cache تا نرخ hit کش فقط جستجوهای واقعی کش را نشان دهد)
+source_stats = {"stream": 0, "snapshot": 0}
+CallbackMetric(
+    "price_lookups_total", "قیمت‌های داده‌شده پیش از کش به تفکیک منبع", ("source",),
+    lambda: {(source,): count for source, count in source_stats.items()}, kind="counter",
+)
+
+
+def chunk_ids(coin_ids: list[str]) -> list[list[str]]:
+    """تقسیم شناسه‌ها به دسته‌هایی که طول پارامتر ids از سقف URL بیشتر نشود"""
+    chunks, chunk, length = [], [], 0
+    for coin_id in coin_ids:
+        if chunk and length + len(coin_id) + 1 > PRICE_BATCH_MAX_IDS_LENGTH:
+            chunks.append(chunk)
+            chunk, length = [], 0
+        chunk.append(coin_id)
+        length += len(coin_id) + 1
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def _fetcher(vs_currency: str, priority: Priority) -> Callable[[list[tuple[str, str]]], Awaitable[dict]]:
+    """تابع دریافت دسته‌ای /simple/price برای get_many_or_fetch"""
+    async def fetch(keys: list[tuple[str, str]]) -> dict:
+        missing_ids = [coin_id for coin_id, _ in keys]
+        responses = await asyncio.gather(*(
+            get_json(
+                "/simple/price",
+                params={"ids": ",".join(chunk), "vs_currencies": vs_currency},
+                priority=priority,
+            )
+            for chunk in chunk_ids(missing_ids)
+        ))
+        fetched = {}
+        for data in responses:
+            logger.debug("پاسخ API برای %d ارز: %s", len(data), payload(data))
+            for coin_id, quote in data.items():
+                fetched[(coin_id, vs_currency)] = quote.get(vs_currency)
+        return fetched
+    return fetch
+
+
+def _split_snapshot(coin_ids: list[str], vs_currency: str, prices: dict) -> list[str]:
+    """
+    قیمت ارزهای جریان WebSocket یا snapshot تازه را در prices می‌گذارد.
+    خروجی: شناسه‌هایی که باید از کش/API بیایند
+    """
+    remaining = []
+    for coin_id in dict.fromkeys(coin_ids):
+        # تقریب: قیمت جفت USDT صرافی برابر قیمت دلاری گرفته می‌شود (اختلاف معمولاً کمتر از 0.1%؛
+        # در زمان جدا شدن USDT از دلار، PRICE_STREAM=off همه قیمت‌ها را به کوین‌گکو برمی‌گرداند)
+        price = get_stream_price(coin_id) if vs_currency == "usd" else None
+        if price is not None:
+            source_stats["stream"] += 1
+            prices[coin_id] = price
+            continue
+        row = get_market_row(coin_id) if vs_currency == "usd" else None
+        if row is not None:
+            source_stats["snapshot"] += 1
+            prices[coin_id] = row["current_price"]
+        else:
+            remaining.append(coin_id)
+    return remaining
+
+
+async def get_prices(
+    coin_ids: list[str], vs_currency: str = "usd", priority: Priority = Priority.INTERACTIVE
+) -> dict[str, Optional[float]]:
+    """
+    دریافت قیمت تازه چند ارز با یک درخواست /simple/price (یا چند درخواست در صورت طولانی بودن URL).
+    خروجی: دیکشنری شناسه ارز -> قیمت (None برای ارزهای یافت‌نشده)
+    """
+    prices = {}
+    remaining = _split_snapshot(coin_ids, vs_currency, prices)
+    if remaining:
+        cached = await price_cache.get_many_or_fetch(
+            [(coin_id, vs_currency) for coin_id in remaining], _fetcher(vs_currency, priority)
+        )
+        for (coin_id, _), price in cached.items():
+            prices[coin_id] = price
+    return prices
+
+
+async def get_quotes(coin_ids: list[str], vs_currency: str = "usd") -> tuple[dict[str, Optional[float]], Optional[float]]:
+    """
+    قیمت چند ارز برای پاسخ به کاربر در بودجه زمانی REQUEST_BUDGET_MS (stale-while-revalidate).
+    اگه کوین‌گکو در دسترس نباشد، آخرین snapshot بازار (حتی قدیمی) استفاده می‌شود.
+    خروجی: (دیکشنری شناسه ارز -> قیمت، زمان قدیمی‌ترین داده قدیمی به epoch یا None اگه همه تازه‌اند)
+    """
+    prices = {}
+    remaining = _split_snapshot(coin_ids, vs_currency, prices)
+    if not remaining:
+        return prices, None
+
+    try:
+        cached, as_of = await price_cache.get_many_swr(
+            [(coin_id, vs_currency) for coin_id in remaining],
+            _fetcher(vs_currency, Priority.INTERACTIVE),
+            REQUEST_BUDGET_MS / 1000,
+        )
+    except (RateLimited, httpx.HTTPError):
+        # حالت آفلاین: آخرین snapshot بازار، اگه همه ارزها در آن باشند
+        rows = {coin_id: get_market_row(coin_id, allow_stale=True) for coin_id in remaining}
+        if vs_currency != "usd" or any(row is None for row in rows.values()):
+            raise
+        prices.update({coin_id: row["current_price"] for coin_id, row in rows.items()})
+        return prices, snapshot_time()
+
+    for (coin_id, _), price in cached.items():
+        prices[coin_id] = price
+    return prices, as_of
+
+
+def get_stats() -> dict:
+    """شمارنده‌های کش قیمت به‌علاوه قیمت‌های داده‌شده از جریان و snapshot"""
+    return {**price_cache.stats(), "stream_hits": source_stats["stream"], "snapshot_hits": source_stats["snapshot"]}
@@ -0,0 +1,338 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import random
+import ssl
+import struct
+import time
+from typing import Iterator, Optional
+from urllib.parse import urlparse
+
+from telegram.ext import Application
+
+from metrics import CallbackMetric
+from config import (
+    PRICE_STREAM, PRICE_STREAM_URL, PRICE_STREAM_PAIRS, PRICE_STREAM_MAX_AGE,
+    PRICE_STREAM_IDLE_TIMEOUT, PRICE_STREAM_MAX_BACKOFF,
+)
+
+# تنظیم لاگینگ
+logger = logging.getLogger(__name__)
+
+# ثابت handshake در RFC 6455
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+# opcodeهای فریم
+OP_CONTINUATION, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+# سقف اندازه یک پیام (بایت)؛ پیام بزرگ‌تر یعنی جریان خراب یا نامرتبط
+MAX_MESSAGE_SIZE = 4 * 1024 * 1024
+
+# جدول آخرین قیمت‌ها: شناسه ارز -> (آخرین قیمت جفت USDT، زمان دریافت به epoch).
+# فقط task جریان در آن می‌نویسد و هر مدخل با یک tuple تازه جایگزین می‌شود؛ پس خواندن
+# از هندلرها بدون قفل است و هیچ‌وقت قیمت و زمان ناهم‌خوان نمی‌بیند.
+_prices: dict[str, tuple[float, float]] = {}
+
+
+class WebSocketClient:
+    """
+    کلاینت حداقلی WebSocket (RFC 6455) روی یک اتصال asyncio.
+    فقط آنچه برای دریافت جریان قیمت لازم است: handshake، دریافت فریم‌ها (با سرهم کردن
+    پیام‌های چندتکه)، پاسخ به ping و ارسال پیام متنی کوتاه.
+    """
+
+    def __init__(self, url: str):
+        parsed = urlparse(url)
+        self.secure = parsed.scheme == "wss"
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or (443 if self.secure else 80)
+        self.target = (parsed.path or "/") + (f"?{parsed.query}" if parsed.query else "")
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def connect(self) -> None:
+        """اتصال و handshake؛ خطاها: ConnectionError اگه سرور ارتقا به WebSocket را نپذیرد"""
+        self._reader, self._writer = await asyncio.open_connection(
+            self.host, self.port,
+            ssl=ssl.create_default_context() if self.secure else None,
+            server_hostname=self.host if self.secure else None,
+        )
+        key = base64.b64encode(os.urandom(16)).decode()
+        self._writer.write((
+            f"GET {self.target} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n\r\n"
+        ).encode())
+        await self._writer.drain()
+
+        status = await self._reader.readline()
+        headers = {}
+        while (line := await self._reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if status.split(b" ", 2)[1:2] != [b"101"]:
+            raise ConnectionError(f"ارتقا به WebSocket پذیرفته نشد: {status.decode('latin-1').strip()}")
+        expected = base64.b64encode(hashlib.sha1((key + _WS_GUID).encode()).digest()).decode()
+        if headers.get("sec-websocket-accept") != expected:
+            raise ConnectionError("پاسخ handshake WebSocket نامعتبر است")
+
+    async def _read_frame(self) -> tuple[bool, int, bytes]:
+        """(fin، opcode، payload) یک فریم"""
+        first, second = await self._reader.readexactly(2)
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", await self._reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", await self._reader.readexactly(8))[0]
+        if length > MAX_MESSAGE_SIZE:
+            raise ConnectionError(f"فریم WebSocket بیش از حد بزرگ است: {length} بایت")
+        mask = await self._reader.readexactly(4) if second & 0x80 else None
+        payload = await self._reader.readexactly(length)
+        if mask:
+            payload = self._mask(payload, mask)
+        return bool(first & 0x80), first & 0x0F, payload
+
+    @staticmethod
+    def _mask(payload: bytes, mask: bytes) -> bytes:
+        # XOR کل payload در یک عدد بزرگ (سریع‌تر از حلقه روی بایت‌ها)
+        repeated = (mask * (len(payload) // 4 + 1))[:len(payload)]
+        return (int.from_bytes(payload, "big") ^ int.from_bytes(repeated, "big")).to_bytes(len(payload), "big")
+
+    async def _send_frame(self, opcode: int, payload: bytes = b"") -> None:
+        # فریم‌های کلاینت همیشه mask دارند
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, 0x80 | length)
+        elif length < 1 << 16:
+            header = struct.pack("!BBH", 0x80 | opcode, 0x80 | 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 0x80 | 127, length)
+        mask = os.urandom(4)
+        self._writer.write(header + mask + self._mask(payload, mask))
+        await self._writer.drain()
+
+    async def send(self, text: str) -> None:
+        await self._send_frame(OP_TEXT, text.encode())
+
+    async def recv(self) -> str:
+        """
+        پیام بعدی (فریم‌های چندتکه سرهم می‌شوند و ping در همین‌جا پاسخ داده می‌شود).
+        خطاها: ConnectionError با بسته شدن اتصال از طرف سرور
+        """
+        parts: list[bytes] = []
+        size = 0
+        while True:
+            fin, opcode, payload = await self._read_frame()
+            if opcode == OP_PING:
+                await self._send_frame(OP_PONG, payload)
+                continue
+            if opcode == OP_PONG:
+                continue
+            if opcode == OP_CLOSE:
+                code = struct.unpack("!H", payload[:2])[0] if len(payload) >= 2 else 1005
+                raise ConnectionError(f"اتصال WebSocket توسط سرور بسته شد (کد {code})")
+            size += len(payload)
+            if size > MAX_MESSAGE_SIZE:
+                raise ConnectionError("پیام WebSocket بیش از حد بزرگ است")
+            parts.append(payload)
+            if fin:
+                return b"".join(parts).decode()
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            try:
+                await self._send_frame(OP_CLOSE, struct.pack("!H", 1000))
+            except (OSError, RuntimeError):
+                pass
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except (OSError, ssl.SSLError):
+                pass
+            self._writer = None
+            self._reader = None
+
+
+class StreamSource:
+    """
+    منبع جریان قیمت: آدرس اتصال، پیام‌های اشتراک پس از اتصال و تبدیل هر پیام به قیمت‌ها.
+    pairs: شناسه کوین‌گکو -> نماد جفت ارز در صرافی
+    """
+
+    name = "base"
+
+    def __init__(self, url: str, pairs: dict[str, str]):
+        self.url = url
+        self.pairs = pairs
+        self.coins = {pair: coin_id for coin_id, pair in pairs.items()}
+
+    def connect_url(self) -> str:
+        return self.url
+
+    def subscribe_messages(self) -> list[str]:
+        return []
+
+    def parse(self, message: str) -> Iterator[tuple[str, float]]:
+        """(شناسه ارز، قیمت جفت ارز در PRICE_STREAM_PAIRS، مثلاً به USDT) برای هر قیمت داخل پیام"""
+        raise NotImplementedError
+
+
+class BinanceSource(StreamSource):
+    """جریان miniTicker بایننس (combined stream)؛ هر جفت حدوداً یک پیام در ثانیه"""
+
+    name = "binance"
+
+    def connect_url(self) -> str:
+        streams = "/".join(f"{pair.lower()}@miniTicker" for pair in self.pairs.values())
+        return f"{self.url}?streams={streams}"
+
+    def parse(self, message: str) -> Iterator[tuple[str, float]]:
+        data = json.loads(message)
+        tickers = data.get("data", data) if isinstance(data, dict) else data
+        for ticker in tickers if isinstance(tickers, list) else (tickers,):
+            coin_id = self.coins.get(ticker.get("s"))
+            if coin_id is not None and ticker.get("c") is not None:
+                yield coin_id, float(ticker["c"])
+
+
+# منابع قابل انتخاب با PRICE_STREAM
+SOURCES = {BinanceSource.name: BinanceSource}
+
+
+class PriceStream:
+    """
+    نگهداری اتصال دائمی به منبع جریان و به‌روزرسانی جدول آخرین قیمت‌ها.
+    با قطع اتصال یا سکوت بیش از PRICE_STREAM_IDLE_TIMEOUT ثانیه، اتصال دوباره با تأخیر
+    نمایی (تا PRICE_STREAM_MAX_BACKOFF، با jitter) برقرار می‌شود؛ تأخیر پس از اتصالی که
+    حداقل یک قیمت داده باشد به حالت اول برمی‌گردد.
+    """
+
+    def __init__(self, source: StreamSource):
+        self.source = source
+        self._task: Optional[asyncio.Task] = None
+        self._failures = 0
+        # شمارنده‌ها
+        self.connected = False
+        self.connects = 0
+        self.messages = 0
+        self.errors = 0
+
+    def _next_delay(self) -> float:
+        delay = min(PRICE_STREAM_MAX_BACKOFF, 2 ** self._failures)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _consume(self) -> None:
+        client = WebSocketClient(self.source.connect_url())
+        try:
+            await asyncio.wait_for(client.connect(), PRICE_STREAM_IDLE_TIMEOUT)
+            for message in self.source.subscribe_messages():
+                await client.send(message)
+            self.connected = True
+            self.connects += 1
+            logger.info("اتصال جریان قیمت %s برقرار شد (%s ارز)", self.source.name, len(self.source.pairs))
+            while True:
+                message = await asyncio.wait_for(client.recv(), PRICE_STREAM_IDLE_TIMEOUT)
+                self.messages += 1
+                now = time.time()
+                try:
+                    for coin_id, price in self.source.parse(message):
+                        _prices[coin_id] = (price, now)
+                        self._failures = 0
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    self.errors += 1
+                    logger.debug("پیام نامعتبر از جریان قیمت: %s", e)
+        finally:
+            self.connected = False
+            await client.close()
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self._consume()
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError:
+                logger.warning("جریان قیمت %s پاسخی نداد؛ اتصال دوباره", self.source.name)
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, UnicodeDecodeError) as e:
+                logger.warning("قطع جریان قیمت %s: %s", self.source.name, e)
+            except Exception as e:
+                logger.error("خطای عمومی در جریان قیمت %s: %s", self.source.name, e)
+            delay = self._next_delay()
+            self._failures += 1
+            await asyncio.sleep(delay)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(), name="price_stream")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "source": self.source.name,
+            "connected": self.connected,
+            "connects": self.connects,
+            "messages": self.messages,
+            "errors": self.errors,
+            "fresh": sum(1 for coin_id in _prices if get_stream_price(coin_id) is not None),
+        }
+
+
+# جریان فعال (None اگه PRICE_STREAM=off یا منبع ناشناخته باشد)
+_stream: Optional[PriceStream] = None
+
+
+def get_stream_price(coin_id: str) -> Optional[float]:
+    """
+    آخرین قیمت USDT ارز از جریان (نه دلار)، اگه در PRICE_STREAM_MAX_AGE ثانیه اخیر رسیده باشد.
+    تبدیل به دلار بر عهده فراخواننده است (price_cache آن را برابر دلار در نظر می‌گیرد).
+    """
+    entry = _prices.get(coin_id)
+    if entry is None or time.time() - entry[1] > PRICE_STREAM_MAX_AGE:
+        return None
+    return entry[0]
+
+
+def get_stats() -> Optional[dict]:
+    """شمارنده‌های جریان قیمت (None اگه غیرفعال باشد)"""
+    return _stream.stats() if _stream is not None else None
+
+
+CallbackMetric(
+    "price_stream_messages_total", "پیام‌های دریافتی از جریان قیمت", (),
+    lambda: {(): _stream.messages if _stream else 0}, kind="counter",
+)
+CallbackMetric(
+    "price_stream_connected", "وضعیت اتصال جریان قیمت (1 یعنی متصل)", (),
+    lambda: {(): int(bool(_stream and _stream.connected))},
+)
+
+
+async def start_price_stream(application: Optional[Application] = None) -> None:
+    """شروع اتصال جریان قیمت در پس‌زمینه (در post_init)"""
+    global _stream
+    if PRICE_STREAM == "off" or not PRICE_STREAM_PAIRS:
+        return
+    source = SOURCES.get(PRICE_STREAM)
+    if source is None:
+        logger.warning("منبع جریان قیمت ناشناخته: %s؛ فقط کوین‌گکو استفاده می‌شود", PRICE_STREAM)
+        return
+    _stream = PriceStream(source(PRICE_STREAM_URL, PRICE_STREAM_PAIRS))
+    _stream.start()
+
+
+async def close_price_stream(application: Optional[Application] = None) -> None:
+    """بستن اتصال جریان قیمت (در post_shutdown)"""
+    if _stream is not None:
+        await _stream.stop()
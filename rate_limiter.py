@@ -0,0 +1,183 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from enum import IntEnum
+from typing import Optional
+
+from metrics import CallbackMetric
+from config import (
+    COINGECKO_RATE_PER_MINUTE, COINGECKO_BURST,
+    RATE_MAX_WAIT_INTERACTIVE, RATE_MAX_WAIT_BACKGROUND, RATE_MAX_WAIT_BACKFILL,
+)
+
+# تنظیم لاگینگ
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """کلاس‌های اولویت درخواست (عدد کمتر = اولویت بیشتر)"""
+    INTERACTIVE = 0  # درخواست مستقیم کاربر (/price، /info، ...)
+    BACKGROUND = 1   # به‌روزرسانی‌های پس‌زمینه (poller، ایندکس نمادها)
+    BACKFILL = 2     # تکمیل سری‌های زمانی نمودار
+
+
+class RateLimited(Exception):
+    """درخواست در بودجه نرخ جا نمی‌شود (یا کوین‌گکو 429 برگردانده)"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"rate limited, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class TokenBucketScheduler:
+    """
+    زمان‌بند سراسری token bucket با صف اولویت‌دار.
+    درخواست‌هایی که بیش از حداکثر انتظار کلاس خود در صف بمانند، فوراً RateLimited می‌گیرند
+    تا لایه بالاتر (مثلاً کش) داده قدیمی برگرداند.
+    """
+
+    def __init__(self, rate: float, burst: int, max_wait: dict[Priority, float]):
+        self.rate = rate  # توکن در ثانیه
+        self.burst = burst
+        self.max_wait = max_wait
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._queue: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        # شمارنده‌ها
+        self.granted = 0
+        self.rejected = 0
+        self.throttled = 0  # تعداد پاسخ‌های 429
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _estimated_wait(self, priority: Priority) -> float:
+        """تخمین زمان انتظار درخواست جدید با توجه به درخواست‌های هم‌اولویت یا مهم‌تر در صف"""
+        ahead = sum(1 for p, _, future in self._queue if p <= priority and not future.done())
+        deficit = ahead + 1 - self._tokens
+        wait = max(0.0, deficit / self.rate)
+        return wait + max(0.0, self._paused_until - time.monotonic())
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE) -> None:
+        """گرفتن یک توکن؛ در صورت نیاز در صف اولویت منتظر می‌ماند"""
+        self._refill()
+        if not self._queue and self._tokens >= 1 and time.monotonic() >= self._paused_until:
+            self._tokens -= 1
+            self.granted += 1
+            return
+
+        wait = self._estimated_wait(priority)
+        if wait > self.max_wait[priority]:
+            self.rejected += 1
+            raise RateLimited(wait)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+        started = time.monotonic()
+        await future
+        waited = time.monotonic() - started
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+
+    async def _dispatch(self) -> None:
+        """آزاد کردن درخواست‌های صف به ترتیب اولویت با نرخ مجاز"""
+        while self._queue:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+            _, _, future = heapq.heappop(self._queue)
+            if future.done():  # درخواست لغو شده
+                continue
+            self._tokens -= 1
+            self.granted += 1
+            future.set_result(None)
+
+    def pause(self, retry_after: float) -> None:
+        """توقف همه درخواست‌ها تا retry_after ثانیه (پاسخ 429 با Retry-After)"""
+        self.throttled += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        self._tokens = 0.0
+        logger.warning("محدودیت نرخ کوین‌گکو؛ توقف درخواست‌ها به مدت %.0f ثانیه", retry_after)
+
+    def retry_after(self) -> float:
+        """ثانیه‌های باقی‌مانده از توقف فعلی"""
+        return max(0.0, self._paused_until - time.monotonic())
+
+    def stats(self) -> dict:
+        """عمق صف به تفکیک اولویت و آمار زمان انتظار"""
+        depth = {priority.name.lower(): 0 for priority in Priority}
+        for priority, _, future in self._queue:
+            if not future.done():
+                depth[Priority(priority).name.lower()] += 1
+        waited = max(self.granted, 1)
+        return {
+            "queue_depth": depth,
+            "granted": self.granted,
+            "rejected": self.rejected,
+            "throttled": self.throttled,
+            "wait_avg": self.wait_total / waited,
+            "wait_max": self.wait_max,
+            "tokens": self._tokens,
+        }
+
+
+# زمان‌بند مشترک همه درخواست‌های کوین‌گکو
+scheduler = TokenBucketScheduler(
+    rate=COINGECKO_RATE_PER_MINUTE / 60.0,
+    burst=COINGECKO_BURST,
+    max_wait={
+        Priority.INTERACTIVE: RATE_MAX_WAIT_INTERACTIVE,
+        Priority.BACKGROUND: RATE_MAX_WAIT_BACKGROUND,
+        Priority.BACKFILL: RATE_MAX_WAIT_BACKFILL,
+    },
+)
+
+CallbackMetric(
+    "coingecko_scheduler_queue_depth", "درخواست‌های منتظر نوبت نرخ", ("priority",),
+    lambda: {(priority,): depth for priority, depth in scheduler.stats()["queue_depth"].items()},
+)
+CallbackMetric(
+    "coingecko_scheduler_requests_total", "تصمیم‌های زمان‌بند نرخ", ("result",),
+    lambda: {("granted",): scheduler.granted, ("rejected",): scheduler.rejected, ("throttled",): scheduler.throttled},
+    kind="counter",
+)
+CallbackMetric(
+    "coingecko_scheduler_wait_seconds_total", "مجموع زمان انتظار در صف نرخ", (),
+    lambda: {(): scheduler.wait_total}, kind="counter",
+)
+
+
+def rate_limited_message(error: RateLimited) -> str:
+    """پیام کاربر هنگام محدودیت نرخ (به‌جای خطای عمومی سرور)"""
+    return f"سرور داده شلوغ است. لطفاً حدود {max(1, round(error.retry_after))} ثانیه دیگر دوباره امتحان کنید."
+
+
+def parse_retry_after(value: Optional[str], default: float) -> float:
+    """خواندن هدر Retry-After (ثانیه یا تاریخ HTTP)"""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        from email.utils import parsedate_to_datetime
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return default
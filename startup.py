@@ -0,0 +1,173 @@
+import importlib
+import importlib.abc
+import importlib.util
+import logging
+import os
+import sys
+import time
+from types import ModuleType
+from typing import Optional
+
+# این ماژول پیش از بقیه import‌های crypto_bot بارگذاری می‌شود تا زمان import‌ها را بسنجد
+_process_started = time.perf_counter()
+# زمان import هر بسته سطح بالا (فقط با STARTUP_PROFILE_IMPORTS)
+_import_times: dict[str, float] = {}
+_marks: list[tuple[str, float]] = []
+
+# تنظیم لاگینگ
+logger = logging.getLogger(__name__)
+
+# وابستگی‌های سنگینی که نباید در شروع پردازه اصلی بارگذاری شوند
+HEAVY_MODULES = ("matplotlib", "numpy", "requests")
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    import تنبل یک ماژول: شیء ماژول فوراً برگردانده می‌شود و اجرای واقعی آن
+    به اولین دسترسی به یک attribute موکول می‌شود (importlib.util.LazyLoader).
+    همه محل‌های import آن ماژول در پردازه اصلی باید از همین تابع استفاده کنند؛
+    یک import عادی بارگذاری را فوراً انجام می‌دهد.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def ensure_loaded(name: str) -> ModuleType:
+    """
+    اجرای فوری ماژول تنبل در thread فعلی. LazyLoader (تا پایتون 3.12) thread-safe نیست،
+    پس بارگذاری باید در thread حلقه رویداد انجام شود، پیش از اینکه کدی در thread دیگر
+    (executorها) به ماژول دسترسی پیدا کند.
+    """
+    module = lazy_import(name)
+    module.__name__  # هر دسترسی به attribute اجرای ماژول را کامل می‌کند
+    return module
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """loader واسط که زمان اجرای اولین import هر بسته سطح بالا را ثبت می‌کند"""
+
+    _active: set[str] = set()
+
+    def __init__(self, loader: importlib.abc.Loader, name: str):
+        self._loader = loader
+        self._name = name
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module: ModuleType) -> None:
+        root = self._name.partition(".")[0]
+        if root in self._active:
+            return self._loader.exec_module(module)
+        self._active.add(root)
+        started = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._active.discard(root)
+            _import_times[root] = _import_times.get(root, 0.0) + time.perf_counter() - started
+
+    def __getattr__(self, name: str):
+        return getattr(self._loader, name)
+
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    """finder که فقط loader بقیه finderها را با _TimedLoader می‌پوشاند"""
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, fullname)
+                return spec
+        return None
+
+
+# از محیط خوانده می‌شود (نه config) چون باید پیش از import‌های دیگر فعال شود
+if os.getenv("STARTUP_PROFILE_IMPORTS", "false").lower() in ("1", "true", "yes"):
+    sys.meta_path.insert(0, _ImportTimer())
+
+
+def mark(name: str) -> None:
+    """ثبت یک مرحله شروع برنامه (مثل پایان import‌ها یا post_init)"""
+    _marks.append((name, time.perf_counter() - _process_started))
+
+
+def _rss_mb() -> tuple[Optional[float], Optional[float]]:
+    """(RSS فعلی، بیشینه RSS) پردازه به مگابایت"""
+    current = None
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    current = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        peak = None
+    return current, peak
+
+
+def startup_report() -> dict:
+    """
+    گزارش شروع برنامه برای پیگیری پسرفت‌ها.
+    خروجی: دیکشنری با مراحل (ثانیه از شروع پردازه)، RSS، وابستگی‌های سنگین بارگذاری‌شده
+    و (با STARTUP_PROFILE_IMPORTS) زمان import هر بسته
+    """
+    current, peak = _rss_mb()
+    # ماژول تنبلی که هنوز اجرا نشده از نوع ModuleType نیست (دسترسی به attribute آن را بارگذاری می‌کند)
+    loaded = [name for name in HEAVY_MODULES if type(sys.modules.get(name)) is ModuleType]
+    return {
+        "marks": dict(_marks),
+        "rss_mb": current,
+        "peak_rss_mb": peak,
+        "heavy_loaded": loaded,
+        "imports": dict(sorted(_import_times.items(), key=lambda item: -item[1])),
+    }
+
+
+def log_startup_report(stage: str) -> None:
+    report = startup_report()
+    marks = " ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in report["marks"].items())
+    logger.info(
+        "گزارش شروع (%s): %s | RSS=%.1fMB بیشینه=%.1fMB | وابستگی سنگین بارگذاری‌شده: %s",
+        stage, marks, report["rss_mb"] or 0, report["peak_rss_mb"] or 0, ", ".join(report["heavy_loaded"]) or "-",
+    )
+    if report["imports"]:
+        logger.info(
+            "زمان import بسته‌ها: %s",
+            ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in list(report["imports"].items())[:12]),
+        )
+
+
+async def warm_up(context=None) -> None:
+    """
+    گرم کردن پس از فعال شدن polling/webhook (job یک‌باره): ساخت pool رسم (matplotlib
+    فقط در workerها) و بارگذاری numpy در thread حلقه رویداد، سپس گزارش شروع.
+    """
+    from chart_render import start_render_pool
+
+    started = time.perf_counter()
+    try:
+        await start_render_pool()
+        ensure_loaded("numpy")
+    except Exception as e:
+        logger.warning("warm-up ناقص ماند: %s", e)
+    mark("warm_up")
+    logger.info("warm-up در %.0fms انجام شد", (time.perf_counter() - started) * 1000)
+    log_startup_report("پس از warm-up")
@@ -0,0 +1,252 @@
+import asyncio
+import bisect
+import json
+import logging
+import os
+import time
+from typing import Iterable, Optional
+
+import httpx
+from telegram.ext import Application, ContextTypes
+
+from cache import TTLCache, is_shared
+from coingecko_client import get_json
+from rate_limiter import Priority, RateLimited
+from config import SYMBOL_INDEX_PATH, SYMBOL_INDEX_REFRESH
+
+# تنظیم لاگینگ
+logger = logging.getLogger(__name__)
+
+# نگاشت ثابت نمادهای پرکاربرد (بر نتایج ایندکس اولویت دارد)
+SYMBOL_TO_ID = {
+    "btc": "bitcoin",
+    "eth": "ethereum",
+    "usdt": "tether",
+    "bnb": "binancecoin",
+    "sol": "solana",
+    "xrp": "ripple",
+    "usdc": "usd-coin",
+    "ada": "cardano",
+    "avax": "avalanche-2",
+    "doge": "dogecoin",
+}
+
+# حداکثر فاصله ویرایشی برای جستجوی تقریبی
+MAX_EDIT_DISTANCE = 1
+
+
+def _deletes(term: str) -> set[str]:
+    """همه رشته‌های حاصل از حذف یک حرف (برای ایندکس symmetric-delete)"""
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _edit_distance(a: str, b: str) -> int:
+    """فاصله Damerau-Levenshtein (نسخه جابجایی مجاور)"""
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        prev2, prev = prev, cur
+    return prev[len(b)]
+
+
+class SymbolIndex:
+    """
+    ایندکس‌های درون‌حافظه‌ای روی /coins/list برای تبدیل نماد/نام/شناسه به شناسه ارز
+    بدون نیاز به درخواست شبکه.
+    """
+
+    def __init__(self, coins: Iterable[dict]):
+        self.by_id: dict[str, dict] = {}
+        self.by_symbol: dict[str, list[str]] = {}
+        self.by_name: dict[str, list[str]] = {}
+        for coin in coins:
+            coin_id = coin["id"].lower()
+            self.by_id[coin_id] = coin
+            self.by_symbol.setdefault(coin["symbol"].lower(), []).append(coin_id)
+            self.by_name.setdefault(coin["name"].lower(), []).append(coin_id)
+
+        # کلیدهای مرتب برای جستجوی پیشوندی با bisect
+        self.sorted_terms = sorted(set(self.by_symbol) | set(self.by_id) | set(self.by_name))
+
+        # ایندکس symmetric-delete برای جستجوی تقریبی روی نماد و شناسه
+        self.deletes: dict[str, list[str]] = {}
+        for term in set(self.by_symbol) | set(self.by_id):
+            for deleted in _deletes(term):
+                self.deletes.setdefault(deleted, []).append(term)
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def ids_for_term(self, term: str) -> list[str]:
+        """شناسه‌های متناظر با یک کلید (شناسه، نماد یا نام)"""
+        ids = []
+        if term in self.by_id:
+            ids.append(term)
+        ids += self.by_symbol.get(term, [])
+        ids += self.by_name.get(term, [])
+        return list(dict.fromkeys(ids))
+
+    def prefix(self, query: str, limit: int) -> list[str]:
+        """کلیدهایی که با query شروع می‌شوند (حداکثر limit تا)"""
+        start = bisect.bisect_left(self.sorted_terms, query)
+        terms = []
+        for term in self.sorted_terms[start:]:
+            if not term.startswith(query) or len(terms) >= limit:
+                break
+            terms.append(term)
+        return terms
+
+    def fuzzy(self, query: str) -> list[str]:
+        """کلیدهایی با فاصله ویرایشی حداکثر MAX_EDIT_DISTANCE از query"""
+        candidates = set(self.deletes.get(query, []))
+        for deleted in _deletes(query) | {query}:
+            if deleted in self.by_symbol or deleted in self.by_id:
+                candidates.add(deleted)
+            candidates.update(self.deletes.get(deleted, []))
+        return [term for term in candidates if _edit_distance(query, term) <= MAX_EDIT_DISTANCE]
+
+
+# ایندکس فعلی (با هر بارگذاری به‌صورت اتمیک جایگزین می‌شود) و رتبه ارزش بازار
+_index: Optional[SymbolIndex] = None
+# لیست ارزها بین workerها (فقط با پشتوانه مشترک؛ در حالت memory هر پردازه خودش روزانه می‌گیرد)
+_coins_cache: Optional[TTLCache] = TTLCache("coins_list", ttl=SYMBOL_INDEX_REFRESH * 0.9, max_size=1) if is_shared() else None
+_market_cap_rank: dict[str, int] = {}
+
+
+def update_market_cap_ranks(rows: Iterable[dict]) -> None:
+    """ثبت رتبه ارزش بازار از ردیف‌های /coins/markets (برای رتبه‌بندی نمادهای مبهم)"""
+    for row in rows:
+        if row.get("market_cap_rank"):
+            _market_cap_rank[row["id"]] = row["market_cap_rank"]
+
+
+def _rank(coin_ids: Iterable[str]) -> list[str]:
+    """مرتب‌سازی شناسه‌ها بر اساس رتبه ارزش بازار (ارزهای بدون رتبه در انتها)"""
+    return sorted(coin_ids, key=lambda coin_id: _market_cap_rank.get(coin_id, float("inf")))
+
+
+def is_loaded() -> bool:
+    """آیا ایندکس کامل بارگذاری شده است؟"""
+    return _index is not None
+
+
+def resolve_symbol(symbol: str) -> Optional[str]:
+    """
+    تبدیل نماد، شناسه یا نام ارز به شناسه کوین‌گکو (بدون درخواست شبکه).
+    خروجی: شناسه ارز؛ None اگه ایندکس بارگذاری شده و ارز وجود ندارد.
+    تا زمان بارگذاری ایندکس، ورودی بدون تغییر برگردانده می‌شود (رفتار قبلی).
+    """
+    symbol = symbol.strip().lower()
+    if symbol in SYMBOL_TO_ID:
+        return SYMBOL_TO_ID[symbol]
+    if _index is None:
+        return symbol
+    # شناسه دقیق در ابتدای لیست است و در رتبه برابر اولویت دارد
+    ids = _index.ids_for_term(symbol)
+    return _rank(ids)[0] if ids else None
+
+
+def symbol_for_id(coin_id: str) -> str:
+    """نماد ارز برای یک شناسه (در صورت نبود در ایندکس، خود شناسه)"""
+    for symbol, pinned_id in SYMBOL_TO_ID.items():
+        if pinned_id == coin_id:
+            return symbol
+    if _index is not None and coin_id in _index.by_id:
+        return _index.by_id[coin_id]["symbol"].lower()
+    return coin_id
+
+
+def suggest_symbols(query: str, limit: int = 5) -> list[str]:
+    """پیشنهاد نماد برای ورودی نادرست: ابتدا تطبیق پیشوندی، سپس تقریبی"""
+    if _index is None:
+        return []
+    query = query.strip().lower()
+    terms = _index.prefix(query, limit * 4) if query else []
+    terms += _index.fuzzy(query)
+    coin_ids = _rank({coin_id for term in terms for coin_id in _index.ids_for_term(term)})
+    symbols = dict.fromkeys(_index.by_id[coin_id]["symbol"].lower() for coin_id in coin_ids)
+    return list(symbols)[:limit]
+
+
+def not_found_message(symbol: str) -> str:
+    """پیام «ارز یافت نشد» همراه با پیشنهاد نمادهای نزدیک"""
+    message = "ارز یافت نشد! نماد را بررسی کنید. مثال: btc، eth، bitcoin"
+    suggestions = suggest_symbols(symbol)
+    if suggestions:
+        message += "\nمنظورتان یکی از این‌ها بود؟ " + "، ".join(s.upper() for s in suggestions)
+    return message
+
+
+def _read_snapshot() -> Optional[tuple[float, list[dict]]]:
+    """خواندن snapshot ذخیره‌شده /coins/list از دیسک"""
+    try:
+        with open(SYMBOL_INDEX_PATH, encoding="utf-8") as f:
+            snapshot = json.load(f)
+        return snapshot["fetched_at"], snapshot["coins"]
+    except FileNotFoundError:
+        return None
+    except (ValueError, KeyError) as e:
+        logger.warning("snapshot نمادها قابل خواندن نیست: %s", e)
+        return None
+
+
+def _write_snapshot(coins: list[dict]) -> None:
+    """ذخیره /coins/list روی دیسک (نوشتن اتمیک با فایل موقت)"""
+    os.makedirs(os.path.dirname(SYMBOL_INDEX_PATH) or ".", exist_ok=True)
+    tmp_path = f"{SYMBOL_INDEX_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"fetched_at": time.time(), "coins": coins}, f, ensure_ascii=False)
+    os.replace(tmp_path, SYMBOL_INDEX_PATH)
+
+
+async def refresh_symbol_index(context: Optional[ContextTypes.DEFAULT_TYPE] = None) -> None:
+    """دریافت /coins/list از کوین‌گکو، ساخت ایندکس و ذخیره snapshot"""
+    global _index
+    try:
+        async def fetch() -> list[dict]:
+            return await get_json("/coins/list", priority=Priority.BACKGROUND)
+
+        if _coins_cache is None:
+            coins = await fetch()
+        else:
+            # با کش مشترک فقط یکی از workerها لیست را از کوین‌گکو می‌گیرد
+            coins = await _coins_cache.get_or_fetch("all", fetch, serve_stale=False)
+        _index = await asyncio.to_thread(SymbolIndex, coins)
+        await asyncio.to_thread(_write_snapshot, coins)
+        logger.info("ایندکس نمادها به‌روز شد: %s ارز", len(_index))
+    except RateLimited as rate_err:
+        logger.warning("محدودیت نرخ در دریافت لیست ارزها: %s", rate_err)
+    except httpx.HTTPStatusError as http_err:
+        logger.warning("خطای HTTP در دریافت لیست ارزها: %s", http_err)
+    except httpx.RequestError as req_err:
+        logger.warning("خطای شبکه در دریافت لیست ارزها: %s", req_err)
+    except Exception as e:
+        logger.error("خطای عمومی در به‌روزرسانی ایندکس نمادها: %s", e)
+
+
+async def start_symbol_index(application: Application) -> None:
+    """
+    بارگذاری ایندکس از snapshot دیسک (برای شروع سریع) و زمان‌بندی به‌روزرسانی
+    از کوین‌گکو در پس‌زمینه.
+    """
+    global _index
+    snapshot = await asyncio.to_thread(_read_snapshot)
+    age = None
+    if snapshot is not None:
+        fetched_at, coins = snapshot
+        _index = await asyncio.to_thread(SymbolIndex, coins)
+        age = time.time() - fetched_at
+        logger.info("ایندکس نمادها از دیسک بارگذاری شد: %s ارز", len(_index))
+
+    if application.job_queue is None:
+        return
+    # اگه snapshot قدیمی یا ناموجود است، فوراً به‌روزرسانی شود
+    first = 0 if age is None or age >= SYMBOL_INDEX_REFRESH else SYMBOL_INDEX_REFRESH - age
+    application.job_queue.run_repeating(
+        refresh_symbol_index, interval=SYMBOL_INDEX_REFRESH, first=first, name="symbol_index"
+    )
@@ -0,0 +1,304 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import itertools
+import logging
+import math
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import httpx
+from telegram.ext import Application, ContextTypes
+
+from chart_series import parse_market_chart
+from coingecko_client import get_json
+from rate_limiter import Priority, RateLimited
+from startup import lazy_import, ensure_loaded
+from config import TIMESERIES_DB_PATH, TIMESERIES_MIN_REFRESH, TIMESERIES_COMPACT_INTERVAL
+
+# تنظیم لاگینگ
+logger = logging.getLogger(__name__)
+
+# numpy در اولین درخواست نمودار بارگذاری می‌شود
+np = lazy_import("numpy")
+
+# وضوح‌های ذخیره‌سازی (هم‌راستا با دانه‌بندی خودکار کوین‌گکو) -> طول bucket به میلی‌ثانیه
+RESOLUTIONS = {"5m": 300_000, "1h": 3_600_000, "1d": 86_400_000}
+# فشرده‌سازی: داده قدیمی‌تر از این سن به وضوح درشت‌تر تجمیع و حذف می‌شود
+COMPACTION = {"5m": ("1h", 2 * 86_400_000), "1h": ("1d", 120 * 86_400_000)}
+
+DAY_MS = 86_400_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ohlcv (
+    coin_id TEXT NOT NULL,
+    vs_currency TEXT NOT NULL,
+    resolution TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    open REAL NOT NULL,
+    high REAL NOT NULL,
+    low REAL NOT NULL,
+    close REAL NOT NULL,
+    volume REAL,
+    PRIMARY KEY (coin_id, vs_currency, resolution, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS coverage (
+    coin_id TEXT NOT NULL,
+    vs_currency TEXT NOT NULL,
+    resolution TEXT NOT NULL,
+    since_ms INTEGER NOT NULL,
+    checked_ms INTEGER NOT NULL,
+    PRIMARY KEY (coin_id, vs_currency, resolution)
+) WITHOUT ROWID;
+"""
+
+# همه عملیات SQLite در یک thread اختصاصی اجرا می‌شوند (اتصال واحد، بدون قفل اضافه)
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="timeseries")
+_connection: Optional[sqlite3.Connection] = None
+# قفل هر سری تا backfill هم‌زمان یک سری فقط یک بار انجام شود: کلید -> [قفل، تعداد استفاده‌کننده‌ها].
+# قفل با رفتن آخرین استفاده‌کننده حذف می‌شود تا جدول با شناسه‌های دلخواه ارز بی‌حد بزرگ نشود
+_locks: dict[tuple[str, str, str], list] = {}
+
+
+def resolution_for(days: str) -> str:
+    """وضوح مناسب برای بازه (همان قاعده دانه‌بندی کوین‌گکو)"""
+    if days == "max" or int(days) > 90:
+        return "1d"
+    if int(days) > 1:
+        return "1h"
+    return "5m"
+
+
+def _connect() -> sqlite3.Connection:
+    """اتصال (و ساخت جدول‌ها در اولین استفاده) - فقط در thread ذخیره‌ساز"""
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(TIMESERIES_DB_PATH) or ".", exist_ok=True)
+        _connection = sqlite3.connect(TIMESERIES_DB_PATH, check_same_thread=False)
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.execute("PRAGMA synchronous=NORMAL")
+        _connection.executescript(_SCHEMA)
+    return _connection
+
+
+def _get_coverage(coin_id: str, vs_currency: str, resolution: str) -> Optional[tuple[int, int, Optional[int]]]:
+    """(since_ms، checked_ms، آخرین ts) یک سری یا None اگه هیچ داده‌ای نیست"""
+    db = _connect()
+    row = db.execute(
+        "SELECT since_ms, checked_ms FROM coverage WHERE coin_id=? AND vs_currency=? AND resolution=?",
+        (coin_id, vs_currency, resolution),
+    ).fetchone()
+    if row is None:
+        return None
+    (last_ts,) = db.execute(
+        "SELECT MAX(ts) FROM ohlcv WHERE coin_id=? AND vs_currency=? AND resolution=?",
+        (coin_id, vs_currency, resolution),
+    ).fetchone()
+    return row[0], row[1], last_ts
+
+
+def _upsert_rows(db: sqlite3.Connection, rows: list[tuple]) -> None:
+    """درج یا ادغام ردیف‌های OHLCV (high/low تجمیع، close و volume آخرین مقدار)"""
+    db.executemany(
+        """
+        INSERT INTO ohlcv (coin_id, vs_currency, resolution, ts, open, high, low, close, volume)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (coin_id, vs_currency, resolution, ts) DO UPDATE SET
+            high = MAX(high, excluded.high),
+            low = MIN(low, excluded.low),
+            close = excluded.close,
+            volume = excluded.volume
+        """,
+        rows,
+    )
+
+
+def _ingest(
+    coin_id: str, vs_currency: str, resolution: str,
+    timestamps: np.ndarray, prices: np.ndarray, volumes: np.ndarray, since_ms: int,
+) -> None:
+    """تجمیع نقاط خام در bucketهای وضوح و ذخیره به‌همراه پوشش جدید"""
+    step = RESOLUTIONS[resolution]
+    db = _connect()
+    with db:
+        if len(prices):
+            buckets = (timestamps // step).astype(np.int64) * step
+            # مرزهای هر bucket در آرایه مرتب
+            starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+            ends = np.r_[starts[1:], len(buckets)]
+            highs = np.maximum.reduceat(prices, starts)
+            lows = np.minimum.reduceat(prices, starts)
+            rows = [
+                (coin_id, vs_currency, resolution, int(buckets[s]), float(prices[s]),
+                 float(h), float(l), float(prices[e - 1]),
+                 None if math.isnan(volumes[e - 1]) else float(volumes[e - 1]))
+                for s, e, h, l in zip(starts, ends, highs, lows)
+            ]
+            _upsert_rows(db, rows)
+        db.execute(
+            """
+            INSERT INTO coverage (coin_id, vs_currency, resolution, since_ms, checked_ms)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (coin_id, vs_currency, resolution) DO UPDATE SET
+                since_ms = MIN(since_ms, excluded.since_ms),
+                checked_ms = excluded.checked_ms
+            """,
+            (coin_id, vs_currency, resolution, since_ms, int(time.time() * 1000)),
+        )
+
+
+def _read(coin_id: str, vs_currency: str, resolution: str, since_ms: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """خواندن سری (زمان، قیمت بسته شدن، حجم) از since_ms به بعد"""
+    rows = _connect().execute(
+        """
+        SELECT ts, close, volume FROM ohlcv
+        WHERE coin_id=? AND vs_currency=? AND resolution=? AND ts >= ?
+        ORDER BY ts
+        """,
+        (coin_id, vs_currency, resolution, since_ms),
+    ).fetchall()
+    data = np.array(rows, dtype=np.float64).reshape(-1, 3)  # None -> NaN
+    return data[:, 0], data[:, 1], data[:, 2]
+
+
+def _compact() -> int:
+    """
+    فشرده‌سازی داده قدیمی پروضوح: تجمیع در وضوح درشت‌تر (بدون بازنویسی داده موجود
+    آن وضوح) و حذف ردیف‌های پروضوح. خروجی: تعداد ردیف‌های حذف‌شده
+    """
+    db = _connect()
+    now = int(time.time() * 1000)
+    removed = 0
+    with db:
+        for resolution, (target, max_age) in COMPACTION.items():
+            cutoff = now - max_age
+            step = RESOLUTIONS[target]
+            rows = db.execute(
+                """
+                SELECT coin_id, vs_currency, ts, open, high, low, close, volume FROM ohlcv
+                WHERE resolution=? AND ts < ? ORDER BY coin_id, vs_currency, ts
+                """,
+                (resolution, cutoff),
+            ).fetchall()
+            merged = []
+            for (coin_id, vs_currency, bucket), group in itertools.groupby(
+                rows, key=lambda row: (row[0], row[1], row[2] - row[2] % step)
+            ):
+                group = list(group)
+                merged.append((
+                    coin_id, vs_currency, target, bucket, group[0][3],
+                    max(row[4] for row in group), min(row[5] for row in group),
+                    group[-1][6], group[-1][7],
+                ))
+            db.executemany(
+                """
+                INSERT OR IGNORE INTO ohlcv (coin_id, vs_currency, resolution, ts, open, high, low, close, volume)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                merged,
+            )
+            removed += db.execute(
+                "DELETE FROM ohlcv WHERE resolution=? AND ts < ?", (resolution, cutoff)
+            ).rowcount
+            # پوشش وضوح پروضوح از cutoff به بعد معتبر است
+            db.execute(
+                "UPDATE coverage SET since_ms = MAX(since_ms, ?) WHERE resolution=?", (cutoff, resolution)
+            )
+    return removed
+
+
+@contextlib.asynccontextmanager
+async def _series_lock(key: tuple[str, str, str]):
+    """قفل backfill یک سری؛ پس از آزاد شدن و نبود منتظر دیگر از جدول حذف می‌شود"""
+    entry = _locks.get(key)
+    if entry is None:
+        entry = _locks[key] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _locks[key]
+
+
+async def _run(func, *args):
+    """اجرای تابع ذخیره‌ساز در thread اختصاصی"""
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+
+async def get_series(coin_id: str, days: str = "7", vs_currency: str = "usd") -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    سری قیمت یک ارز برای بازه days از ذخیره‌ساز محلی.
+    فقط بخش‌های ناموجود (ابتدای بازه یا انتهای جدید) از کوین‌گکو دریافت می‌شوند.
+    خروجی: (زمان‌ها به میلی‌ثانیه، قیمت‌ها، حجم‌ها)
+    """
+    # numpy پیش از استفاده در thread ذخیره‌ساز، در thread حلقه بارگذاری می‌شود (اگه warm-up انجام نشده)
+    ensure_loaded("numpy")
+    resolution = resolution_for(days)
+    now = int(time.time() * 1000)
+    start = 0 if days == "max" else now - int(days) * DAY_MS
+
+    key = (coin_id, vs_currency, resolution)
+    async with _series_lock(key):
+        coverage = await _run(_get_coverage, *key)
+        fetch_days = None
+        if coverage is None or coverage[0] > start or coverage[2] is None:
+            # بازه درخواستی پوشش داده نشده: دریافت کامل
+            fetch_days = days
+        elif now - coverage[1] >= TIMESERIES_MIN_REFRESH * 1000:
+            # فقط انتهای سری (از ابتدای آخرین bucket تا الان)؛ close آخرین bucket هم به‌روز می‌شود
+            fetch_days = str(max(1, math.ceil((now - coverage[2]) / DAY_MS)))
+
+        if fetch_days is not None:
+            try:
+                data = await get_json(
+                    f"/coins/{coin_id}/market_chart",
+                    params={"vs_currency": vs_currency, "days": fetch_days},
+                    priority=Priority.BACKFILL,
+                )
+            except (RateLimited, httpx.HTTPError) as e:
+                # حالت آفلاین: اگه داده محلی داریم همان نمایش داده می‌شود
+                if coverage is None or coverage[2] is None:
+                    raise
+                logger.warning("backfill سری %s ناموفق بود؛ استفاده از داده محلی: %s", key, e)
+            else:
+                logger.debug("backfill سری %s با days=%s: %s نقطه", key, fetch_days, len(data.get('prices') or []))
+                timestamps, prices, volumes = parse_market_chart(data)
+                since = start if fetch_days == days else coverage[0]
+                await _run(_ingest, *key, timestamps, prices, volumes, since)
+
+    return await _run(_read, *key, start)
+
+
+async def compact_store(context: Optional[ContextTypes.DEFAULT_TYPE] = None) -> None:
+    """job دوره‌ای فشرده‌سازی ذخیره‌ساز"""
+    try:
+        removed = await _run(_compact)
+        logger.info("فشرده‌سازی سری‌های زمانی: %s ردیف پروضوح تجمیع شد", removed)
+    except sqlite3.Error as e:
+        logger.error("خطا در فشرده‌سازی سری‌های زمانی: %s", e)
+
+
+def start_timeseries_store(application: Application) -> None:
+    """زمان‌بندی فشرده‌سازی دوره‌ای روی job queue"""
+    if application.job_queue is not None:
+        application.job_queue.run_repeating(
+            compact_store, interval=TIMESERIES_COMPACT_INTERVAL, first=TIMESERIES_COMPACT_INTERVAL,
+            name="timeseries_compaction",
+        )
+
+
+async def close_timeseries_store(application: Optional[Application] = None) -> None:
+    """بستن اتصال SQLite"""
+    def close() -> None:
+        global _connection
+        if _connection is not None:
+            _connection.close()
+            _connection = None
+    await _run(close)
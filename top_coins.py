@@ -1,13 +1,13 @@
 import logging
-import requests
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from market_data import MarketSnapshot, market_data, failure_message, oldest_as_of
+from cache import as_of_marker
+from exchange_rates import format_amount
+from config import MARKET_TOP_SIZE, TOP_PAGE_SIZE
 
 # تنظیم لاگینگ
 logger = logging.getLogger(__name__)
 
-# URL API کوین‌گکو
-COINGECKO_API = "https://api.coingecko.com/api/v3"
-
 # دیکشنری ایموجی‌های مینیمال برای 10 ارز برتر (بر اساس نماد)
 COIN_EMOJIS = {
     "bitcoin": "🪙",  # بیت‌کوین
@@ -22,38 +22,97 @@ COIN_EMOJIS = {
     "dogecoin": "🐶", # دوج‌کوین
 }
 
-def get_top_coins_panel() -> tuple[str, InlineKeyboardMarkup]:
-    try:
-        response = requests.get(
-            f"{COINGECKO_API}/coins/markets?vs_currency=usd&order=market_cap_desc&per_page=10&page=1"
-        )
-        response.raise_for_status()
-        data = response.json()
-
-        # پیام کوتاه
-        message = "📊 10 ارز برتر:"
-        
-        # ساخت دکمه‌های پنل عمودی
-        keyboard = []
-        for coin in data:
-            symbol = coin["symbol"].upper()
-            price = coin["current_price"]
-            coin_id = coin["id"].lower()  # برای تطبیق با دیکشنری ایموجی
-            
-            # انتخاب ایموجی مینیمال (اگه نبود، ایموجی پیش‌فرض)
-            emoji = COIN_EMOJIS.get(coin_id, "💸")
-            
-            # ساخت متن دکمه با لوگو، نماد و قیمت
-            button_text = f"{emoji} {symbol}: ${price:,.2f}"
-            button = InlineKeyboardButton(
-                text=button_text,
-                callback_data=f"coin_{coin_id}"  # برای تعاملات بعدی
-            )
-            keyboard.append([button])  # هر دکمه تو یه سطر جدا
-
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        return message, reply_markup
+# نماهای /top: کد کوتاه (در callback_data) -> (عنوان، کلید مرتب‌سازی)؛ ارزهای بدون داده در انتها
+TOP_VIEWS = {
+    "m": ("ارزش بازار", lambda coin: coin.rank or float("inf")),
+    "g": ("بیشترین رشد 24h", lambda coin: -coin.change_24h if coin.change_24h is not None else float("inf")),
+    "l": ("بیشترین افت 24h", lambda coin: coin.change_24h if coin.change_24h is not None else float("inf")),
+    "v": ("حجم معاملات 24h", lambda coin: -coin.volume_24h if coin.volume_24h else float("inf")),
+}
+VIEW_BUTTONS = {"m": "🏆 ارزش", "g": "📈 رشد", "l": "📉 افت", "v": "💹 حجم"}
+
+# سقف طول callback_data در تلگرام (بایت)
+CALLBACK_DATA_LIMIT = 64
+
+
+def top_callback(view: str, page: int) -> str:
+    """callback_data فشرده یک صفحه /top، مثل t:g:3"""
+    return f"t:{view}:{page}"
+
+
+def parse_top_callback(data: str) -> tuple[str, int]:
+    """(نما، شماره صفحه) از callback_data؛ مقادیر نامعتبر به صفحه اول نمای ارزش بازار برمی‌گردند"""
+    _, view, page = (data.split(":") + ["", ""])[:3]
+    if view not in TOP_VIEWS:
+        view = "m"
+    return view, int(page) if page.isdigit() else 0
+
+
+def _coin_callback(coin: MarketSnapshot) -> str:
+    """callback_data دکمه یک ارز؛ شناسه‌های خیلی بلند با نماد جایگزین می‌شوند"""
+    data = f"coin_{coin.coin_id.lower()}"
+    if len(data.encode()) <= CALLBACK_DATA_LIMIT:
+        return data
+    return f"info_{coin.symbol.lower()}"[:CALLBACK_DATA_LIMIT]
 
+
+def _button_text(coin: MarketSnapshot, view: str, currency: str) -> str:
+    """متن دکمه: ایموجی، رتبه، نماد و قیمت؛ در نماهای تغییر و حجم همان مقدار هم نمایش داده می‌شود"""
+    # انتخاب ایموجی مینیمال (اگه نبود، ایموجی پیش‌فرض)
+    emoji = COIN_EMOJIS.get(coin.coin_id.lower(), "💸")
+    text = f"{emoji} {coin.rank or '-'}. {coin.symbol.upper()}: {format_amount(coin.price, currency)}"
+    if view in ("g", "l") and coin.change_24h is not None:
+        text += f" ({coin.change_24h:+.2f}%)"
+    elif view == "v" and coin.volume_24h is not None:
+        text += f" | {format_amount(coin.volume_24h, currency, 0)}"
+    return text
+
+
+async def get_top_coins_panel(currency: str = "usd", view: str = "m", page: int = 0) -> tuple[str, InlineKeyboardMarkup]:
+    """
+    یک صفحه از MARKET_TOP_SIZE ارز برتر در نمای view (ارزش بازار، رشد، افت یا حجم).
+    همه صفحه‌ها و نماها از یک snapshot ساخته می‌شوند و درخواست جداگانه‌ای ندارند.
+    خروجی: (متن پیام، دکمه‌های ارزها + ناوبری صفحه + انتخاب نما)
+    """
+    try:
+        # snapshot پس‌زمینه در صورت تازه بودن، وگرنه کش مشترک یا API کوین‌گکو (قیمت‌ها به ارز کاربر)
+        coins = await market_data.top(MARKET_TOP_SIZE, currency)
     except Exception as e:
-        logger.error(f"خطا در دریافت 10 ارز برتر: {e}")
-        return "خطایی رخ داد. دوباره امتحان کنید.", None
\ No newline at end of file
+        return failure_message(e, "ارزهای برتر"), _retry_markup(view, page)
+
+    title, key = TOP_VIEWS.get(view, TOP_VIEWS["m"])
+    if view != "m":
+        coins = sorted(coins, key=key)
+    pages = max(1, -(-len(coins) // TOP_PAGE_SIZE))
+    page = min(max(page, 0), pages - 1)
+    start = page * TOP_PAGE_SIZE
+
+    # پیام کوتاه
+    message = (
+        f"📊 {len(coins)} ارز برتر - {title} (صفحه {page + 1} از {pages}):"
+        + as_of_marker(oldest_as_of(coins))
+    )
+
+    # ساخت دکمه‌های پنل عمودی (هر ارز تو یه سطر جدا)
+    keyboard = [
+        [InlineKeyboardButton(text=_button_text(coin, view, currency), callback_data=_coin_callback(coin))]
+        for coin in coins[start:start + TOP_PAGE_SIZE]
+    ]
+    # ناوبری صفحه: دکمه وسط همان صفحه را به‌روز می‌کند
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("◀️", callback_data=top_callback(view, page - 1)))
+    navigation.append(InlineKeyboardButton(f"🔄 {page + 1}/{pages}", callback_data=top_callback(view, page)))
+    if page < pages - 1:
+        navigation.append(InlineKeyboardButton("▶️", callback_data=top_callback(view, page + 1)))
+    keyboard.append(navigation)
+    keyboard.append([
+        InlineKeyboardButton(("• " if code == view else "") + label, callback_data=top_callback(code, 0))
+        for code, label in VIEW_BUTTONS.items()
+    ])
+    return message, InlineKeyboardMarkup(keyboard)
+
+
+def _retry_markup(view: str = "m", page: int = 0) -> InlineKeyboardMarkup:
+    """دکمه تلاش دوباره (پاسخ خطا هم همیشه یک markup معتبر دارد)"""
+    return InlineKeyboardMarkup([[InlineKeyboardButton("🔄 تلاش دوباره", callback_data=top_callback(view, page))]])
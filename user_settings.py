@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes
+
+from exchange_rates import ensure_rates, format_amount, supported_currencies, UnsupportedCurrency
+from metrics import observe_handler
+from outbound import reply_text
+from config import USER_SETTINGS_DB_PATH, DEFAULT_CURRENCY
+
+# تنظیم لاگینگ
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_settings (
+    user_id INTEGER PRIMARY KEY,
+    currency TEXT NOT NULL
+);
+"""
+
+# ارز انتخابی کاربران (فقط کاربرانی که ارز پیش‌فرض را تغییر داده‌اند)؛ خواندن بدون پایگاه داده
+_currencies: dict[int, str] = {}
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="user_settings")
+_connection: Optional[sqlite3.Connection] = None
+
+
+def _connect() -> sqlite3.Connection:
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(USER_SETTINGS_DB_PATH) or ".", exist_ok=True)
+        _connection = sqlite3.connect(USER_SETTINGS_DB_PATH, check_same_thread=False)
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.executescript(_SCHEMA)
+    return _connection
+
+
+def _load_all() -> dict[int, str]:
+    return dict(_connect().execute("SELECT user_id, currency FROM user_settings"))
+
+
+def _save_currency(user_id: int, currency: str) -> None:
+    db = _connect()
+    with db:
+        db.execute(
+            "INSERT INTO user_settings (user_id, currency) VALUES (?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET currency=excluded.currency",
+            (user_id, currency),
+        )
+
+
+async def _run(func, *args):
+    """اجرای تابع پایگاه داده در thread اختصاصی"""
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+
+def get_currency(user_id: Optional[int]) -> str:
+    """ارز نمایش قیمت‌ها برای کاربر (پیش‌فرض DEFAULT_CURRENCY)"""
+    return _currencies.get(user_id, DEFAULT_CURRENCY)
+
+
+def currency_for(update) -> str:
+    """
+    ارز کاربر یک آپدیت؛ update می‌تواند Update یا CallbackQuery باشد
+    (هندلرهای ارز با هر دو صدا زده می‌شوند).
+    """
+    user = getattr(update, "effective_user", None) or getattr(update, "from_user", None)
+    return get_currency(user.id if user else None)
+
+
+@observe_handler("currency")
+async def currency(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """نمایش یا تغییر ارز نمایش قیمت‌ها (دستور /currency eur)"""
+    logger.debug("اجرای دستور /currency توسط کاربر %s", update.effective_user.id)
+    user_id = update.effective_user.id
+    if not context.args:
+        reply_text(
+            update.message,
+            f"ارز فعلی: {get_currency(user_id).upper()}\n"
+            "تغییر: /currency eur\n"
+            "ارزهای قابل انتخاب: " + "، ".join(code.upper() for code in supported_currencies())
+        )
+        return
+
+    code = context.args[0].strip().lower()
+    try:
+        # جدول نرخ‌ها در صورت نیاز یک بار دریافت می‌شود
+        factor = await ensure_rates(code)
+    except UnsupportedCurrency:
+        reply_text(update.message, f"ارز {code.upper()} پشتیبانی نمی‌شود. فهرست ارزها: /currency")
+        return
+    except Exception as e:
+        logger.warning("دریافت نرخ ارزها برای /currency ناموفق بود: %s", e)
+        reply_text(update.message, "نرخ ارزها در دسترس نیست. دوباره امتحان کنید.")
+        return
+
+    if code == DEFAULT_CURRENCY:
+        _currencies.pop(user_id, None)
+    else:
+        _currencies[user_id] = code
+    await _run(_save_currency, user_id, code)
+    reply_text(
+        update.message,
+        f"✅ قیمت‌ها از این پس به {code.upper()} نمایش داده می‌شوند (1 دلار = {format_amount(factor, code)})"
+    )
+
+
+async def start_user_settings(application: Application) -> None:
+    """بارگذاری تنظیمات کاربران از پایگاه داده"""
+    _currencies.update({
+        user_id: code for user_id, code in (await _run(_load_all)).items() if code != DEFAULT_CURRENCY
+    })
+    logger.info("تنظیمات %s کاربر بارگذاری شد", len(_currencies))
+
+
+async def close_user_settings(application: Optional[Application] = None) -> None:
+    """بستن اتصال پایگاه داده تنظیمات"""
+    def close() -> None:
+        global _connection
+        if _connection is not None:
+            _connection.close()
+            _connection = None
+    await _run(close)